@@ -0,0 +1,73 @@
+"""
+Connection setup cost: a fresh connection per request vs. reuse vs. pool.
+
+Times a trivial query under three strategies against the configured
+database:
+
+    fresh       connection closed after every query (CONN_MAX_AGE=0, no pool)
+    persistent  one connection reused across queries (CONN_MAX_AGE > 0)
+    pooled      connections checked out of psycopg's pool (DB_POOL=1);
+                PostgreSQL with psycopg 3 only
+
+The fresh/persistent gap is the per-request handshake cost that
+connection reuse removes. Run through benchmarks.run, e.g. against a
+local PostgreSQL:
+
+    python -m benchmarks.run --settings dice_backend.settings --layers connections
+"""
+
+import time
+
+from django.db import connections
+
+POOL_ALIAS = "bench_pool"
+
+
+def _query(connection):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1")
+
+
+def _per_query_ms(connection, total, close_each):
+    started = time.perf_counter()
+    for _ in range(total):
+        _query(connection)
+        if close_each:
+            connection.close()
+    return (time.perf_counter() - started) / total * 1000
+
+
+def _pool_connection():
+    default = connections["default"]
+    if default.vendor != "postgresql":
+        return None
+    try:
+        import psycopg_pool  # noqa: F401
+    except ImportError:
+        return None
+    settings_dict = dict(default.settings_dict)
+    settings_dict["CONN_MAX_AGE"] = 0
+    settings_dict["OPTIONS"] = {**settings_dict["OPTIONS"], "pool": {"min_size": 1, "max_size": 2}}
+    connections.settings[POOL_ALIAS] = settings_dict
+    return connections[POOL_ALIAS]
+
+
+def run(total=500):
+    default = connections["default"]
+    default.close()
+    results = {
+        "database": default.vendor,
+        "queries": total,
+        "fresh_ms": _per_query_ms(default, total, close_each=True),
+        "persistent_ms": _per_query_ms(default, total, close_each=False),
+    }
+    results["setup_cost_ms"] = results["fresh_ms"] - results["persistent_ms"]
+
+    pooled = _pool_connection()
+    if pooled is not None:
+        try:
+            # close() hands the connection back to the pool instead of dropping it.
+            results["pooled_ms"] = _per_query_ms(pooled, total, close_each=True)
+        finally:
+            pooled.close_pool()
+    return results
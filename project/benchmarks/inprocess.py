@@ -0,0 +1,66 @@
+"""
+In-process request throughput through the Django test client.
+
+Measures the full Django/DRF stack — middleware, authentication,
+serialization, rendering — without a network hop, against whatever
+database the active settings name: in-memory SQLite with
+dice_backend.test_settings, or a local PostgreSQL with the main settings
+and DB_* environment variables. A throwaway test database is created and
+destroyed around the run. Run through benchmarks.run.
+"""
+
+import time
+
+from django.db import connection
+from django.test.utils import (
+    override_settings,
+    setup_test_environment,
+    teardown_test_environment,
+)
+from rest_framework.test import APIClient
+
+from dice.models import DiceMacro
+
+from .util import BENCH_USER_ID, make_token, summarize
+
+
+def _measure(send, total):
+    latencies = []
+    errors = 0
+    started = time.perf_counter()
+    for _ in range(total):
+        start = time.perf_counter()
+        status = send().status_code
+        if status == 200:
+            latencies.append(time.perf_counter() - start)
+        else:
+            errors += 1
+    return summarize(latencies, time.perf_counter() - started, errors)
+
+
+@override_settings(ROLL_RATE_LIMIT_RATE=0)  # one client, far above any real rate
+def run(total=2000):
+    setup_test_environment()
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        macro = DiceMacro.objects.create(
+            user_id=BENCH_USER_ID, name="Bench", num_dice=3, sides=6, modifier=2
+        )
+        public = APIClient()
+        authed = APIClient()
+        authed.cookies["access_token"] = make_token()
+        roll_body = {"num_dice": 3, "sides": 6, "modifier": 2}
+
+        return {
+            "database": connection.vendor,
+            "roll": _measure(
+                lambda: public.post("/api/roll/", roll_body, format="json"), total
+            ),
+            "macro_roll": _measure(
+                lambda: authed.post(f"/api/macros/{macro.id}/roll/"), total
+            ),
+        }
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
@@ -0,0 +1,115 @@
+"""
+Concurrent HTTP load driver for a dice-backend server.
+
+Fires requests from a pool of client threads and reports requests per
+second and latency percentiles. serve() starts a local multi-worker
+gunicorn for benchmarks.run; on its own this module drives any running
+server, e.g. to compare the sync WSGI stack against the async ASGI stack:
+
+    gunicorn dice_backend.wsgi:application --bind 127.0.0.1:8500 &
+    python -m benchmarks.load --url http://127.0.0.1:8500/api/roll/ -c 64
+
+    gunicorn -c gunicorn_asgi.py dice_backend.asgi:application &
+    python -m benchmarks.load --url http://127.0.0.1:8500/api/roll/ -c 64
+
+Pass --cookie access_token=<jwt> for the macro endpoints.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from .util import summarize
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+
+@contextlib.contextmanager
+def serve(settings, workers=2, port=8599, app="dice_backend.wsgi:application",
+          extra_args=()):
+    """Run gunicorn on 127.0.0.1:`port` for the duration of the block."""
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings)
+    # Measure the endpoints, not the per-IP rate limit (all load is local).
+    env.setdefault("ROLL_RATE_LIMIT_RATE", "0")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", app, "--bind", f"127.0.0.1:{port}",
+         "--workers", str(workers), "--log-level", "warning", *extra_args],
+        cwd=PROJECT_DIR, env=env,
+    )
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            with contextlib.suppress(OSError), socket.create_connection(("127.0.0.1", port), 0.2):
+                break
+            if process.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError("gunicorn failed to start")
+            time.sleep(0.1)
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def run(url, body=None, cookie=None, concurrency=16, total=2000, method="POST"):
+    """Send `total` requests over `concurrency` threads and summarize them."""
+    data = json.dumps(body).encode() if body is not None else None
+    headers = {"Content-Type": "application/json"}
+    if cookie:
+        headers["Cookie"] = cookie
+
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def one(_):
+        nonlocal errors
+        request = urllib.request.Request(url, data=data, headers=headers, method=method)
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request) as response:
+                response.read()
+            ok = True
+        except Exception:
+            ok = False
+        elapsed = time.perf_counter() - start
+        with lock:
+            if ok:
+                latencies.append(elapsed)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total)))
+    wall = time.perf_counter() - started
+
+    return {"url": url, "concurrency": concurrency, **summarize(latencies, wall, errors)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", required=True)
+    parser.add_argument("--method", default="POST")
+    parser.add_argument("--body", default='{"num_dice": 3, "sides": 6}',
+                        help="JSON request body ('' for none)")
+    parser.add_argument("--cookie", default=None)
+    parser.add_argument("-c", "--concurrency", type=int, default=16)
+    parser.add_argument("-n", "--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    body = json.loads(args.body) if args.body else None
+    print(json.dumps(run(args.url, body, args.cookie, args.concurrency,
+                         args.requests, args.method), indent=2))
+
+
+if __name__ == "__main__":
+    main()
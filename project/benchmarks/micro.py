@@ -0,0 +1,48 @@
+"""
+Micro-benchmarks for the hot per-request code paths.
+
+Covers roll generation (bulk engine vs. per-die randint, see
+roll_engine.py) and JWT handling (a raw jwt.decode vs. a
+DiceJWTAuthentication.authenticate hit on the decoded-token cache).
+Requires Django to be configured; run through benchmarks.run.
+"""
+
+import timeit
+
+import jwt
+from rest_framework.test import APIRequestFactory
+
+from dice.authentication import (
+    JWT_ALGORITHM,
+    JWT_SECRET,
+    DiceJWTAuthentication,
+    token_cache,
+)
+
+from . import roll_engine
+from .util import make_token
+
+
+def _per_call_us(func, number):
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+
+
+def jwt_results(number=20_000):
+    """Per-call timings (microseconds) for token verification."""
+    token = make_token()
+    request = APIRequestFactory().get("/")
+    request.COOKIES = {"access_token": token}
+    auth = DiceJWTAuthentication()
+
+    token_cache.clear()
+    auth.authenticate(request)  # warm the cache
+    return {
+        "jwt_decode_us": _per_call_us(
+            lambda: jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM]), number
+        ),
+        "authenticate_cached_us": _per_call_us(lambda: auth.authenticate(request), number),
+    }
+
+
+def run():
+    return {"roll_engine": roll_engine.results(), "jwt": jwt_results()}
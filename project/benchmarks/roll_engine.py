@@ -0,0 +1,65 @@
+"""
+Micro-benchmark: bulk roll engine vs. the original per-die randint loop,
+and the buffered CSPRNG backend vs. a per-die secrets.randbelow() loop.
+
+Run from the project directory:
+    python -m benchmarks.roll_engine
+"""
+
+import random
+import secrets
+import timeit
+from functools import partial
+
+from dice.csprng import csprng
+from dice.engine import roll_dice
+
+SIDES = 20
+DICE_COUNTS = (1, 10, 100)
+
+
+def randint_loop(num_dice, sides):
+    """The roll path the views used before dice.engine existed."""
+    return [random.randint(1, sides) for _ in range(num_dice)]
+
+
+def randbelow_loop(num_dice, sides):
+    """The naive CSPRNG path: one secrets call (and syscall) per die."""
+    return [secrets.randbelow(sides) + 1 for _ in range(num_dice)]
+
+
+def bench(func, num_dice, number):
+    best = min(timeit.repeat(lambda: func(num_dice, SIDES), number=number, repeat=5))
+    return best / number * 1e6  # microseconds per call
+
+
+def results():
+    """Per-call timings (microseconds) for each dice count."""
+    rows = []
+    for num_dice in DICE_COUNTS:
+        number = max(1000, 100_000 // num_dice)
+        rows.append({
+            "num_dice": num_dice,
+            "sides": SIDES,
+            "randint_us": bench(randint_loop, num_dice, number),
+            "engine_us": bench(roll_dice, num_dice, number),
+            "randbelow_us": bench(randbelow_loop, num_dice, number),
+            "csprng_us": bench(partial(roll_dice, rng=csprng), num_dice, number),
+        })
+    return rows
+
+
+def main():
+    print(
+        f"{'dice':>5} {'randint (us)':>14} {'engine (us)':>13} "
+        f"{'randbelow (us)':>16} {'csprng (us)':>13}"
+    )
+    for row in results():
+        print(
+            f"{row['num_dice']:>5} {row['randint_us']:>14.3f} {row['engine_us']:>13.3f} "
+            f"{row['randbelow_us']:>16.3f} {row['csprng_us']:>13.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
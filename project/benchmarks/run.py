@@ -0,0 +1,201 @@
+"""
+Benchmark suite entry point.
+
+Runs up to six layers and writes the results, tagged with the current
+git commit, as JSON so runs can be compared across commits:
+
+    micro      roll generation and JWT decode timings (micro.py)
+    inprocess  request throughput through the Django test client (inprocess.py)
+    load       multi-worker gunicorn driven over HTTP, p50/p95/p99 + rps (load.py)
+    connections  per-query cost with fresh, persistent and pooled DB connections
+    startup    import time, first response and worker respawn for the full
+               and lean settings profiles, preload on and off (startup.py)
+    stacks     the sync WSGI and async ASGI servers side by side at -c 1, 16
+               and 64, on /api/roll/ and, with a shared database, the macro
+               roll and history endpoints
+
+Usage (from the project directory):
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.run --settings dice_backend.settings --layers inprocess,load
+
+The default settings (dice_backend.test_settings) use in-memory SQLite.
+To benchmark a local PostgreSQL stand-in, pass --settings
+dice_backend.settings with the DB_* variables pointing at it and run
+`python manage.py migrate` first; the load layer then also drives the
+macro roll endpoint. SQLITE_NAME=<file> does the same for the test
+settings with a file-backed SQLite database shared by the workers.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+
+LAYERS = ("micro", "inprocess", "load", "connections", "startup", "stacks")
+STACK_CONCURRENCY = (1, 16, 64)
+HISTORY_ROWS = 500
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_load(args):
+    from django.db import connection
+
+    from dice.models import DiceMacro
+
+    from . import load
+    from .util import BENCH_USER_ID, make_token
+
+    results = {}
+    with load.serve(args.settings, workers=args.workers, port=args.port) as base:
+        results["roll"] = load.run(
+            f"{base}/api/roll/", {"num_dice": 3, "sides": 6, "modifier": 2},
+            concurrency=args.concurrency, total=args.requests,
+        )
+
+        # Worker processes cannot share an in-memory SQLite database.
+        if connection.settings_dict["NAME"] != ":memory:":
+            macro, _ = DiceMacro.objects.get_or_create(
+                user_id=BENCH_USER_ID, name="Bench",
+                defaults={"num_dice": 3, "sides": 6, "modifier": 2},
+            )
+            try:
+                results["macro_roll"] = load.run(
+                    f"{base}/api/macros/{macro.id}/roll/", None,
+                    cookie=f"access_token={make_token()}",
+                    concurrency=args.concurrency, total=args.requests,
+                )
+            finally:
+                macro.delete()
+    results["workers"] = args.workers
+    return results
+
+
+def run_stacks(args):
+    """The same endpoints under the WSGI and the ASGI server, by concurrency."""
+    from django.db import connection
+    from django.utils import timezone
+
+    from dice.models import DiceMacro, RollHistory
+
+    from . import load
+    from .util import BENCH_USER_ID, make_token
+
+    cookie = f"access_token={make_token()}"
+    targets = [("roll", "/api/roll/", {"num_dice": 3, "sides": 6}, None, "POST")]
+    macro = None
+    # Worker processes cannot share an in-memory SQLite database.
+    if connection.settings_dict["NAME"] != ":memory:":
+        macro, _ = DiceMacro.objects.get_or_create(
+            user_id=BENCH_USER_ID, name="Bench",
+            defaults={"num_dice": 3, "sides": 6, "modifier": 2},
+        )
+        now = timezone.now()
+        RollHistory.objects.bulk_create(
+            RollHistory(user_id=BENCH_USER_ID, created_at=now, source="roll",
+                        notation="3d6", final=10, result={"final": 10})
+            for _ in range(HISTORY_ROWS)
+        )
+        targets += [
+            ("macro_roll", f"/api/macros/{macro.id}/roll/", None, cookie, "POST"),
+            ("history", "/api/history/", None, cookie, "GET"),
+        ]
+
+    stacks = {
+        "wsgi": (args.settings, "dice_backend.wsgi:application", ()),
+        "asgi": (args.asgi_settings, "dice_backend.asgi:application",
+                 ("-k", "uvicorn_worker.UvicornWorker")),
+    }
+    results = {"workers": args.workers}
+    try:
+        for stack, (settings, app, extra_args) in stacks.items():
+            with load.serve(settings, workers=args.workers, port=args.port, app=app,
+                            extra_args=extra_args) as base:
+                for name, path, body, target_cookie, method in targets:
+                    # Warm up imports, connections and caches first.
+                    load.run(base + path, body, target_cookie, 4, 200, method)
+                    results[f"{stack}_{name}"] = [
+                        load.run(base + path, body, target_cookie, concurrency,
+                                 args.requests, method)
+                        for concurrency in STACK_CONCURRENCY
+                    ]
+    finally:
+        if macro is not None:
+            macro.delete()
+            RollHistory.objects.filter(user_id=BENCH_USER_ID).delete()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the dice-backend benchmark suite.")
+    parser.add_argument("--settings", default="dice_backend.test_settings")
+    parser.add_argument("--asgi-settings", default="dice_backend.test_asgi_settings",
+                        help="settings for the ASGI server in the stacks layer")
+    parser.add_argument("--layers", default=",".join(LAYERS),
+                        help=f"comma-separated subset of {', '.join(LAYERS)}")
+    parser.add_argument("--output", help="write results JSON here (default: stdout)")
+    parser.add_argument("-n", "--requests", type=int, default=2000)
+    parser.add_argument("-c", "--concurrency", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--port", type=int, default=8599)
+    args = parser.parse_args()
+
+    os.environ["DJANGO_SETTINGS_MODULE"] = args.settings
+    import django
+
+    django.setup()
+
+    layers = [layer.strip() for layer in args.layers.split(",") if layer.strip()]
+    unknown = set(layers) - set(LAYERS)
+    if unknown:
+        parser.error(f"unknown layers: {', '.join(sorted(unknown))}")
+
+    results = {}
+    if "micro" in layers:
+        from . import micro
+
+        results["micro"] = micro.run()
+    if "inprocess" in layers:
+        from . import inprocess
+
+        results["inprocess"] = inprocess.run(args.requests)
+    if "load" in layers:
+        results["load"] = run_load(args)
+    if "connections" in layers:
+        from . import connections
+
+        results["connections"] = connections.run()
+    if "startup" in layers:
+        from . import startup
+
+        results["startup"] = startup.run(port=args.port)
+    if "stacks" in layers:
+        results["stacks"] = run_stacks(args)
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "settings": args.settings,
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        sys.stdout.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Cold-start cost of each settings profile: import time and first response.
+
+Three measurements per profile, each in fresh processes so nothing is
+already imported:
+
+    imports         `python -X importtime` over everything a worker loads
+                    before it can answer — django.setup(), the URLconf and
+                    the WSGI handler — reported as total boot time plus the
+                    slowest top-level imports
+    first_response  time from launching gunicorn (gunicorn.conf.py) until
+                    POST /api/roll/ first returns 200
+    respawn         time from killing the worker until its replacement
+                    answers
+
+The gunicorn timings are run with preload_app off and on, and each is the
+median of `rounds` launches.
+
+Only /api/roll/ is requested, which needs no database, so this runs
+against the production profiles without one:
+
+    python -m benchmarks.startup
+    python -m benchmarks.startup --profiles dice_backend.lean_settings --rounds 5
+"""
+
+import argparse
+import json
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+from .load import PROJECT_DIR
+
+PROFILES = ("dice_backend.settings", "dice_backend.lean_settings")
+
+# What a worker imports and builds before serving its first request.
+BOOT = """
+import sys
+import time
+started = time.perf_counter()
+import django
+django.setup()
+from django.core.handlers.wsgi import WSGIHandler
+from django.urls import get_resolver
+get_resolver().url_patterns
+WSGIHandler()
+print((time.perf_counter() - started) * 1000, len(sys.modules))
+"""
+
+
+def _env(settings, **extra):
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings, **extra)
+    env.setdefault("SECRET_KEY", "startup-benchmark-secret-key-0000")
+    env.setdefault("ROLL_RATE_LIMIT_RATE", "0")
+    return env
+
+
+def parse_importtime(stderr):
+    """{module: cumulative ms} for the top-level imports in -X importtime output."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue  # the header line
+        # Nested imports are indented by two spaces per level.
+        if len(name) - len(name.lstrip()) == 1:
+            modules[name.strip()] = int(cumulative) / 1000
+    return modules
+
+
+def imports(settings, rounds=3, top=15):
+    """Median boot time and the `top` slowest top-level imports for one profile."""
+    boots = []
+    for _ in range(rounds):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", BOOT],
+            cwd=PROJECT_DIR, env=_env(settings), capture_output=True, text=True, check=True,
+        )
+        boot_ms, loaded = result.stdout.split()
+        boots.append(float(boot_ms))
+    modules = parse_importtime(result.stderr)
+    slowest = sorted(modules.items(), key=lambda item: item[1], reverse=True)[:top]
+    return {
+        "boot_ms": statistics.median(boots),
+        "modules_loaded": int(loaded),
+        "slowest_ms": dict(slowest),
+    }
+
+
+def _worker_pids(pid):
+    """Child (worker) pids of a gunicorn master; Linux only."""
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+
+
+def _wait_for_roll(request, process, started, timeout):
+    """Retry `request` until it returns 200; seconds since `started`."""
+    while True:
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                if response.status == 200:
+                    return time.perf_counter() - started
+        except (urllib.error.URLError, ConnectionError):
+            pass
+        if process.poll() is not None or time.perf_counter() - started > timeout:
+            raise RuntimeError("gunicorn failed to start")
+        time.sleep(0.005)
+
+
+def cold_start(settings, preload, port=8599, timeout=30):
+    """Seconds to the first 200 from /api/roll/, and again after a worker dies.
+
+    Returns (first response, respawn). First response runs from launching
+    gunicorn; respawn from SIGKILLing its worker — the master forks a
+    replacement, which is what max_requests recycling, crashes and adding
+    workers cost. Respawn is None where worker pids cannot be listed.
+    """
+    env = _env(
+        settings,
+        GUNICORN_BIND=f"127.0.0.1:{port}",
+        GUNICORN_PRELOAD="1" if preload else "0",
+        WEB_CONCURRENCY="1",
+    )
+    request = urllib.request.Request(
+        f"http://127.0.0.1:{port}/api/roll/", data=b'{"num_dice": 3, "sides": 6}',
+        headers={"Content-Type": "application/json"}, method="POST",
+    )
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py",
+         "dice_backend.wsgi:application", "--log-level", "warning"],
+        cwd=PROJECT_DIR, env=env,
+    )
+    try:
+        first = _wait_for_roll(request, process, started, timeout)
+        workers = _worker_pids(process.pid)
+        if not workers:
+            return first, None
+        started = time.perf_counter()
+        os.kill(workers[0], signal.SIGKILL)
+        # The listening socket stays open in the master, so this request
+        # waits in the backlog until the replacement worker accepts it.
+        return first, _wait_for_roll(request, process, started, timeout)
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def run(profiles=PROFILES, rounds=3, port=8599):
+    results = {}
+    for settings in profiles:
+        profile = {"imports": imports(settings, rounds)}
+        for preload in (False, True):
+            samples = [cold_start(settings, preload, port) for _ in range(rounds)]
+            respawns = [respawn for _, respawn in samples if respawn is not None]
+            profile["preload" if preload else "no_preload"] = {
+                "first_response_ms": statistics.median([first for first, _ in samples]) * 1000,
+                "respawn_ms": statistics.median(respawns) * 1000 if respawns else None,
+            }
+        results[settings] = profile
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--profiles", default=",".join(PROFILES),
+                        help="comma-separated settings modules")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--port", type=int, default=8599)
+    args = parser.parse_args()
+
+    profiles = [p.strip() for p in args.profiles.split(",") if p.strip()]
+    print(json.dumps(run(profiles, args.rounds, args.port), indent=2))
+
+
+if __name__ == "__main__":
+    main()
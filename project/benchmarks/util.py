@@ -0,0 +1,44 @@
+"""Shared helpers for the benchmark suite."""
+
+import datetime
+import statistics
+
+import jwt
+
+BENCH_USER_ID = "benchuser0000001"
+
+
+def make_token(user_id=BENCH_USER_ID, hours=1):
+    """A signed access token accepted by DiceJWTAuthentication."""
+    from dice.authentication import JWT_ALGORITHM, JWT_SECRET
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+    payload = {
+        "userId": user_id,
+        "permissions": [],
+        "iat": now,
+        "exp": now + datetime.timedelta(hours=hours),
+    }
+    return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies, wall, errors=0):
+    """Throughput and latency percentiles (ms) for a list of request latencies (s)."""
+    ms = sorted(v * 1000 for v in latencies)
+    return {
+        "requests": len(ms) + errors,
+        "errors": errors,
+        "rps": len(ms) / wall if wall else 0.0,
+        "mean_ms": statistics.fmean(ms) if ms else 0.0,
+        "p50_ms": percentile(ms, 50),
+        "p95_ms": percentile(ms, 95),
+        "p99_ms": percentile(ms, 99),
+    }
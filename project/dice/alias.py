@@ -0,0 +1,89 @@
+"""
+Weighted sampling from random tables with Vose's alias method.
+
+AliasTable preprocesses n weights once, in O(n), into two lists: each
+column i holds entry i with probability prob[i] and its alias otherwise.
+A draw picks a column uniformly and flips one biased coin, so it costs
+O(1) whatever the table size. Tables are built when a RandomTable is
+saved and cached with it (see dice/cache.py).
+
+Randomness comes from the roll engine's sources — anything exposing
+randbytes() and getrandbits() — so tables follow ROLL_RNG like dice do.
+"""
+
+import math
+
+from . import engine
+
+_UNIT = 1 / (1 << 53)
+
+
+def _uniforms(rng, k):
+    """`k` floats in [0, 1) from one randbytes() call."""
+    words = memoryview(rng.randbytes(8 * k)).cast("Q")
+    return [(word >> 11) * _UNIT for word in words]
+
+
+class AliasTable:
+    """Vose alias table over the indices 0..n-1 of a list of weights."""
+
+    __slots__ = ("prob", "alias")
+
+    def __init__(self, weights):
+        n = len(weights)
+        # Relative to the largest weight, so summing cannot overflow.
+        peak = max(weights)
+        total = math.fsum(w / peak for w in weights)
+        scaled = [w / peak * n / total for w in weights]
+        self.prob = [1.0] * n
+        self.alias = list(range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self.prob[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] -= 1.0 - scaled[less]
+            (small if scaled[more] < 1.0 else large).append(more)
+        # Whatever is left is 1 up to round-off and keeps prob 1.0.
+
+    def __len__(self):
+        return len(self.prob)
+
+    def sample(self, k, rng=None):
+        """`k` independent draws (with replacement), as indices."""
+        if rng is None:
+            rng = engine.default_rng
+        prob, alias = self.prob, self.alias
+        columns = engine.roll_dice(k, len(prob), rng) if len(prob) > 1 else [1] * k
+        return [
+            column - 1 if coin < prob[column - 1] else alias[column - 1]
+            for column, coin in zip(columns, _uniforms(rng, k))
+        ]
+
+    def sample_distinct(self, k, weights, rng=None):
+        """`k` draws without replacement, as indices in draw order.
+
+        Alias draws are taken in rounds and repeats discarded, which is
+        cheap while k is small next to the table. If a few rounds leave
+        it short — heavy weights keep coming back — the remaining picks
+        use Efraimidis-Spirakis weighted keys over the unpicked entries.
+        """
+        if rng is None:
+            rng = engine.default_rng
+        chosen = {}
+        for _ in range(4):
+            for index in self.sample(k - len(chosen), rng):
+                chosen.setdefault(index)
+                if len(chosen) == k:
+                    return list(chosen)
+
+        rest = [i for i in range(len(weights)) if i not in chosen]
+        keys = _uniforms(rng, len(rest))
+        # Largest u ** (1 / w) first; compared as log(u) / w to stay in range.
+        ranked = sorted(
+            zip(rest, keys),
+            key=lambda pair: math.log(pair[1] or _UNIT) / weights[pair[0]],
+            reverse=True,
+        )
+        return list(chosen) + [i for i, _ in ranked[:k - len(chosen)]]
@@ -1,5 +1,59 @@
 from django.apps import AppConfig
 
+
+def check_shared_cache(settings):
+    """Refuse a per-process default cache when there are several workers.
+
+    Cache invalidations (dice/cache.py) only reach the process that made
+    them, so other workers would keep serving stale macros, and each
+    worker would draw its own macro ETag version, answering 304 for a
+    set another worker has since changed.
+    """
+    from django.core.exceptions import ImproperlyConfigured
+
+    backend = settings.CACHES["default"]["BACKEND"]
+    if settings.WEB_CONCURRENCY > 1 and backend.endswith("LocMemCache"):
+        raise ImproperlyConfigured(
+            f"WEB_CONCURRENCY={settings.WEB_CONCURRENCY} needs a cache shared "
+            "between workers; set REDIS_URL."
+        )
+
+
+def check_room_backend(settings):
+    """Refuse a room broker that cannot reach every worker's subscribers."""
+    from django.core.exceptions import ImproperlyConfigured
+    from .rooms import BACKENDS
+
+    backend = settings.ROOM_BACKEND
+    if backend not in BACKENDS:
+        raise ImproperlyConfigured(
+            f"ROOM_BACKEND must be one of {', '.join(sorted(BACKENDS))}, not {backend!r}."
+        )
+    if backend == "local" and settings.WEB_CONCURRENCY > 1:
+        raise ImproperlyConfigured(
+            "ROOM_BACKEND=local only reaches one process; with "
+            f"WEB_CONCURRENCY={settings.WEB_CONCURRENCY} use ROOM_BACKEND=postgres."
+        )
+    if backend == "postgres" and "postgresql" not in settings.DATABASES["default"]["ENGINE"]:
+        raise ImproperlyConfigured("ROOM_BACKEND=postgres needs a PostgreSQL database.")
+
+
 class DiceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'dice'
+
+    def ready(self):
+        from django.conf import settings
+        from django.core.exceptions import ImproperlyConfigured
+        from django.db.backends.signals import connection_created
+        from . import signals  # noqa: F401  (registers cache invalidation)
+        from . import engine
+        from .metrics import install_query_timer
+
+        connection_created.connect(install_query_timer)
+        check_shared_cache(settings)
+        check_room_backend(settings)
+        try:
+            engine.use_rng(settings.ROLL_RNG)
+        except ValueError as exc:
+            raise ImproperlyConfigured(f"ROLL_RNG: {exc}") from None
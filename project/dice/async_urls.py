@@ -0,0 +1,48 @@
+"""URL routes for the async (ASGI) profile, mirroring dice/urls.py.
+
+The roll, stream and macro endpoints are served by the native async
+views; the verify, expression, distribution, history, macro bulk/export and
+random-table endpoints reuse the sync DRF views, which Django runs in its thread pool under ASGI.
+"""
+
+from django.urls import include, path
+from rest_framework.routers import DefaultRouter
+from .async_views import (
+    AsyncRollDiceView,
+    AsyncRollBatchView,
+    AsyncRollStreamView,
+    AsyncMacroListView,
+    AsyncMacroDetailView,
+    AsyncMacroRollView,
+    AsyncRoomStreamView,
+)
+from .views import (
+    RollVerifyView,
+    RollExpressionView,
+    DistributionView,
+    DistributionLookupView,
+    RollHistoryView,
+    DiceMacroViewSet,
+    RandomTableViewSet,
+)
+
+router = DefaultRouter()
+router.register(r"tables", RandomTableViewSet, basename="tables")
+
+urlpatterns = [
+    path("roll/", AsyncRollDiceView.as_view(), name="roll-dice"),
+    path("roll/verify/", RollVerifyView.as_view(), name="roll-verify"),
+    path("roll/batch/", AsyncRollBatchView.as_view(), name="roll-batch"),
+    path("roll/stream/", AsyncRollStreamView.as_view(), name="roll-stream"),
+    path("roll/expression/", RollExpressionView.as_view(), name="roll-expression"),
+    path("distribution/", DistributionView.as_view(), name="distribution"),
+    path("distribution/lookup/", DistributionLookupView.as_view(), name="distribution-lookup"),
+    path("history/", RollHistoryView.as_view(), name="roll-history"),
+    path("macros/", AsyncMacroListView.as_view(), name="macros-list"),
+    path("macros/export/", DiceMacroViewSet.as_view({"get": "export"}), name="macros-export"),
+    path("macros/bulk/", DiceMacroViewSet.as_view({"post": "bulk"}), name="macros-bulk"),
+    path("macros/<int:pk>/", AsyncMacroDetailView.as_view(), name="macros-detail"),
+    path("macros/<int:pk>/roll/", AsyncMacroRollView.as_view(), name="macros-roll-macro"),
+    path("rooms/<slug:room>/stream/", AsyncRoomStreamView.as_view(), name="room-stream"),
+    path("", include(router.urls)),
+]
@@ -0,0 +1,298 @@
+"""
+Native async versions of the roll and macro endpoints for the ASGI profile.
+
+These are plain Django async views rather than DRF views (DRF dispatch is
+sync-only), mounted by dice/async_urls.py when
+DJANGO_SETTINGS_MODULE=dice_backend.asgi_settings. They reuse the same
+pieces as views.py — DiceJWTAuthentication, the serializers, the roll
+engine and the macro cache — and return the same payloads and status
+codes, so the dice/tests.py suite runs unchanged against either stack.
+The live-room SSE stream exists only here (see dice/rooms.py).
+
+Reads use the async cache and ORM APIs; writes await the model's async
+save/delete so quota and cache signals run exactly as on the sync stack.
+"""
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import APIException, NotFound, NotAuthenticated, Throttled
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
+from rest_framework.request import Request
+
+from .authentication import DiceJWTAuthentication
+from .cache import aget_user_macro, aget_user_macros, amacro_etag
+from .models import DiceMacro
+from .serializers import (
+    DiceMacroSerializer,
+    RollBatchRequestSerializer,
+    MacroRollSerializer,
+    RollStreamRequestSerializer,
+    SeededRollRequestSerializer,
+)
+from .history import roll_notation
+from .idempotency import arun_once, mark_replayed
+from .metrics import phase
+from .ratelimit import RollRateThrottle, client_key
+from .replay import CounterRNG, anext_roll, seeded
+from .rooms import MAX_ROOM_LENGTH, events, get_broker
+from .stream import achunks, aggregate_lines, sample_lines
+from .views import (
+    batch_cost,
+    batch_roll_payload,
+    macro_roll_payload,
+    not_modified,
+    publish_roll,
+    record_batch,
+    record_macro_roll,
+    record_public_roll,
+    roll_payload,
+    with_etag,
+)
+from . import engine
+
+_PARSERS = [JSONParser(), FormParser(), MultiPartParser()]
+
+
+def _request_data(request):
+    """Parse the body with the same parsers DRF uses on the sync stack."""
+    return Request(request, parsers=_PARSERS).data
+
+
+def _error(exc):
+    """Render a DRF exception the way DRF's default handler would.
+
+    Authentication errors come back as 403 because DiceJWTAuthentication
+    sends no WWW-Authenticate header — the same status DRF picks.
+    """
+    detail = exc.detail
+    if not isinstance(detail, (list, dict)):
+        detail = {"detail": detail}
+    status = 403 if exc.status_code == 401 else exc.status_code
+    response = JsonResponse(detail, status=status, safe=False)
+    if getattr(exc, "wait", None):
+        response["Retry-After"] = str(int(exc.wait))
+    return response
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class AsyncAPIView(View):
+    """Base async view: DRF-style error rendering, optional JWT auth and throttles."""
+
+    authenticate = False
+    throttle_classes = ()
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            for throttle_class in self.throttle_classes:
+                throttle = throttle_class()
+                if not throttle.allow_request(request, self):
+                    raise Throttled(throttle.wait())
+            if self.authenticate:
+                result = DiceJWTAuthentication().authenticate(request)
+                if result is None:
+                    raise NotAuthenticated()
+                request.user = result[0]
+            return await super().dispatch(request, *args, **kwargs)
+        except APIException as exc:
+            return _error(exc)
+
+
+# ----------------------
+# Public dice roll endpoints — POST /api/roll/, /api/roll/batch/, /api/roll/stream/
+# ----------------------
+class AsyncRollDiceView(AsyncAPIView):
+    """Async RollDiceView."""
+
+    throttle_classes = (RollRateThrottle,)
+
+    async def post(self, request):
+        payload, replayed = await arun_once(
+            request, f"roll:{client_key(request)}", lambda: self.roll(request)
+        )
+        return mark_replayed(JsonResponse(payload), replayed)
+
+    async def roll(self, request):
+        serializer = SeededRollRequestSerializer(data=_request_data(request))
+        serializer.is_valid(raise_exception=True)
+
+        num_dice = serializer.validated_data["num_dice"]
+        sides = serializer.validated_data["sides"]
+        modifier = serializer.validated_data.get("modifier", 0)
+        seed = serializer.validated_data.get("seed")
+
+        if seed is None:
+            with phase("roll"):
+                rolls = engine.roll_dice(num_dice, sides)
+            payload = roll_payload(rolls, sides, modifier)
+        else:
+            secret, counter = await anext_roll(client_key(request), seed)
+            with phase("roll"):
+                rolls = engine.roll_dice(num_dice, sides, CounterRNG(seed, counter, secret))
+            payload = seeded(roll_payload(rolls, sides, modifier), seed, counter, secret)
+        record_public_roll(request, "roll", roll_notation(num_dice, sides, modifier), payload)
+        publish_roll(serializer.validated_data.get("room"), "roll", payload)
+        return payload
+
+
+class AsyncRollBatchView(AsyncAPIView):
+    """Async RollBatchView."""
+
+    throttle_classes = (RollRateThrottle,)
+
+    def throttle_cost(self, request):
+        return batch_cost(_request_data(request))
+
+    async def post(self, request):
+        serializer = RollBatchRequestSerializer(data=_request_data(request))
+        serializer.is_valid(raise_exception=True)
+        specs = serializer.validated_data["rolls"]
+        payload = batch_roll_payload(specs)
+        record_batch(request, specs, payload)
+        return JsonResponse(payload)
+
+
+class AsyncRollStreamView(AsyncAPIView):
+    """Async RollStreamView — POST /api/roll/stream/.
+
+    The NDJSON body is an async iterator, so each chunk is sent as soon
+    as it is generated rather than after the whole run.
+    """
+
+    throttle_classes = (RollRateThrottle,)
+
+    async def post(self, request):
+        serializer = RollStreamRequestSerializer(data=_request_data(request))
+        serializer.is_valid(raise_exception=True)
+
+        data = serializer.validated_data
+        lines = aggregate_lines if data["aggregate"] else sample_lines
+        return StreamingHttpResponse(
+            achunks(lines(data["num_dice"], data["sides"], data["modifier"], data["samples"])),
+            content_type="application/x-ndjson",
+        )
+
+
+# ----------------------
+# Dice macros (JWT protected) — /api/macros/
+# ----------------------
+class AsyncMacroListView(AsyncAPIView):
+    """Async list + create for the user's macros."""
+
+    authenticate = True
+
+    async def get(self, request):
+        etag = await amacro_etag(request.user.id)
+        if not_modified(request, etag):
+            return with_etag(HttpResponseNotModified(), etag)
+        macros = await aget_user_macros(request.user.id)
+        return with_etag(JsonResponse(macros, safe=False), etag)
+
+    async def post(self, request):
+        serializer = DiceMacroSerializer(
+            data=_request_data(request), context={"request": request}
+        )
+        serializer.is_valid(raise_exception=True)
+        await sync_to_async(serializer.save)(user_id=request.user.id)
+        return JsonResponse(serializer.data, status=201)
+
+
+class AsyncMacroDetailView(AsyncAPIView):
+    """Async retrieve, update and delete for one of the user's macros."""
+
+    authenticate = True
+
+    async def _get_object(self, request, pk):
+        try:
+            return await DiceMacro.objects.aget(user_id=request.user.id, pk=pk)
+        except DiceMacro.DoesNotExist:
+            raise NotFound()
+
+    async def get(self, request, pk):
+        etag = await amacro_etag(request.user.id, pk)
+        if not_modified(request, etag):
+            return with_etag(HttpResponseNotModified(), etag)
+        macro = await aget_user_macro(request.user.id, pk)
+        if macro is None:
+            raise NotFound()
+        return with_etag(JsonResponse(macro), etag)
+
+    async def _update(self, request, pk, partial):
+        macro = await self._get_object(request, pk)
+        serializer = DiceMacroSerializer(
+            macro, data=_request_data(request), partial=partial,
+            context={"request": request},
+        )
+        serializer.is_valid(raise_exception=True)
+        await sync_to_async(serializer.save)()
+        return JsonResponse(serializer.data)
+
+    async def put(self, request, pk):
+        return await self._update(request, pk, partial=False)
+
+    async def patch(self, request, pk):
+        return await self._update(request, pk, partial=True)
+
+    async def delete(self, request, pk):
+        macro = await self._get_object(request, pk)
+        await macro.adelete()
+        return HttpResponse(status=204)
+
+
+class AsyncMacroRollView(AsyncAPIView):
+    """Async roll_macro — POST /api/macros/{id}/roll/."""
+
+    authenticate = True
+
+    async def post(self, request, pk):
+        payload, replayed = await arun_once(
+            request, f"macro:{request.user.id}:{pk}", lambda: self.roll(request, pk)
+        )
+        return mark_replayed(JsonResponse(payload), replayed)
+
+    async def roll(self, request, pk):
+        macro = await aget_user_macro(request.user.id, pk)
+        if macro is None:
+            raise NotFound()
+        serializer = MacroRollSerializer(data=_request_data(request))
+        serializer.is_valid(raise_exception=True)
+        seed = serializer.validated_data.get("seed")
+        dice = serializer.validated_data["dice"]
+
+        if seed is None:
+            payload = macro_roll_payload(macro, dice=dice)
+        else:
+            secret, counter = await anext_roll(client_key(request), seed)
+            rng = CounterRNG(seed, counter, secret)
+            payload = seeded(macro_roll_payload(macro, rng, dice), seed, counter, secret)
+        record_macro_roll(request.user.id, macro, payload)
+        publish_roll(serializer.validated_data.get("room"), "macro", payload)
+        return payload
+
+
+# ----------------------
+# Live roll rooms — GET /api/rooms/{room}/stream/
+# ----------------------
+class AsyncRoomStreamView(AsyncAPIView):
+    """Server-Sent Events stream of the rolls published to a room.
+
+    Public: anyone with the room id may watch. The subscription is made
+    before the response is returned, so no roll published after this
+    request is answered can be missed.
+    """
+
+    async def get(self, request, room):
+        if len(room) > MAX_ROOM_LENGTH:
+            raise NotFound()
+        broker = get_broker(settings.ROOM_BACKEND)
+        subscription = broker.subscribe(room, settings.ROOM_QUEUE_SIZE)
+        response = StreamingHttpResponse(
+            events(broker, subscription, settings.ROOM_KEEPALIVE),
+            content_type="text/event-stream",
+        )
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"  # proxies must not hold events back
+        return response
@@ -4,17 +4,33 @@ Custom JWT authentication that reads an access_token cookie.
 The JWT is signed by an external auth service using a shared secret
 (the SECRET_KEY env var). This module decodes the token and returns a
 lightweight SimpleUser — Django's built-in User model is not used.
+
+Successfully decoded tokens are kept in a small per-process cache keyed by
+a hash of the token, so a client repeating the same cookie skips the HMAC
+check and claim parsing. An entry never outlives the token's exp claim.
 """
 
+import hashlib
 import os
+import threading
+import time
+from collections import OrderedDict
+
 import jwt
 from rest_framework.authentication import BaseAuthentication
 from rest_framework.exceptions import AuthenticationFailed
 
+from .metrics import phase
+
 # Shared secret between this service and the auth service that issues tokens.
 JWT_SECRET = os.getenv("SECRET_KEY")
 JWT_ALGORITHM = "HS256"
 
+# Decoded-token cache bounds: max entries per process and max seconds an
+# entry may live (further capped by the token's own exp claim).
+JWT_CACHE_SIZE = int(os.getenv("JWT_CACHE_SIZE", "1024"))
+JWT_CACHE_TTL = int(os.getenv("JWT_CACHE_TTL", "300"))
+
 
 class SimpleUser:
     """Minimal user object built from JWT claims (no database backing)."""
@@ -25,6 +41,69 @@ class SimpleUser:
         self.is_authenticated = True
 
 
+class DecodedTokenCache:
+    """Bounded LRU of token hash -> (SimpleUser, expiry timestamp).
+
+    Only tokens that decoded and validated cleanly are stored; failures are
+    always re-checked. `hits` and `misses` count lookups since the last
+    clear().
+    """
+
+    def __init__(self, maxsize=JWT_CACHE_SIZE, ttl=JWT_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(token):
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, key):
+        """Return the cached SimpleUser for `key`, or None if absent/expired."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, user, exp=None):
+        """Cache `user` for at most `ttl` seconds and never past `exp`."""
+        expires_at = time.time() + self.ttl
+        if exp is not None:
+            expires_at = min(expires_at, exp)
+        with self._lock:
+            self._entries[key] = (user, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+        }
+
+
+token_cache = DecodedTokenCache()
+
+
 class DiceJWTAuthentication(BaseAuthentication):
     """DRF authentication backend that extracts identity from a JWT cookie.
 
@@ -33,12 +112,21 @@ class DiceJWTAuthentication(BaseAuthentication):
     """
 
     def authenticate(self, request):
+        with phase("auth"):
+            return self._authenticate(request)
+
+    def _authenticate(self, request):
         token = request.COOKIES.get("access_token")
         if not token:
             # Returning None (instead of raising) lets views with AllowAny
             # permission work without a token.
             return None
 
+        key = token_cache.key(token)
+        user = token_cache.get(key)
+        if user is not None:
+            return (user, None)
+
         try:
             data = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
         except jwt.ExpiredSignatureError:
@@ -53,5 +141,18 @@ class DiceJWTAuthentication(BaseAuthentication):
 
         permissions = data.get("permissions", [])
         user = SimpleUser(user_id, permissions)
+        token_cache.set(key, user, data.get("exp"))
         return (user, None)
 
+
+def optional_user(request):
+    """Return the SimpleUser behind a valid cookie, or None.
+
+    Public endpoints use this to attribute a request to a user when they
+    can, without rejecting callers whose cookie is missing or stale.
+    """
+    try:
+        result = DiceJWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return None
+    return result[0] if result else None
@@ -0,0 +1,191 @@
+"""
+Per-user macro read cache, and the random-table alias cache.
+
+A user's whole macro set (at most MAX_MACROS_PER_USER rows) is cached as a
+list of plain dicts under one key, so list, retrieve and roll requests
+are served without touching the database.
+
+That key includes the user's version stamp, a random token kept under its
+own key and replaced on every save or delete of one of their macros (see
+dice/signals.py) — once when the write happens and again when its
+transaction commits. Replacing the stamp retires every set cached under
+the old one, including one a concurrent reader loaded from the pre-commit
+rows and is storing only now, so a stale set can never be paired with a
+current stamp. The macro views send the stamp as an ETag, so a
+conditional GET is answered with one cache read. A stamp lost to
+eviction is simply re-drawn, which can only turn a would-be 304 into a
+full response, never the reverse. Every worker must read the same stamp,
+which is one more reason several workers need a shared cache.
+
+Random tables are cached one per key with their alias table already
+built (see dice/alias.py). Saving a RandomTable rebuilds and re-caches
+it, and deleting one drops it (dice/signals.py).
+
+Uses Django's cache framework, so the backend is whatever CACHES names —
+locmem by default, Redis when REDIS_URL is set. A locmem cache is private
+to its process, so invalidations would not reach other workers; with
+WEB_CONCURRENCY > 1 a shared cache is required (see DiceConfig.ready()).
+"""
+
+import secrets
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .alias import AliasTable
+from .models import DiceMacro, RandomTable
+
+# Same shape DiceMacroSerializer renders, so cached dicts can be returned as-is.
+MACRO_FIELDS = ("id", "name", "num_dice", "sides", "modifier", "expression", "groups")
+
+
+def now_and_on_commit(func, *args):
+    """Call func(*args) now and, inside a transaction, again once it commits.
+
+    Signals fire before the write commits, so a concurrent reader can load
+    the old rows after the first call and cache them; the second call
+    clears that. A rolled-back transaction skips the second call, which
+    leaves nothing stale behind either.
+    """
+    func(*args)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(partial(func, *args))
+
+
+def _key(user_id, version):
+    return f"dice:macros:{user_id}:{version}"
+
+
+def get_user_macros(user_id):
+    """Return the user's macros as a list of dicts, loading them on a miss."""
+    # The version is read before the query, so rows loaded from before a
+    # write are stored under a version that write has already retired.
+    key = _key(user_id, _version(user_id))
+    macros = cache.get(key)
+    if macros is None:
+        macros = list(
+            DiceMacro.objects.filter(user_id=user_id)
+            .order_by("id")
+            .values(*MACRO_FIELDS)
+        )
+        cache.set(key, macros, settings.MACRO_CACHE_TIMEOUT)
+    return macros
+
+
+def _find(macros, pk):
+    try:
+        pk = int(pk)
+    except (TypeError, ValueError):
+        return None
+    for macro in macros:
+        if macro["id"] == pk:
+            return macro
+    return None
+
+
+def get_user_macro(user_id, pk):
+    """Return one of the user's macros by primary key, or None."""
+    return _find(get_user_macros(user_id), pk)
+
+
+async def aget_user_macros(user_id):
+    """Async get_user_macros() using the async cache and ORM APIs."""
+    key = _key(user_id, await _aversion(user_id))
+    macros = await cache.aget(key)
+    if macros is None:
+        macros = [
+            macro
+            async for macro in DiceMacro.objects.filter(user_id=user_id)
+            .order_by("id")
+            .values(*MACRO_FIELDS)
+        ]
+        await cache.aset(key, macros, settings.MACRO_CACHE_TIMEOUT)
+    return macros
+
+
+async def aget_user_macro(user_id, pk):
+    """Async get_user_macro()."""
+    return _find(await aget_user_macros(user_id), pk)
+
+
+def invalidate_user_macros(user_id):
+    """Drop the cached macro set so the next read reloads it."""
+    now_and_on_commit(_drop_user_macros, user_id)
+
+
+def _drop_user_macros(user_id):
+    # Sets cached under the old version are never read again and expire.
+    cache.set(_version_key(user_id), _new_version(), settings.MACRO_CACHE_TIMEOUT)
+
+
+def _version_key(user_id):
+    return f"dice:macros:version:{user_id}"
+
+
+def _new_version():
+    return secrets.token_urlsafe(9)
+
+
+def _etag(version, pk):
+    return f'"{version}"' if pk is None else f'"{version}-{pk}"'
+
+
+def _version(user_id):
+    return cache.get_or_set(_version_key(user_id), _new_version, settings.MACRO_CACHE_TIMEOUT)
+
+
+async def _aversion(user_id):
+    return await cache.aget_or_set(
+        _version_key(user_id), _new_version, settings.MACRO_CACHE_TIMEOUT
+    )
+
+
+def macro_etag(user_id, pk=None):
+    """ETag for the user's macro list, or for one macro when `pk` is given."""
+    return _etag(_version(user_id), pk)
+
+
+async def amacro_etag(user_id, pk=None):
+    """Async macro_etag()."""
+    return _etag(await _aversion(user_id), pk)
+
+
+def _table_key(pk):
+    return f"dice:table:{pk}"
+
+
+def cache_random_table(table):
+    """Preprocess a saved RandomTable and cache it; returns the cached dict."""
+    weights = [entry["weight"] for entry in table.entries]
+    cached = {
+        "id": table.id,
+        "user_id": table.user_id,
+        "name": table.name,
+        "values": [entry["value"] for entry in table.entries],
+        "weights": weights,
+        "alias": AliasTable(weights),
+    }
+    cache.set(_table_key(table.id), cached, settings.MACRO_CACHE_TIMEOUT)
+    return cached
+
+
+def get_random_table(user_id, pk):
+    """Return the user's cached table dict (with its alias table), or None."""
+    try:
+        pk = int(pk)
+    except (TypeError, ValueError):
+        return None
+    cached = cache.get(_table_key(pk))
+    if cached is None:
+        table = RandomTable.objects.filter(pk=pk).first()
+        if table is None:
+            return None
+        cached = cache_random_table(table)
+    # Tables are cached by id alone, so ownership is checked on every read.
+    return cached if cached["user_id"] == user_id else None
+
+
+def invalidate_random_table(pk):
+    cache.delete(_table_key(pk))
@@ -0,0 +1,74 @@
+"""
+Buffered cryptographic random source for the roll engine.
+
+BufferedCSPRNG exposes the two methods dice.engine needs — randbytes()
+and getrandbits() — backed by os.urandom. Asking the kernel for a few
+bytes per die would cost a syscall each, so bytes are fetched in
+BUFFER_SIZE blocks and handed out from a per-process buffer. The engine
+keeps doing its own rejection sampling on top, so faces stay unbiased.
+
+Buffered bytes must never be shared between processes: gunicorn forks
+its workers from the master, and a buffer inherited across fork() would
+give every worker the same rolls. Each buffer is discarded in the child
+right after fork, so the first draw in a new worker reads fresh bytes.
+"""
+
+import os
+import threading
+import weakref
+
+BUFFER_SIZE = 64 * 1024
+# Requests larger than this go straight to os.urandom instead of
+# draining (and refilling) the shared buffer.
+DIRECT_READ = BUFFER_SIZE // 4
+
+_instances = weakref.WeakSet()
+
+
+class BufferedCSPRNG:
+    """os.urandom-backed random source with a bulk-refilled buffer."""
+
+    def __init__(self, buffer_size=BUFFER_SIZE):
+        self.buffer_size = buffer_size
+        self.direct_read = min(DIRECT_READ, buffer_size)
+        self._reset()
+        _instances.add(self)
+
+    def _reset(self):
+        # A lock held by another thread at fork time stays held forever in
+        # the child, so the child gets a new one along with an empty buffer.
+        self._lock = threading.Lock()
+        self._buffer = b""
+        self._pos = 0
+
+    def randbytes(self, n):
+        """Return `n` random bytes."""
+        if n > self.direct_read:
+            return os.urandom(n)
+        with self._lock:
+            start = self._pos
+            end = start + n
+            if end > len(self._buffer):
+                # The unread tail is thrown away rather than stitched to
+                # the new block; it is at most `n` bytes.
+                self._buffer = os.urandom(self.buffer_size)
+                start, end = 0, n
+            self._pos = end
+            return self._buffer[start:end]
+
+    def getrandbits(self, k):
+        """Return a random int with `k` random bits, like random.getrandbits."""
+        if k <= 0:
+            return 0
+        nbytes = (k + 7) // 8
+        return int.from_bytes(self.randbytes(nbytes), "little") >> (nbytes * 8 - k)
+
+
+def _reset_after_fork():
+    for instance in list(_instances):
+        instance._reset()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+csprng = BufferedCSPRNG()
@@ -0,0 +1,121 @@
+"""
+Exact probability distributions for NdS+M rolls.
+
+The distribution of the sum of N dice is the single-die polynomial
+(x + x^2 + ... + x^S) / S raised to the Nth power. We build that power by
+repeated squaring, multiplying polynomials with a direct convolution when
+they are small and an FFT-based convolution once the product gets large.
+
+Arrays are indexed by offset from the minimum sum: pmf[i] is the
+probability of rolling exactly num_dice + i. They are memoized per
+(num_dice, sides) — the modifier only shifts the outcome range, so every
+modifier reuses the same cached array.
+
+pmf_cdf() serves common pairs from the precomputed, memory-mapped tables
+in dice/tables.py when they have been built, and computes the rest.
+probability(), chance_to_beat() and percentile() answer single questions
+from those arrays without building a response of the whole distribution.
+"""
+
+from functools import lru_cache
+
+import numpy as np
+
+from .tables import get_tables
+
+# Above this many multiply-adds, FFT convolution beats np.convolve.
+FFT_THRESHOLD = 1 << 14
+DISTRIBUTION_CACHE_SIZE = 64
+
+
+def _convolve(a, b):
+    """Multiply two probability polynomials."""
+    if len(a) * len(b) <= FFT_THRESHOLD:
+        return np.convolve(a, b)
+
+    n = len(a) + len(b) - 1
+    size = 1 << (n - 1).bit_length()
+    product = np.fft.irfft(np.fft.rfft(a, size) * np.fft.rfft(b, size), size)[:n]
+    # Round-off leaves tiny negative values in the far tails.
+    return np.clip(product, 0.0, None)
+
+
+@lru_cache(maxsize=DISTRIBUTION_CACHE_SIZE)
+def sum_pmf(num_dice, sides):
+    """PMF of the sum of `num_dice` fair dice with `sides` faces.
+
+    The returned array is read-only because it is shared through the cache.
+    """
+    result = None
+    base = np.full(sides, 1.0 / sides)
+    n = num_dice
+    while n:
+        if n & 1:
+            result = base if result is None else _convolve(result, base)
+        n >>= 1
+        if n:
+            base = _convolve(base, base)
+
+    result = result / result.sum()
+    result.setflags(write=False)
+    return result
+
+
+@lru_cache(maxsize=DISTRIBUTION_CACHE_SIZE)
+def sum_cdf(num_dice, sides):
+    """CDF matching sum_pmf(); the last entry is exactly 1."""
+    cdf = np.cumsum(sum_pmf(num_dice, sides))
+    cdf[-1] = 1.0
+    cdf.setflags(write=False)
+    return cdf
+
+
+def pmf_cdf(num_dice, sides):
+    """(pmf, cdf) for the pair, from the table file when it has them."""
+    tables = get_tables()
+    if tables is not None:
+        arrays = tables.get(num_dice, sides)
+        if arrays is not None:
+            return arrays
+    return sum_pmf(num_dice, sides), sum_cdf(num_dice, sides)
+
+
+def probability(num_dice, sides, modifier, total):
+    """P(NdS+M == total)."""
+    pmf, _ = pmf_cdf(num_dice, sides)
+    i = total - num_dice - modifier
+    return float(pmf[i]) if 0 <= i < len(pmf) else 0.0
+
+
+def chance_to_beat(num_dice, sides, modifier, dc):
+    """P(NdS+M >= dc) — the chance to meet or beat a difficulty class."""
+    _, cdf = pmf_cdf(num_dice, sides)
+    i = dc - num_dice - modifier
+    if i <= 0:
+        return 1.0
+    if i >= len(cdf):
+        return 0.0
+    return float(1.0 - cdf[i - 1])
+
+
+def percentile(num_dice, sides, modifier, p):
+    """Smallest total whose cumulative probability reaches p percent."""
+    _, cdf = pmf_cdf(num_dice, sides)
+    i = int(np.searchsorted(cdf, p / 100))
+    return num_dice + modifier + min(i, len(cdf) - 1)
+
+
+def distribution(num_dice, sides, modifier=0):
+    """Return the exact distribution of NdS+M as a response payload."""
+    pmf, cdf = pmf_cdf(num_dice, sides)
+    return {
+        "num_dice": num_dice,
+        "sides": sides,
+        "modifier": modifier,
+        "min": num_dice + modifier,
+        "max": num_dice * sides + modifier,
+        "mean": num_dice * (sides + 1) / 2 + modifier,
+        "variance": num_dice * (sides * sides - 1) / 12,
+        "pmf": pmf.tolist(),
+        "cdf": cdf.tolist(),
+    }
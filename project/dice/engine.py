@@ -0,0 +1,110 @@
+"""
+Shared roll engine used by every endpoint that rolls dice.
+
+Dice are drawn in bulk: a single randbytes() call supplies candidate
+words for every die in a request (or in a whole batch). Each word is
+mapped onto a face with `word % sides`, and words from the biased tail
+of the range are rejected so every face stays equally likely. The word
+width is picked per spec (8, 16 or 32 bits) to keep rejections rare;
+only rejected dice are redrawn.
+
+This replaces the old per-die random.randint() loop, which paid several
+Python-level calls for every die.
+
+The random source is selectable with use_rng(): "mt" (the default) is the
+module-level Mersenne Twister in `random`; "csprng" is the buffered
+os.urandom source in dice/csprng.py, for tables that need rolls nobody
+can predict. DiceConfig.ready() applies settings.ROLL_RNG.
+"""
+
+import random
+
+from .csprng import csprng
+
+RNG_BACKENDS = {"mt": random, "csprng": csprng}
+default_rng = random
+
+# (max sides, bytes per word, memoryview format) — narrowest width wins.
+_WORD_SIZES = (
+    (1 << 8, 1, "B"),
+    (1 << 16, 2, "H"),
+    (1 << 32, 4, "I"),
+)
+
+
+def _word_size(sides):
+    """Return (bytes per word, memoryview format, rejection limit) for `sides`."""
+    for span, size, fmt in _WORD_SIZES:
+        if sides <= span:
+            return size, fmt, span - span % sides
+    raise ValueError(f"Dice with more than {1 << 32} sides are not supported")
+
+
+def _accept(raw, sides, fmt, limit):
+    """Map raw random bytes onto faces, dropping words from the biased tail."""
+    words = raw if fmt == "B" else memoryview(raw).cast(fmt)
+    return [word % sides + 1 for word in words if word < limit]
+
+
+def use_rng(name):
+    """Select the random source used when no `rng` is passed."""
+    global default_rng
+    try:
+        default_rng = RNG_BACKENDS[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown RNG backend {name!r}; expected one of {sorted(RNG_BACKENDS)}"
+        ) from None
+
+
+def roll_die(sides, rng=None):
+    """Return a single uniform roll in [1, sides]."""
+    if rng is None:
+        rng = default_rng
+    width = (sides - 1).bit_length()
+    value = rng.getrandbits(width)
+    while value >= sides:
+        value = rng.getrandbits(width)
+    return value + 1
+
+
+def roll_dice(num_dice, sides, rng=None):
+    """Return a list of `num_dice` uniform rolls in [1, sides].
+
+    `rng` is anything exposing randbytes() and getrandbits(); when omitted
+    the backend chosen by use_rng() is used.
+    """
+    if rng is None:
+        rng = default_rng
+    if num_dice == 1:
+        return [roll_die(sides, rng)]
+
+    size, fmt, limit = _word_size(sides)
+    rolls = _accept(rng.randbytes(num_dice * size), sides, fmt, limit)
+    while len(rolls) < num_dice:
+        need = num_dice - len(rolls)
+        rolls += _accept(rng.randbytes(need * size), sides, fmt, limit)
+    return rolls
+
+
+def roll_many(specs, rng=None):
+    """Roll several (num_dice, sides) specs with a single bulk draw.
+
+    Returns one list of rolls per spec, in the same order as `specs`.
+    Dice rejected from the shared draw are topped up per spec.
+    """
+    if rng is None:
+        rng = default_rng
+    specs = [(num_dice, sides, *_word_size(sides)) for num_dice, sides in specs]
+    raw = memoryview(rng.randbytes(sum(n * size for n, _, size, _, _ in specs)))
+
+    results = []
+    offset = 0
+    for num_dice, sides, size, fmt, limit in specs:
+        end = offset + num_dice * size
+        rolls = _accept(raw[offset:end], sides, fmt, limit)
+        offset = end
+        if len(rolls) < num_dice:
+            rolls += roll_dice(num_dice - len(rolls), sides, rng)
+        results.append(rolls)
+    return results
@@ -0,0 +1,155 @@
+"""
+Buffered roll-history writes.
+
+Roll endpoints call record() instead of saving a RollHistory row per roll.
+Rows collect in a bounded in-process queue and a background thread writes
+them with one bulk_create() whenever HISTORY_FLUSH_SIZE rows are waiting
+or HISTORY_FLUSH_INTERVAL seconds have passed, whichever comes first.
+record() never touches the database, so it is safe from async views too.
+
+Overflow policy: the queue holds at most HISTORY_BUFFER_MAX rows. When it
+is full the oldest row is dropped to make room, a row whose total does
+not fit the `final` column is dropped on arrival, and a failed bulk write
+drops its batch; all are counted in `dropped`. History is best-effort —
+a slow or unavailable database must never slow down or fail a roll, and
+no error from a flush stops the flush thread.
+"""
+
+import atexit
+import logging
+import os
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .models import RollHistory
+
+logger = logging.getLogger(__name__)
+
+# The range of RollHistory.final, a 32-bit IntegerField.
+MIN_FINAL = -(2 ** 31)
+MAX_FINAL = 2 ** 31 - 1
+NOTATION_LENGTH = RollHistory._meta.get_field("notation").max_length
+
+
+class HistoryBuffer:
+    """Bounded queue of unsaved RollHistory rows plus its flush thread.
+
+    With interval=None no thread is started and rows are only written by
+    explicit flush() calls (used by the test settings).
+    """
+
+    def __init__(self, flush_size, max_size, interval):
+        self.flush_size = flush_size
+        self.max_size = max_size
+        self.interval = interval
+        self.dropped = 0
+        self._rows = deque()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def record(self, user_id, source, notation, result, macro_id=None):
+        """Queue one roll for writing; never blocks on the database."""
+        if not MIN_FINAL <= result["final"] <= MAX_FINAL:
+            # One unwritable row would otherwise fail its whole batch.
+            logger.warning("Dropping roll history row with final=%s", result["final"])
+            with self._lock:
+                self.dropped += 1
+            return
+        row = RollHistory(
+            user_id=user_id,
+            created_at=timezone.now(),
+            source=source,
+            notation=notation[:NOTATION_LENGTH],
+            macro_id=macro_id,
+            final=result["final"],
+            result=result,
+        )
+        with self._lock:
+            if len(self._rows) >= self.max_size:
+                self._rows.popleft()
+                self.dropped += 1
+            self._rows.append(row)
+            full = len(self._rows) >= self.flush_size
+
+        if self.interval is not None:
+            self._ensure_thread()
+            if full:
+                self._wake.set()
+
+    def flush(self):
+        """Write every queued row with one bulk_create; return rows written."""
+        with self._lock:
+            rows = list(self._rows)
+            self._rows.clear()
+        if not rows:
+            return 0
+        try:
+            RollHistory.objects.bulk_create(rows)
+        except Exception:
+            logger.exception("Dropping %d roll history rows", len(rows))
+            with self._lock:
+                self.dropped += len(rows)
+            return 0
+        return len(rows)
+
+    def clear(self):
+        """Discard queued rows without writing them."""
+        with self._lock:
+            self._rows.clear()
+            self.dropped = 0
+
+    def __len__(self):
+        return len(self._rows)
+
+    def _ensure_thread(self):
+        # Threads do not survive fork(), so a forked worker starts its own.
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._run, name="roll-history-flush", daemon=True
+            )
+            self._thread.start()
+        atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                close_old_connections()
+                self.flush()
+            except Exception:
+                logger.exception("Roll history flush failed")
+
+
+def roll_notation(num_dice, sides, modifier=0):
+    """Render a plain roll spec as NdS+M notation."""
+    return f"{num_dice}d{sides}{modifier:+d}" if modifier else f"{num_dice}d{sides}"
+
+
+def groups_notation(groups, modifier=0):
+    """Render a composite macro as "1d20+5, 2d6+3", cut to the column width."""
+    notation = ", ".join(
+        roll_notation(group["num_dice"], group["sides"], group["modifier"])
+        for group in groups
+    )
+    if modifier:
+        notation += f" {modifier:+d}"
+    return notation[:NOTATION_LENGTH]
+
+
+history_buffer = HistoryBuffer(
+    flush_size=settings.HISTORY_FLUSH_SIZE,
+    max_size=settings.HISTORY_BUFFER_MAX,
+    interval=settings.HISTORY_FLUSH_INTERVAL,
+)
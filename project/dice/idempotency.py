@@ -0,0 +1,131 @@
+"""
+Idempotency-Key support for the roll endpoints.
+
+A client that may retry a roll sends an `Idempotency-Key` header. The
+first request with a key runs and its payload is stored for
+IDEMPOTENCY_TTL seconds; a retry with the same key gets the stored
+payload back (marked with `Idempotent-Replayed: true`) instead of a new
+roll. Keys are scoped per endpoint and client — userId, or IP address
+for anonymous /api/roll/ callers (see ratelimit.client_key) — and per
+macro for macro rolls, so one client's key never replays another's result.
+
+Concurrent requests with the same key are coalesced: the first claims
+the key with cache.add() and runs, the others poll until its payload is
+stored (or give up with 409 after IDEMPOTENCY_WAIT seconds). A request
+that fails — bad input, unknown macro — releases its claim and stores
+nothing, so a corrected retry runs normally.
+
+Payloads live in the "idempotency" cache alias: a bounded locmem cache
+per process, or the shared Redis when REDIS_URL is set, which also
+coalesces retries that land on different workers.
+"""
+
+import asyncio
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.exceptions import APIException, ValidationError
+
+HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+
+_PENDING = "pending"
+_POLL_INTERVAL = 0.01
+
+
+class IdempotencyConflict(APIException):
+    status_code = 409
+    default_detail = "A request with this Idempotency-Key is still in progress."
+    default_code = "idempotency_conflict"
+
+
+class IdempotencyKeyReused(APIException):
+    status_code = 422
+    default_detail = "This Idempotency-Key was already used for a different request."
+    default_code = "idempotency_key_reused"
+
+
+def _claim(request, scope):
+    """Return (cache key, body fingerprint), or None without the header."""
+    key = request.headers.get(HEADER)
+    if key is None:
+        return None
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise ValidationError(
+            {"detail": f"{HEADER} must be 1-{MAX_KEY_LENGTH} characters."}
+        )
+    digest = hashlib.sha256(f"{scope}\0{key}".encode()).hexdigest()
+    return f"dice:idem:{digest}", hashlib.sha256(request.body).hexdigest()
+
+
+def _stored(entry, fingerprint):
+    if entry["fingerprint"] != fingerprint:
+        raise IdempotencyKeyReused()
+    return entry["payload"]
+
+
+def run_once(request, scope, compute):
+    """Run compute() at most once per Idempotency-Key.
+
+    Returns (payload, replayed). Without the header compute() simply runs.
+    """
+    claim = _claim(request, scope)
+    if claim is None:
+        return compute(), False
+
+    key, fingerprint = claim
+    store = caches["idempotency"]
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT
+    while not store.add(key, _PENDING, settings.IDEMPOTENCY_WAIT):
+        entry = store.get(key)
+        if entry is not None and entry != _PENDING:
+            return _stored(entry, fingerprint), True
+        if time.monotonic() >= deadline:
+            raise IdempotencyConflict()
+        time.sleep(_POLL_INTERVAL)
+
+    try:
+        payload = compute()
+    except BaseException:
+        store.delete(key)
+        raise
+    store.set(key, {"fingerprint": fingerprint, "payload": payload}, settings.IDEMPOTENCY_TTL)
+    return payload, False
+
+
+async def arun_once(request, scope, compute):
+    """Async run_once(); `compute` is a coroutine function."""
+    claim = _claim(request, scope)
+    if claim is None:
+        return await compute(), False
+
+    key, fingerprint = claim
+    store = caches["idempotency"]
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT
+    while not await store.aadd(key, _PENDING, settings.IDEMPOTENCY_WAIT):
+        entry = await store.aget(key)
+        if entry is not None and entry != _PENDING:
+            return _stored(entry, fingerprint), True
+        if time.monotonic() >= deadline:
+            raise IdempotencyConflict()
+        await asyncio.sleep(_POLL_INTERVAL)
+
+    try:
+        payload = await compute()
+    except BaseException:
+        await store.adelete(key)
+        raise
+    await store.aset(
+        key, {"fingerprint": fingerprint, "payload": payload}, settings.IDEMPOTENCY_TTL
+    )
+    return payload, False
+
+
+def mark_replayed(response, replayed):
+    """Flag a response that was served from a stored payload."""
+    if replayed:
+        response[REPLAYED_HEADER] = "true"
+    return response
@@ -0,0 +1,39 @@
+"""Build the memory-mapped distribution tables (see dice/tables.py)."""
+
+from time import perf_counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from dice.notation import MAX_DICE
+from dice.tables import TABLE_SIDES, build_tables
+
+
+class Command(BaseCommand):
+    help = "Precompute PMF/CDF tables for the common dice and write them to DISTRIBUTION_TABLES."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output", default=settings.DISTRIBUTION_TABLES,
+            help="Table file to write (default: settings.DISTRIBUTION_TABLES).",
+        )
+        parser.add_argument(
+            "--sides", type=int, nargs="+", default=TABLE_SIDES,
+            help="Die sizes to tabulate (default: %(default)s).",
+        )
+        parser.add_argument(
+            "--max-dice", type=int, default=MAX_DICE,
+            help="Tabulate 1..N dice of each size (default: %(default)s).",
+        )
+
+    def handle(self, *args, output, sides, max_dice, **options):
+        if not output:
+            raise CommandError("No output path: pass --output or set DISTRIBUTION_TABLES.")
+        started = perf_counter()
+        try:
+            count = build_tables(output, sides=sides, max_dice=max_dice)
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(
+            f"Wrote {count} distributions to {output} in {perf_counter() - started:.1f}s"
+        )
@@ -0,0 +1,173 @@
+"""
+Per-request phase timings and in-process latency histograms.
+
+TimingMiddleware (dice/middleware.py) starts a RequestTimer for a sampled
+fraction of requests (METRICS_SAMPLE_RATE). While it is active, code
+wraps work in `with phase("name"):` and database queries are timed by an
+execute wrapper installed on every connection. Unsampled requests pay for
+one ContextVar lookup per hook and nothing else.
+
+Finished timers are reported in a Server-Timing header and folded into
+fixed-bucket histograms, rendered for /metrics in the Prometheus text
+exposition format.
+"""
+
+import contextvars
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from time import perf_counter
+
+# Upper bounds in seconds; +Inf is implicit.
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+_current = contextvars.ContextVar("dice_request_timer", default=None)
+
+
+class RequestTimer:
+    """Accumulated seconds per phase for one sampled request."""
+
+    __slots__ = ("phases", "queries", "started")
+
+    def __init__(self):
+        self.phases = {}
+        self.queries = 0
+        self.started = perf_counter()
+
+    def add(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def server_timing(self):
+        """Render the phases as a Server-Timing header value (milliseconds)."""
+        parts = []
+        for name, seconds in self.phases.items():
+            part = f"{name};dur={seconds * 1000:.3f}"
+            if name == "db":
+                part += f';desc="{self.queries} queries"'
+            parts.append(part)
+        return ", ".join(parts)
+
+
+def start_timer():
+    """Activate a timer for the current request; returns (timer, reset token)."""
+    timer = RequestTimer()
+    return timer, _current.set(timer)
+
+
+def stop_timer(token):
+    _current.reset(token)
+
+
+def current_timer():
+    return _current.get()
+
+
+@contextmanager
+def phase(name):
+    """Time the enclosed block as `name` if the current request is sampled."""
+    timer = _current.get()
+    if timer is None:
+        yield
+        return
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        timer.add(name, perf_counter() - start)
+
+
+def time_query(execute, sql, params, many, context):
+    """Connection execute wrapper that adds query time to the "db" phase."""
+    timer = _current.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    start = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timer.add("db", perf_counter() - start)
+        timer.queries += 1
+
+
+def install_query_timer(sender, connection, **kwargs):
+    """connection_created handler: time every query on the new connection."""
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+class Histogram:
+    """Thread-safe fixed-bucket histogram of durations in seconds."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += seconds
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.sum
+
+
+class Registry:
+    """Histograms keyed by metric name and label values."""
+
+    def __init__(self):
+        self._histograms = {}
+        self._help = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name, help_text, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram())
+                self._help.setdefault(name, help_text)
+        return histogram
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+
+    def render(self):
+        """Prometheus text exposition of every histogram."""
+        lines = []
+        seen = set()
+        for (name, labels), histogram in sorted(self._histograms.items()):
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+            counts, total = histogram.snapshot()
+            label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+            prefix = label_text + "," if label_text else ""
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{name}_bucket{{{prefix}le="{le}"}} {cumulative}')
+            lines.append(f"{name}_sum{{{label_text}}} {total}")
+            lines.append(f"{name}_count{{{label_text}}} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def observe_request(timer, method, route, elapsed):
+    """Fold a finished request's timings into the histograms."""
+    registry.histogram(
+        "dice_request_duration_seconds", "Request latency by route.",
+        method=method, route=route,
+    ).observe(elapsed)
+    for name, seconds in timer.phases.items():
+        registry.histogram(
+            "dice_request_phase_seconds", "Time spent per request phase.", phase=name,
+        ).observe(seconds)
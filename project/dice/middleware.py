@@ -0,0 +1,85 @@
+"""Request timing middleware (see dice/metrics.py)."""
+
+import random
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from . import metrics
+
+
+class TimingMiddleware:
+    """Time a sampled fraction of requests and emit a Server-Timing header.
+
+    Place it first in MIDDLEWARE so "total" covers the whole stack. The
+    "view" phase runs from process_view until the view returns and
+    "render" covers template-response rendering (DRF's Response). Other
+    phases — auth, validate, roll, db — are recorded by phase() hooks.
+    METRICS_SAMPLE_RATE (0.0-1.0) picks how many requests are timed;
+    unsampled requests are passed straight through.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def _sampled():
+        rate = settings.METRICS_SAMPLE_RATE
+        return rate >= 1.0 or (rate > 0.0 and random.random() < rate)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self._sampled():
+            return self.get_response(request)
+
+        timer, token = metrics.start_timer()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.stop_timer(token)
+        return self._finish(request, response, timer)
+
+    async def __acall__(self, request):
+        if not self._sampled():
+            return await self.get_response(request)
+
+        timer, token = metrics.start_timer()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.stop_timer(token)
+        return self._finish(request, response, timer)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        timer = metrics.current_timer()
+        if timer is not None:
+            request._timing_view_started = perf_counter()
+
+    def process_template_response(self, request, response):
+        if metrics.current_timer() is not None:
+            request._timing_view_finished = perf_counter()
+        return response
+
+    def _finish(self, request, response, timer):
+        now = perf_counter()
+        view_started = getattr(request, "_timing_view_started", None)
+        if view_started is not None:
+            view_finished = getattr(request, "_timing_view_finished", now)
+            timer.add("view", view_finished - view_started)
+            if view_finished is not now:
+                timer.add("render", now - view_finished)
+        elapsed = now - timer.started
+        timer.add("total", elapsed)
+
+        match = getattr(request, "resolver_match", None)
+        route = match.route if match is not None else "unmatched"
+        metrics.observe_request(timer, request.method, route, elapsed)
+        response["Server-Timing"] = timer.server_timing()
+        return response
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dice', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dicemacro',
+            name='expression',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='dicemacro',
+            name='num_dice',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='dicemacro',
+            name='sides',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:24
+
+from django.db import migrations, models
+
+
+def backfill_quota(apps, schema_editor):
+    """Seed one quota row per user from their existing macros."""
+    DiceMacro = apps.get_model("dice", "DiceMacro")
+    MacroQuota = apps.get_model("dice", "MacroQuota")
+    counts = DiceMacro.objects.values("user_id").annotate(n=models.Count("id"))
+    MacroQuota.objects.bulk_create(
+        MacroQuota(user_id=row["user_id"], count=row["n"]) for row in counts
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dice', '0002_macro_expression'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MacroQuota',
+            fields=[
+                ('user_id', models.CharField(max_length=16, primary_key=True, serialize=False)),
+                ('count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(backfill_quota, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dice', '0003_macro_quota'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.CharField(max_length=16)),
+                ('created_at', models.DateTimeField()),
+                ('source', models.CharField(max_length=16)),
+                ('notation', models.CharField(max_length=100)),
+                ('macro_id', models.BigIntegerField(blank=True, null=True)),
+                ('final', models.IntegerField()),
+                ('result', models.JSONField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user_id', 'created_at'], name='dice_history_user_created')],
+            },
+        ),
+    ]
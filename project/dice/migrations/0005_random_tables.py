@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dice', '0004_roll_history'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TableQuota',
+            fields=[
+                ('user_id', models.CharField(max_length=16, primary_key=True, serialize=False)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='RandomTable',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.CharField(max_length=16)),
+                ('name', models.CharField(max_length=100)),
+                ('entries', models.JSONField()),
+            ],
+            options={
+                'unique_together': {('user_id', 'name')},
+            },
+        ),
+    ]
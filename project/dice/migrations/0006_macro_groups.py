@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dice', '0005_random_tables'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dicemacro',
+            name='groups',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -1,24 +1,203 @@
 """Models for the dice app."""
 
-from django.db import models
+from django.db import connection, models, transaction
+
+MAX_MACROS_PER_USER = 10
+MAX_MACRO_GROUPS = 10
+MAX_TABLES_PER_USER = 10
+MAX_TABLE_ENTRIES = 1000
+MAX_TABLE_WEIGHT = 1e12
+
+
+class MacroLimitExceeded(Exception):
+    """Raised when a user already owns MAX_MACROS_PER_USER macros."""
+
+
+class TableLimitExceeded(Exception):
+    """Raised when a user already owns MAX_TABLES_PER_USER random tables."""
+
+
+class Quota(models.Model):
+    """Per-user count of owned rows, used to enforce a per-user limit.
+
+    The row is bumped by a single conditional upsert in the same transaction
+    as the owning row's INSERT. The upsert takes a row lock, so concurrent
+    creates for one user are serialized and can never push the count past
+    the limit. Subclasses set `limit`, `exceeded` and `noun`.
+    """
+
+    user_id = models.CharField(max_length=16, primary_key=True)
+    count = models.IntegerField(default=0)
+
+    limit = None
+    exceeded = None
+    noun = None
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def reserve(cls, user_id, limit=None, n=1):
+        """Claim `n` slots for `user_id` or raise the subclass's limit error.
+
+        With n=0 nothing is claimed, but the quota row is still locked
+        until the transaction ends.
+        """
+        limit = cls.limit if limit is None else limit
+        table = connection.ops.quote_name(cls._meta.db_table)
+        with connection.cursor() as cursor:
+            if n <= limit:
+                cursor.execute(
+                    f"INSERT INTO {table} (user_id, count) VALUES (%s, %s) "
+                    f"ON CONFLICT (user_id) DO UPDATE SET count = {table}.count + %s "
+                    f"WHERE {table}.count + %s <= %s",
+                    [user_id, n, n, n, limit],
+                )
+            if n > limit or cursor.rowcount == 0:
+                raise cls.exceeded(
+                    f"You can only save up to {limit} {cls.noun}."
+                )
+
+    @classmethod
+    def release(cls, user_id, n=1):
+        """Give back `n` slots after rows are deleted."""
+        cls.objects.filter(user_id=user_id).update(count=models.F("count") - n)
+
+
+class MacroQuota(Quota):
+    """Macro count per user; DiceMacro.save() and post_delete keep it in step."""
+
+    limit = MAX_MACROS_PER_USER
+    exceeded = MacroLimitExceeded
+    noun = "macros"
+
+
+class TableQuota(Quota):
+    """Random-table count per user, maintained like MacroQuota."""
+
+    limit = MAX_TABLES_PER_USER
+    exceeded = TableLimitExceeded
+    noun = "random tables"
 
 
 class DiceMacro(models.Model):
     """A saved dice roll configuration owned by a specific user.
 
-    Each macro stores the number of dice, sides per die, and an optional
-    modifier. Users can trigger a roll from a macro instead of specifying
-    parameters each time.
+    Each macro stores either the number of dice, sides per die, and an
+    optional modifier, or a dice-notation expression (see dice/notation.py)
+    which takes precedence when set. A composite macro instead stores an
+    ordered list of dice groups in `groups` — {"label", "num_dice",
+    "sides", "modifier"} objects, e.g. attack then damage — which take
+    precedence over both and are rolled together, with `modifier` added
+    to the grand total. Users can trigger a roll from a macro instead of
+    specifying parameters each time.
     """
 
     user_id = models.CharField(max_length=16)   # 16-char ID from the JWT
     name = models.CharField(max_length=100)
-    num_dice = models.IntegerField()
-    sides = models.IntegerField()
+    num_dice = models.IntegerField(null=True, blank=True)
+    sides = models.IntegerField(null=True, blank=True)
     modifier = models.IntegerField(default=0)
+    expression = models.CharField(max_length=100, blank=True, default="")
+    # Inline JSON rather than a child table, so a roll is still one row.
+    groups = models.JSONField(default=list, blank=True)
 
     class Meta:
-        unique_together = ("user_id", "name")   # one macro name per user
+        # One macro name per user. The constraint's (user_id, name) index
+        # also serves the user_id-only ownership lookups in get_queryset.
+        unique_together = ("user_id", "name")
+
+    def save(self, *args, **kwargs):
+        """Reserve a quota slot atomically with the INSERT of a new macro."""
+        if not self._state.adding:
+            return super().save(*args, **kwargs)
+        with transaction.atomic():
+            MacroQuota.reserve(self.user_id)
+            super().save(*args, **kwargs)
+
+    @classmethod
+    def upsert(cls, user_id, macros):
+        """Create or update the user's `macros` by name in one statement.
+
+        `macros` are unsaved instances with distinct names. Names the user
+        already has are updated in place, the rest inserted, all by one
+        bulk_create() on the (user_id, name) constraint. That bypasses
+        save() and the post_save signal, so the quota is reserved here —
+        once, for however many names are new — and the caller invalidates
+        the macro cache. Returns the number of macros created.
+        """
+        with transaction.atomic():
+            # Lock the quota row first, so a concurrent create for this user
+            # cannot add one of these names between the lookup and the upsert.
+            MacroQuota.reserve(user_id, n=0)
+            existing = set(
+                cls.objects.filter(user_id=user_id, name__in=[m.name for m in macros])
+                .values_list("name", flat=True)
+            )
+            created = sum(macro.name not in existing for macro in macros)
+            if created:
+                MacroQuota.reserve(user_id, n=created)
+            cls.objects.bulk_create(
+                macros,
+                update_conflicts=True,
+                unique_fields=["user_id", "name"],
+                update_fields=["num_dice", "sides", "modifier", "expression", "groups"],
+            )
+        return created
+
+    def __str__(self):
+        if self.groups:
+            return f"{self.name} ({len(self.groups)} groups)"
+        if self.expression:
+            return f"{self.name} ({self.expression})"
+        return f"{self.name} ({self.num_dice}d{self.sides}+{self.modifier})"
+
+
+class RandomTable(models.Model):
+    """A user-owned weighted table (loot, encounters, ...) to draw from.
+
+    `entries` is a list of {"value": str, "weight": number} objects. Draws
+    go through an alias table built from the weights (see dice/alias.py),
+    which is cached per table and rebuilt whenever the table is saved.
+    """
+
+    user_id = models.CharField(max_length=16)   # 16-char ID from the JWT
+    name = models.CharField(max_length=100)
+    entries = models.JSONField()
+
+    class Meta:
+        unique_together = ("user_id", "name")
+
+    def save(self, *args, **kwargs):
+        """Reserve a quota slot atomically with the INSERT of a new table."""
+        if not self._state.adding:
+            return super().save(*args, **kwargs)
+        with transaction.atomic():
+            TableQuota.reserve(self.user_id)
+            super().save(*args, **kwargs)
 
     def __str__(self):
-        return f"{self.name} ({self.num_dice}d{self.sides}+{self.modifier})"
\ No newline at end of file
+        return f"{self.name} ({len(self.entries)} entries)"
+
+
+class RollHistory(models.Model):
+    """One recorded roll made by an authenticated user.
+
+    Rows are written in batches by the in-process buffer in dice/history.py
+    rather than one INSERT per roll. `result` holds the response payload
+    exactly as the roll endpoint returned it.
+    """
+
+    user_id = models.CharField(max_length=16)
+    created_at = models.DateTimeField()
+    source = models.CharField(max_length=16)   # roll, batch, expression, macro
+    notation = models.CharField(max_length=100)
+    macro_id = models.BigIntegerField(null=True, blank=True)
+    final = models.IntegerField()
+    result = models.JSONField()
+
+    class Meta:
+        indexes = [
+            # Backs the keyset-paginated "my latest rolls" query.
+            models.Index(fields=["user_id", "created_at"], name="dice_history_user_created"),
+        ]
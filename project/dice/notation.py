@@ -0,0 +1,281 @@
+"""
+Dice-notation expressions, e.g. ``4d6kh3 + 2d8 + 1d4! - 2``.
+
+An expression is compiled once into a CompiledExpression — a flat plan of
+dice groups plus a folded constant modifier — and the plan is kept in a
+bounded LRU keyed by the normalized string (whitespace stripped,
+lowercased). Rolling the same expression again skips parsing entirely.
+
+Supported per-group suffixes, in this order:
+    !      exploding dice: every die showing its maximum adds another die
+    rN     reroll dice below N until they show N or more
+    khN    keep the N highest dice (``kN`` is shorthand)
+    klN    keep the N lowest dice
+    dhN    drop the N highest dice
+    dlN    drop the N lowest dice
+    >=T    count successes: the group scores the number of kept dice
+           showing T or more instead of their sum (``10d10>=7``)
+
+Rerolling until a die shows N or more is the same as rolling a smaller
+die over N..S, so rerolls are drawn directly from that range instead of
+looping. A success-counting group with no ``!`` or keep/drop can also be
+rolled without individual dice (``roll(dice=False)``): its count is then
+sampled straight from the binomial distribution with one draw.
+"""
+
+import re
+from bisect import bisect_right
+from collections import namedtuple
+from functools import lru_cache
+from math import comb
+
+from . import engine
+
+MAX_EXPRESSION_LENGTH = 100
+MAX_GROUPS = 10
+MAX_DICE = 100
+MIN_SIDES = 2
+MAX_SIDES = 1000
+# Bound on a roll's flat modifier, so every total fits a 32-bit column.
+MAX_MODIFIER = 1_000_000
+# Extra dice a single exploding group may add before the chain is cut off.
+MAX_EXPLOSIONS = 100
+COMPILED_CACHE_SIZE = 1024
+
+_TERM = re.compile(
+    r"([+-])(?:(\d*)d(\d+)(!?)(?:r(\d+))?(?:(kh|kl|dh|dl|k)(\d+))?(?:>=(\d+))?|(\d+))"
+)
+_EXPRESSION = re.compile(rf"(?:{_TERM.pattern})+")
+
+DiceGroup = namedtuple(
+    "DiceGroup", "sign count sides explode reroll keep keep_count target notation"
+)
+
+
+class NotationError(ValueError):
+    """Raised when an expression cannot be parsed or is out of bounds."""
+
+
+def normalize(expression):
+    """Canonical cache key: no whitespace, lowercase."""
+    return "".join(expression.split()).lower()
+
+
+def _select(rolls, keep, keep_count):
+    """Return the dice kept by a kh/kl/dh/dl suffix, in roll order.
+
+    One C-level sort of the faces finds the cut-off value; a single pass
+    then keeps every die past it plus as many dice equal to it as still
+    fit, earliest first — no per-die key function or index sort.
+    """
+    if keep is None:
+        return rolls
+    if keep in ("dh", "dl"):
+        # Dropping N highest is keeping the rest lowest, and vice versa.
+        keep, keep_count = ("kl" if keep == "dh" else "kh"), len(rolls) - keep_count
+    faces = sorted(rolls)
+    if keep == "kh":
+        cut = faces[-keep_count]
+        ties = faces[-keep_count:].count(cut)
+        beyond = cut.__lt__
+    else:
+        cut = faces[keep_count - 1]
+        ties = faces[:keep_count].count(cut)
+        beyond = cut.__gt__
+    kept = []
+    for roll in rolls:
+        if beyond(roll):
+            kept.append(roll)
+        elif roll == cut and ties:
+            kept.append(roll)
+            ties -= 1
+    return kept
+
+
+def _explode(rolls, sides, rng):
+    """Add a die for every maximum, wave by wave, up to MAX_EXPLOSIONS extra."""
+    pending = rolls.count(sides)
+    budget = MAX_EXPLOSIONS
+    while pending and budget:
+        wave = engine.roll_dice(min(pending, budget), sides, rng)
+        budget -= len(wave)
+        rolls += wave
+        pending = wave.count(sides)
+    return rolls
+
+
+@lru_cache(maxsize=COMPILED_CACHE_SIZE)
+def _binomial_cdf(n, hits, faces):
+    """CDF of the success count for n dice that each hit with hits/faces."""
+    p = hits / faces
+    cdf = []
+    running = 0.0
+    for k in range(n + 1):
+        running += comb(n, k) * p ** k * (1 - p) ** (n - k)
+        cdf.append(running)
+    return cdf
+
+
+def _count_successes(n, hits, faces, rng):
+    """Sample a success count directly: one uniform draw, one bisection."""
+    u = rng.getrandbits(53) / (1 << 53)
+    return min(bisect_right(_binomial_cdf(n, hits, faces), u), n)
+
+
+class CompiledExpression:
+    """An evaluation plan for one normalized dice expression."""
+
+    def __init__(self, notation, groups, modifier):
+        self.notation = notation
+        self.groups = groups
+        self.modifier = modifier
+        # Rerolled groups are drawn from the faces reroll..sides.
+        self._specs = [(g.count, g.sides - (g.reroll or 1) + 1) for g in groups]
+        self._countable = [
+            g.target is not None and not g.explode and g.keep is None for g in groups
+        ]
+
+    def roll(self, rng=None, dice=True):
+        """Roll every group with one bulk draw and return the result payload.
+
+        With dice=False, success-counting groups without ``!`` or
+        keep/drop report only their count, sampled without rolling dice.
+        """
+        if rng is None:
+            rng = engine.default_rng
+        direct = [countable and not dice for countable in self._countable]
+        drawn = iter(engine.roll_many(
+            [spec for spec, skip in zip(self._specs, direct) if not skip], rng
+        ))
+
+        results = []
+        total = 0
+        for group, (_, faces), skip in zip(self.groups, self._specs, direct):
+            low = group.reroll or 1
+            if skip:
+                hits = group.sides - max(group.target, low) + 1
+                successes = _count_successes(group.count, max(hits, 0), faces, rng)
+                subtotal = group.sign * successes
+                total += subtotal
+                results.append({
+                    "notation": group.notation,
+                    "successes": successes,
+                    "total": subtotal,
+                })
+                continue
+
+            rolls = next(drawn)
+            if group.explode:
+                rolls = _explode(rolls, faces, rng)
+            if low > 1:
+                rolls = [roll + low - 1 for roll in rolls]
+            kept = _select(rolls, group.keep, group.keep_count)
+            result = {"notation": group.notation, "rolls": rolls, "kept": kept}
+            if group.target is None:
+                subtotal = group.sign * sum(kept)
+            else:
+                result["successes"] = sum(roll >= group.target for roll in kept)
+                subtotal = group.sign * result["successes"]
+            total += subtotal
+            result["total"] = subtotal
+            results.append(result)
+
+        return {
+            "expression": self.notation,
+            "groups": results,
+            "total": total,
+            "modifier": self.modifier,
+            "final": total + self.modifier,
+        }
+
+
+def _parse(notation):
+    if not notation:
+        raise NotationError("Expression is empty.")
+    if len(notation) > MAX_EXPRESSION_LENGTH:
+        raise NotationError(
+            f"Expression must be at most {MAX_EXPRESSION_LENGTH} characters."
+        )
+
+    signed = notation if notation[0] in "+-" else "+" + notation
+    if not _EXPRESSION.fullmatch(signed):
+        raise NotationError(f"Could not parse dice expression '{notation}'.")
+
+    groups = []
+    modifier = 0
+    for match in _TERM.finditer(signed):
+        sign, count, sides, explode, reroll, keep, keep_count, target, constant = (
+            match.groups()
+        )
+        sign = -1 if sign == "-" else 1
+        if constant is not None:
+            modifier += sign * int(constant)
+            continue
+
+        count = int(count) if count else 1
+        sides = int(sides)
+        if not 1 <= count <= MAX_DICE:
+            raise NotationError(f"Number of dice must be between 1 and {MAX_DICE}.")
+        if not MIN_SIDES <= sides <= MAX_SIDES:
+            raise NotationError(
+                f"Sides must be between {MIN_SIDES} and {MAX_SIDES}."
+            )
+
+        if reroll is not None:
+            reroll = int(reroll)
+            # At least two faces must remain, so an exploding group can stop.
+            if not 2 <= reroll < sides:
+                raise NotationError(
+                    f"'{match.group(0)[1:]}' must reroll below a value from 2 to {sides - 1}."
+                )
+        if target is not None:
+            target = int(target)
+            if not 1 <= target <= sides:
+                raise NotationError(
+                    f"'{match.group(0)[1:]}' needs a success target from 1 to {sides}."
+                )
+
+        if keep is not None:
+            keep = "kh" if keep == "k" else keep
+            keep_count = int(keep_count)
+            # Keeping must leave at least one die; dropping must leave one too.
+            upper = count if keep in ("kh", "kl") else count - 1
+            if not 1 <= keep_count <= upper:
+                raise NotationError(
+                    f"'{match.group(0)[1:]}' keeps or drops an invalid number of dice."
+                )
+        else:
+            keep_count = None
+
+        groups.append(DiceGroup(
+            sign, count, sides, bool(explode), reroll, keep, keep_count, target,
+            match.group(0)[1:],
+        ))
+
+    if not groups:
+        raise NotationError("Expression must contain at least one dice group.")
+    if len(groups) > MAX_GROUPS:
+        raise NotationError(f"Expressions may contain at most {MAX_GROUPS} dice groups.")
+    if not -MAX_MODIFIER <= modifier <= MAX_MODIFIER:
+        raise NotationError(
+            f"Constants must add up to between {-MAX_MODIFIER} and {MAX_MODIFIER}."
+        )
+    return CompiledExpression(notation, tuple(groups), modifier)
+
+
+@lru_cache(maxsize=COMPILED_CACHE_SIZE)
+def _compile_normalized(notation):
+    return _parse(notation)
+
+
+def compile_expression(expression):
+    """Return the cached CompiledExpression for `expression`.
+
+    Raises NotationError for malformed or out-of-bounds expressions.
+    """
+    return _compile_normalized(normalize(expression))
+
+
+def cache_info():
+    """Hit/miss statistics for the compiled-expression cache."""
+    return _compile_normalized.cache_info()
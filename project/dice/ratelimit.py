@@ -0,0 +1,147 @@
+"""
+Token-bucket rate limiting for the public roll endpoint.
+
+Each client gets a bucket of ROLL_RATE_LIMIT_BURST tokens that refills
+at ROLL_RATE_LIMIT_RATE tokens per second; a request takes one token or
+is refused with 429 and a Retry-After of the time until the next token.
+A view may charge more through a throttle_cost(request) method — a batch
+costs one token per roll, as if each were sent to /api/roll/. A request
+is let through while a token is left and may overdraw the bucket; the
+debt is repaid before the client's next request is allowed.
+Clients are keyed by userId when they send a valid cookie and by IP
+address otherwise. The address comes from DRF's get_ident(): REMOTE_ADDR,
+unless REST_FRAMEWORK["NUM_PROXIES"] (the NUM_PROXIES environment
+variable) says how many X-Forwarded-For hops were added by trusted
+proxies. X-Forwarded-For is never trusted beyond those hops, so a client
+cannot pick a fresh bucket per request.
+
+RollRateThrottle plugs this into DRF's throttling hook, which runs in
+APIView.initial() — before the view body, so refused requests never
+reach the serializer or the roll engine.
+
+Two bucket stores are available (ROLL_RATE_LIMIT_BACKEND):
+    "local"  LocalBuckets, an LRU of at most ROLL_RATE_LIMIT_BUCKETS
+             buckets per process; idle buckets are evicted first.
+    "cache"  CacheBuckets, buckets in the Django cache so every worker
+             shares one limit (with Redis). Its read-modify-write is not
+             atomic, so bursts racing across workers can let a few extra
+             requests through.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import BaseThrottle
+
+from .authentication import optional_user
+
+
+def _take(entry, now, rate, burst, cost=1):
+    """Refill `entry` (tokens, stamp) and try to take `cost` tokens.
+
+    Returns (new entry, seconds to wait); a wait of 0 means allowed.
+    """
+    if entry is None:
+        tokens = burst
+    else:
+        tokens, stamp = entry
+        tokens = min(burst, tokens + (now - stamp) * rate)
+    if tokens >= 1:
+        return (tokens - cost, now), 0.0
+    return (tokens, now), (1 - tokens) / rate
+
+
+class LocalBuckets:
+    """Per-process buckets in a bounded LRU; O(1) per request."""
+
+    def __init__(self, rate, burst, maxsize):
+        self.rate = rate
+        self.burst = burst
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, cost=1):
+        """Take `cost` tokens for `key`; return seconds to wait (0 if allowed)."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._buckets.get(key)
+            if entry is None:
+                if len(self._buckets) >= self.maxsize:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+            self._buckets[key], wait = _take(entry, now, self.rate, self.burst, cost)
+        return wait
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class CacheBuckets:
+    """Buckets stored in the Django cache, shared by every worker."""
+
+    def __init__(self, rate, burst, maxsize=None):
+        self.rate = rate
+        self.burst = burst
+        # An idle bucket is full again after this long, so it can expire.
+        self.timeout = int(burst / rate) + 1
+
+    def take(self, key, cost=1):
+        """Take `cost` tokens for `key`; return seconds to wait (0 if allowed)."""
+        cache_key = f"dice:ratelimit:{key}"
+        entry, wait = _take(cache.get(cache_key), time.time(), self.rate, self.burst, cost)
+        # An overdrawn bucket takes longer than a full one to refill.
+        cache.set(cache_key, entry, self.timeout + max(0, int(-entry[0] / self.rate)))
+        return wait
+
+    def clear(self):
+        pass  # entries expire on their own
+
+
+BACKENDS = {"local": LocalBuckets, "cache": CacheBuckets}
+
+
+@lru_cache(maxsize=None)
+def get_buckets(backend, rate, burst, maxsize):
+    """The bucket store for a configuration; one instance per process."""
+    return BACKENDS[backend](rate, burst, maxsize)
+
+
+def client_key(request):
+    """"user:<userId>" for a request with a valid cookie, else "ip:<address>"."""
+    user = optional_user(request) if "access_token" in request.COOKIES else None
+    if user is not None:
+        return f"user:{user.id}"
+    return f"ip:{BaseThrottle().get_ident(request)}"
+
+
+class RollRateThrottle(BaseThrottle):
+    """DRF throttle backed by the ROLL_RATE_LIMIT_* token buckets.
+
+    A rate of 0 turns limiting off.
+    """
+
+    def allow_request(self, request, view):
+        if not settings.ROLL_RATE_LIMIT_RATE:
+            return True
+        buckets = get_buckets(
+            settings.ROLL_RATE_LIMIT_BACKEND,
+            settings.ROLL_RATE_LIMIT_RATE,
+            settings.ROLL_RATE_LIMIT_BURST,
+            settings.ROLL_RATE_LIMIT_BUCKETS,
+        )
+        cost = view.throttle_cost(request) if hasattr(view, "throttle_cost") else 1
+        self._wait = buckets.take(client_key(request), cost)
+        return not self._wait
+
+    def wait(self):
+        return self._wait
@@ -0,0 +1,139 @@
+"""
+Seeded, replayable rolls.
+
+A roll made with a session seed draws its randomness from CounterRNG,
+a counter-based generator: every byte is BLAKE2b keyed by the session
+over (counter, block), so roll #k of a session depends only on the
+session and k. Replaying or verifying a roll recomputes it directly from
+its counter — no earlier rolls are regenerated, and the engine's
+rejection sampling runs on the derived bytes exactly as it did the
+first time.
+
+The session key mixes the client's seed with a secret the server draws
+when the session starts, so a client cannot search seeds offline for
+favourable rolls. Each seeded roll carries `commitment`, the SHA-256 of
+that secret, so the player can check later that it was fixed before
+their first roll. The secret is revealed by end_session(), which
+/api/roll/verify/ calls for the caller's own session when no `secret`
+is passed; a revealed session is over, and the next roll with the same
+seed starts a fresh one.
+
+Sessions — the secret and the next counter — live in the Django cache,
+scoped to the client (see ratelimit.client_key), so clients picking the
+same seed never share a session. Point REDIS_URL at a shared Redis when
+running several workers, or each process keeps its own sessions.
+"""
+
+import hashlib
+import hmac
+import secrets
+
+from django.conf import settings
+from django.core.cache import cache
+
+MAX_SEED_LENGTH = 128
+SECRET_LENGTH = 64  # hex characters
+# Bytes produced per BLAKE2b call (its maximum digest size).
+_BLOCK_SIZE = 64
+
+
+class CounterRNG:
+    """Random source for roll number `counter` of the session (`seed`, `secret`)."""
+
+    def __init__(self, seed, counter, secret=""):
+        # A fixed-size key whatever the seed's length.
+        self._key = hmac.new(secret.encode(), seed.encode(), hashlib.sha256).digest()
+        self._prefix = counter.to_bytes(8, "big")
+        self._block = 0
+        self._pending = b""
+
+    def _next_block(self):
+        message = self._prefix + self._block.to_bytes(8, "big")
+        self._block += 1
+        return hashlib.blake2b(message, key=self._key, digest_size=_BLOCK_SIZE).digest()
+
+    def randbytes(self, n):
+        """Return the next `n` bytes of this roll's stream."""
+        chunks = [self._pending]
+        available = len(self._pending)
+        while available < n:
+            block = self._next_block()
+            chunks.append(block)
+            available += len(block)
+        data = b"".join(chunks)
+        self._pending = data[n:]
+        return data[:n]
+
+    def getrandbits(self, k):
+        """Return an int with `k` bits from the stream, like random.getrandbits."""
+        if k <= 0:
+            return 0
+        nbytes = (k + 7) // 8
+        return int.from_bytes(self.randbytes(nbytes), "little") >> (nbytes * 8 - k)
+
+
+def commitment(secret):
+    """What a seeded roll shows of its session's secret until it is revealed."""
+    return hashlib.sha256(secret.encode()).hexdigest()
+
+
+def _new_secret():
+    return secrets.token_hex(SECRET_LENGTH // 2)
+
+
+def _key(owner, seed):
+    return "dice:seed:" + hashlib.sha256(f"{owner}\0{seed}".encode()).hexdigest()
+
+
+def next_roll(owner, seed):
+    """Reserve the next roll of `owner`'s session for `seed`.
+
+    Returns (secret, counter), starting the session with a fresh secret
+    if there is none. Counters are kept per secret, so a new session
+    always counts from 0.
+    """
+    key = _key(owner, seed)
+    secret = cache.get(key)
+    if secret is None:
+        # add() keeps whichever secret a concurrent first roll stored.
+        cache.add(key, _new_secret(), settings.SEED_SESSION_TIMEOUT)
+        secret = cache.get(key)
+    counter_key = f"{key}:{commitment(secret)}"
+    try:
+        return secret, cache.incr(counter_key) - 1
+    except ValueError:
+        # First roll of the session (or the entry expired).
+        cache.add(counter_key, 0, settings.SEED_SESSION_TIMEOUT)
+        return secret, cache.incr(counter_key) - 1
+
+
+async def anext_roll(owner, seed):
+    """Async next_roll()."""
+    key = _key(owner, seed)
+    secret = await cache.aget(key)
+    if secret is None:
+        await cache.aadd(key, _new_secret(), settings.SEED_SESSION_TIMEOUT)
+        secret = await cache.aget(key)
+    counter_key = f"{key}:{commitment(secret)}"
+    try:
+        return secret, await cache.aincr(counter_key) - 1
+    except ValueError:
+        await cache.aadd(counter_key, 0, settings.SEED_SESSION_TIMEOUT)
+        return secret, await cache.aincr(counter_key) - 1
+
+
+def end_session(owner, seed):
+    """Reveal and retire `owner`'s session secret for `seed`; None if there is none."""
+    key = _key(owner, seed)
+    secret = cache.get(key)
+    if secret is not None:
+        cache.delete(key)
+    return secret
+
+
+def seeded(payload, seed, counter, secret):
+    """Stamp a roll payload with what is needed to replay it once revealed."""
+    payload["seed"] = seed
+    payload["counter"] = counter
+    payload["commitment"] = commitment(secret)
+    return payload
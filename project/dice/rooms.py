@@ -0,0 +1,281 @@
+"""
+Live roll rooms: rolls published once and fanned out over Server-Sent Events.
+
+A roll made on /api/roll/ or a macro roll with a `room` in its body is
+published to that room, and every client streaming
+GET /api/rooms/{room}/stream/ receives it as an SSE `roll` event, instead
+of each player polling. The event is encoded once per publish and the
+same bytes are queued for every subscriber.
+
+Each subscriber has a bounded queue of ROOM_QUEUE_SIZE events. A
+consumer that falls that far behind is dropped rather than buffered
+without limit or allowed to slow the publisher: its stream gets a final
+`dropped` event and closes, and the client reconnects.
+
+Brokers are chosen by ROOM_BACKEND:
+    "local"     LocalBroker, in-process: publishers and subscribers must
+                share a process, so it needs WEB_CONCURRENCY=1.
+    "postgres"  PostgresBroker, which relays every event through
+                PostgreSQL LISTEN/NOTIFY so any worker's rolls reach
+                subscribers in every worker. The default when
+                WEB_CONCURRENCY > 1.
+DiceConfig.ready() refuses "local" with several workers.
+
+The stream is served by an async view (dice/async_views.py) and is only
+routed on the ASGI profile, since a sync worker would be held for the
+life of each stream.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+MAX_ROOM_LENGTH = 64
+
+
+def sse_frame(event, data):
+    """One Server-Sent Events message with a JSON body."""
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode()
+
+
+DROPPED = sse_frame("dropped", {"detail": "Too far behind; reconnect."})
+
+
+class Subscription:
+    """One subscriber's bounded queue of pending SSE frames.
+
+    Owned by the event loop that created it; publishers on other threads
+    hand frames over with call_soon_threadsafe().
+    """
+
+    def __init__(self, room, maxsize):
+        self.room = room
+        self.maxsize = maxsize
+        self.dropped = False
+        self.loop = asyncio.get_running_loop()
+        self._frames = deque()
+        self._ready = asyncio.Event()
+
+    def push(self, frame):
+        """Queue `frame` from any thread."""
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            self._deliver(frame)
+        else:
+            try:
+                self.loop.call_soon_threadsafe(self._deliver, frame)
+            except RuntimeError:
+                pass  # the subscriber's loop is gone
+
+    def _deliver(self, frame):
+        if self.dropped:
+            return
+        if len(self._frames) >= self.maxsize:
+            self.dropped = True
+            self._frames.clear()
+        else:
+            self._frames.append(frame)
+        self._ready.set()
+
+    async def get(self, timeout):
+        """Every queued frame, oldest first; [] if `timeout` passes first."""
+        if not self._frames and not self.dropped:
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+        self._ready.clear()
+        frames = list(self._frames)
+        self._frames.clear()
+        return frames
+
+
+class LocalBroker:
+    """In-process pub/sub: a set of subscriptions per room."""
+
+    def __init__(self):
+        self._rooms = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, room, maxsize):
+        """Join `room`; must be called on the subscriber's event loop."""
+        subscription = Subscription(room, maxsize)
+        with self._lock:
+            self._rooms.setdefault(room, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._rooms.get(subscription.room)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._rooms[subscription.room]
+
+    def publish(self, room, event, data):
+        """Send one event to every subscriber of `room`; returns how many."""
+        return self._fan_out(room, lambda: sse_frame(event, data))
+
+    def _fan_out(self, room, frame):
+        """Push frame() to this process's subscribers of `room`; returns how many."""
+        with self._lock:
+            subscribers = list(self._rooms.get(room, ()))
+        if subscribers:
+            frame = frame()
+            for subscription in subscribers:
+                subscription.push(frame)
+        return len(subscribers)
+
+    def subscribers(self, room):
+        with self._lock:
+            return len(self._rooms.get(room, ()))
+
+
+async def events(broker, subscription, keepalive):
+    """The SSE body for one subscription; leaves the room when it ends."""
+    try:
+        # Sent at once, so the client knows it is subscribed; also sets
+        # how long EventSource waits before reconnecting.
+        yield b"retry: 3000\n\n"
+        while True:
+            frames = await subscription.get(keepalive)
+            if subscription.dropped:
+                yield DROPPED
+                return
+            yield b"".join(frames) if frames else b": keepalive\n\n"
+    finally:
+        broker.unsubscribe(subscription)
+
+
+def _database_conninfo():
+    """libpq connection string for the default database."""
+    from django.conf import settings
+    from psycopg.conninfo import make_conninfo
+
+    db = settings.DATABASES["default"]
+    params = {
+        "dbname": db.get("NAME"),
+        "user": db.get("USER"),
+        "password": db.get("PASSWORD"),
+        "host": db.get("HOST"),
+        "port": db.get("PORT"),
+    }
+    return make_conninfo(**{key: value for key, value in params.items() if value})
+
+
+class PostgresBroker(LocalBroker):
+    """Pub/sub across processes over PostgreSQL LISTEN/NOTIFY.
+
+    publish() only queues the event: a sender thread NOTIFYs it on
+    CHANNEL, and a listener thread in every process LISTENs there and
+    hands each event to that process's subscriptions — the publisher's
+    own included — so a publish never blocks a request or event loop on
+    the database. Each thread holds its own autocommit connection, apart
+    from Django's, and both start lazily in each process, so forked
+    workers get their own. Events published while the listener is
+    reconnecting are lost, as for a dropped subscriber.
+    """
+
+    CHANNEL = "dice_rooms"
+    # PostgreSQL refuses NOTIFY payloads of 8000 bytes or more.
+    MAX_PAYLOAD = 7999
+    OUTBOX_SIZE = 1024
+    RECONNECT_DELAY = 1.0
+
+    def __init__(self, conninfo=None):
+        super().__init__()
+        self._conninfo = conninfo
+        self._outbox = queue.Queue(self.OUTBOX_SIZE)
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def subscribe(self, room, maxsize):
+        self._ensure_threads()
+        return super().subscribe(room, maxsize)
+
+    def publish(self, room, event, data):
+        """Queue one event for every subscriber of `room` in any process.
+
+        Returns 1 if it was queued and 0 if it was dropped; how many
+        subscribers it reaches is only known to their processes.
+        """
+        self._ensure_threads()
+        # Rooms are slugs, so the first newline ends the room name.
+        message = f"{room}\n{sse_frame(event, data).decode()}"
+        if len(message.encode()) > self.MAX_PAYLOAD:
+            logger.warning("Room event for %r too large to NOTIFY; dropped", room)
+            return 0
+        try:
+            self._outbox.put_nowait(message)
+        except queue.Full:
+            logger.warning("Room outbox full; dropping event for %r", room)
+            return 0
+        return 1
+
+    def _receive(self, message):
+        """Deliver one NOTIFY payload to this process's subscribers."""
+        room, _, frame = message.partition("\n")
+        self._fan_out(room, frame.encode)
+
+    def _ensure_threads(self):
+        # Threads do not survive fork(), so a forked worker starts its own.
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._outbox = queue.Queue(self.OUTBOX_SIZE)
+            for target, name in ((self._send, "room-notify"), (self._listen, "room-listen")):
+                threading.Thread(target=target, name=name, daemon=True).start()
+
+    def _connect(self):
+        import psycopg
+
+        return psycopg.connect(self._conninfo or _database_conninfo(), autocommit=True)
+
+    def _send(self):
+        connection = None
+        while True:
+            message = self._outbox.get()
+            try:
+                if connection is None or connection.closed:
+                    connection = self._connect()
+                connection.execute("SELECT pg_notify(%s, %s)", (self.CHANNEL, message))
+            except Exception:
+                logger.exception("Dropping room event; NOTIFY failed")
+                if connection is not None:
+                    connection.close()
+                connection = None
+                time.sleep(self.RECONNECT_DELAY)
+
+    def _listen(self):
+        while True:
+            try:
+                with self._connect() as connection:
+                    connection.execute(f"LISTEN {self.CHANNEL}")
+                    for notify in connection.notifies():
+                        self._receive(notify.payload)
+            except Exception:
+                logger.exception("Room listener lost its connection; reconnecting")
+            time.sleep(self.RECONNECT_DELAY)
+
+
+BACKENDS = {"local": LocalBroker, "postgres": PostgresBroker}
+
+
+@lru_cache(maxsize=None)
+def get_broker(backend):
+    """The room broker for a backend name; one instance per process."""
+    return BACKENDS[backend]()
@@ -1,17 +1,182 @@
 """Serializers for dice roll requests and macro CRUD."""
 
+from django.db import IntegrityError
 from rest_framework import serializers
-from .models import DiceMacro
+from .models import (
+    MAX_MACRO_GROUPS,
+    MAX_MACROS_PER_USER,
+    MAX_TABLE_ENTRIES,
+    MAX_TABLE_WEIGHT,
+    DiceMacro,
+    MacroLimitExceeded,
+    RandomTable,
+    RollHistory,
+    TableLimitExceeded,
+)
+from .metrics import phase
+from .notation import (
+    MAX_DICE,
+    MAX_MODIFIER,
+    MAX_SIDES,
+    MIN_SIDES,
+    NotationError,
+    compile_expression,
+)
+from .replay import MAX_SEED_LENGTH, SECRET_LENGTH
+from .rooms import MAX_ROOM_LENGTH
+from .stream import MAX_STREAM_DICE, MAX_STREAM_SAMPLES
 
-MAX_MACROS_PER_USER = 10
+MAX_ROLLS_PER_BATCH = 50
+DUPLICATE_TABLE_NAME = "You already have a table with this name."
+MAX_DRAWS_PER_REQUEST = 1000
 
 
-class RollRequestSerializer(serializers.Serializer):
+class TimedValidationMixin:
+    """Records is_valid() as the "validate" phase of sampled requests."""
+
+    def is_valid(self, *args, **kwargs):
+        with phase("validate"):
+            return super().is_valid(*args, **kwargs)
+
+
+class RollRequestSerializer(TimedValidationMixin, serializers.Serializer):
     """Validates incoming dice roll parameters (public endpoint)."""
 
-    num_dice = serializers.IntegerField(min_value=1, max_value=100)
-    sides = serializers.IntegerField(min_value=2, max_value=1000)
-    modifier = serializers.IntegerField(required=False, default=0)
+    num_dice = serializers.IntegerField(min_value=1, max_value=MAX_DICE)
+    sides = serializers.IntegerField(min_value=MIN_SIDES, max_value=MAX_SIDES)
+    modifier = serializers.IntegerField(
+        min_value=-MAX_MODIFIER, max_value=MAX_MODIFIER, required=False, default=0
+    )
+
+
+class DiceGroupSerializer(RollRequestSerializer):
+    """One labelled NdS+M group of a composite macro."""
+
+    label = serializers.CharField(max_length=50, required=False, default="", allow_blank=True)
+
+
+class DistributionLookupSerializer(RollRequestSerializer):
+    """Roll spec plus the questions to answer from its distribution."""
+
+    total = serializers.IntegerField(required=False)
+    dc = serializers.IntegerField(required=False)
+    percentile = serializers.FloatField(min_value=0, max_value=100, required=False)
+
+    def validate(self, attrs):
+        if not {"total", "dc", "percentile"} & attrs.keys():
+            raise serializers.ValidationError("Provide total, dc or percentile.")
+        return attrs
+
+
+class RollSeedSerializer(TimedValidationMixin, serializers.Serializer):
+    """Optional session seed that makes a roll replayable (see dice/replay.py)."""
+
+    seed = serializers.CharField(max_length=MAX_SEED_LENGTH, required=False)
+
+
+class RollRoomSerializer(serializers.Serializer):
+    """Optional live room to broadcast the roll to (see dice/rooms.py)."""
+
+    room = serializers.SlugField(max_length=MAX_ROOM_LENGTH, required=False)
+
+
+class SeededRollRequestSerializer(RollRoomSerializer, RollSeedSerializer, RollRequestSerializer):
+    """Roll parameters plus an optional session seed and room for /api/roll/."""
+
+
+class MacroRollSerializer(RollRoomSerializer, RollSeedSerializer):
+    """Optional body of a macro roll: a seed, a room, and whether to return dice.
+
+    `dice` only matters for expression macros; see RollExpressionSerializer.
+    """
+
+    dice = serializers.BooleanField(required=False, default=True)
+
+
+class RollVerifySerializer(TimedValidationMixin, serializers.Serializer):
+    """A seeded roll to recompute: seed, counter and the spec that was rolled.
+
+    The spec is num_dice/sides/modifier, an expression, or a composite
+    macro's groups (with `modifier` as its grand-total modifier), matching
+    what /api/roll/ or the macro roll was made with. `secret` is the
+    session's revealed secret; without it the caller's own session is
+    revealed. An optional `final` is compared against the recomputed
+    result.
+    """
+
+    seed = serializers.CharField(max_length=MAX_SEED_LENGTH)
+    counter = serializers.IntegerField(min_value=0, max_value=(1 << 64) - 1)
+    secret = serializers.CharField(max_length=SECRET_LENGTH, required=False)
+    num_dice = serializers.IntegerField(min_value=1, max_value=MAX_DICE, required=False)
+    sides = serializers.IntegerField(min_value=MIN_SIDES, max_value=MAX_SIDES, required=False)
+    modifier = serializers.IntegerField(
+        min_value=-MAX_MODIFIER, max_value=MAX_MODIFIER, required=False, default=0
+    )
+    expression = serializers.CharField(required=False)
+    groups = serializers.ListField(
+        child=DiceGroupSerializer(), required=False, allow_empty=False,
+        max_length=MAX_MACRO_GROUPS,
+    )
+    dice = serializers.BooleanField(required=False, default=True)
+    final = serializers.IntegerField(required=False)
+
+    def validate_expression(self, value):
+        try:
+            return compile_expression(value).notation
+        except NotationError as e:
+            raise serializers.ValidationError(str(e))
+
+    def validate(self, attrs):
+        has_spec = "num_dice" in attrs and "sides" in attrs
+        if has_spec + ("expression" in attrs) + ("groups" in attrs) != 1:
+            raise serializers.ValidationError(
+                "Provide groups, an expression, or both num_dice and sides."
+            )
+        return attrs
+
+
+class RollStreamRequestSerializer(RollRequestSerializer):
+    """Roll spec plus sample count for the streaming Monte Carlo endpoint."""
+
+    samples = serializers.IntegerField(min_value=1, max_value=MAX_STREAM_SAMPLES)
+    aggregate = serializers.BooleanField(required=False, default=False)
+
+    def validate(self, attrs):
+        if attrs["samples"] * attrs["num_dice"] > MAX_STREAM_DICE:
+            raise serializers.ValidationError(
+                f"samples × num_dice must be at most {MAX_STREAM_DICE}."
+            )
+        return attrs
+
+
+class RollBatchRequestSerializer(TimedValidationMixin, serializers.Serializer):
+    """Validates a list of roll specs for the batch endpoint.
+
+    A single ListSerializer validates every entry, so the per-item cost is
+    one field pass rather than a fresh RollRequestSerializer per spec.
+    """
+
+    rolls = RollRequestSerializer(
+        many=True, allow_empty=False, max_length=MAX_ROLLS_PER_BATCH
+    )
+
+
+class RollExpressionSerializer(TimedValidationMixin, serializers.Serializer):
+    """Validates a dice-notation expression such as ``4d6kh3 + 2``.
+
+    With `dice` false, plain success-counting groups (``10d10>=7``) return
+    only their count, sampled without rolling each die.
+    """
+
+    expression = serializers.CharField()
+    dice = serializers.BooleanField(required=False, default=True)
+
+    def validate_expression(self, value):
+        try:
+            # Compiling here warms the cache for the roll that follows.
+            return compile_expression(value).notation
+        except NotationError as e:
+            raise serializers.ValidationError(str(e))
 
 
 class RollResultSerializer(serializers.Serializer):
@@ -24,27 +189,161 @@ class RollResultSerializer(serializers.Serializer):
     sides = serializers.IntegerField(min_value=2, max_value=100)
 
 
-class DiceMacroSerializer(serializers.ModelSerializer):
-    """Handles macro creation/updates and enforces the per-user macro limit."""
+class DiceMacroListSerializer(serializers.ListSerializer):
+    """Bulk upsert by name for /api/macros/bulk/ (see DiceMacro.upsert).
+
+    Each item is a full macro, so fields it omits go back to their
+    defaults on update. After save(), `created` holds how many were new.
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault("max_length", MAX_MACROS_PER_USER)
+        super().__init__(*args, **kwargs)
+
+    def validate(self, attrs):
+        names = [item["name"] for item in attrs]
+        if len(set(names)) != len(names):
+            raise serializers.ValidationError("Macro names must be unique.")
+        return attrs
+
+    def create(self, validated_data):
+        macros = [DiceMacro(**item) for item in validated_data]
+        user_id = getattr(self.context["request"].user, "id", None)
+        try:
+            self.created = DiceMacro.upsert(user_id, macros)
+        except MacroLimitExceeded as e:
+            raise serializers.ValidationError(str(e))
+        return macros
+
+
+class DiceMacroSerializer(TimedValidationMixin, serializers.ModelSerializer):
+    """Handles macro creation/updates and enforces the per-user macro limit.
+
+    The limit is checked by the quota upsert in DiceMacro.save(), in the
+    same transaction as the INSERT, rather than by a COUNT(*) here.
+    """
+
+    # Stored inline as JSON (see DiceMacro.groups), like table entries.
+    groups = serializers.ListField(
+        child=DiceGroupSerializer(), required=False, max_length=MAX_MACRO_GROUPS
+    )
 
     class Meta:
         model = DiceMacro
-        fields = ["id", "name", "num_dice", "sides", "modifier"]
+        fields = ["id", "name", "num_dice", "sides", "modifier", "expression", "groups"]
+        list_serializer_class = DiceMacroListSerializer
+        extra_kwargs = {
+            "modifier": {"min_value": -MAX_MODIFIER, "max_value": MAX_MODIFIER},
+        }
+
+    def validate_expression(self, value):
+        if not value:
+            return ""
+        try:
+            # Store the normalized form so roll_macro always hits the cache.
+            return compile_expression(value).notation
+        except NotationError as e:
+            raise serializers.ValidationError(str(e))
 
     def validate(self, attrs):
         request = self.context.get("request")
         # user_id comes from the JWT-backed SimpleUser set by authentication
         user_id = getattr(request.user, "id", None)
 
-        # Only enforce the macro cap on creation, not updates
-        if self.instance is None:
-            count = DiceMacro.objects.filter(user_id=user_id).count()
-            if count >= MAX_MACROS_PER_USER:
-                raise serializers.ValidationError(
-                    f"You can only save up to {MAX_MACROS_PER_USER} macros."
-                )
+        # A macro needs groups, an expression or a plain NdS triple.
+        def current(field):
+            if field in attrs:
+                return attrs[field]
+            return getattr(self.instance, field, None)
+
+        if not current("groups") and not current("expression") and (
+            current("num_dice") is None or current("sides") is None
+        ):
+            raise serializers.ValidationError(
+                "Provide groups, an expression, or both num_dice and sides."
+            )
 
         # Stamp the owning user so it's saved with the macro
         attrs["user_id"] = user_id
 
-        return attrs
\ No newline at end of file
+        return attrs
+
+    def create(self, validated_data):
+        try:
+            return super().create(validated_data)
+        except MacroLimitExceeded as e:
+            raise serializers.ValidationError(str(e))
+
+
+class TableEntrySerializer(serializers.Serializer):
+    """One weighted row of a random table."""
+
+    value = serializers.CharField(max_length=200)
+    weight = serializers.FloatField()
+
+    def validate_weight(self, value):
+        if not 0 < value <= MAX_TABLE_WEIGHT:
+            raise serializers.ValidationError(
+                f"Weight must be a positive number no larger than {MAX_TABLE_WEIGHT:g}."
+            )
+        return value
+
+
+class RandomTableSerializer(TimedValidationMixin, serializers.ModelSerializer):
+    """Handles random-table creation/updates and the per-user table limit.
+
+    Like macros, the limit is enforced by the quota upsert in
+    RandomTable.save().
+    """
+
+    # A ListField rather than many=True: entries are stored as plain JSON,
+    # not as related rows, so ModelSerializer's nested-write guard is moot.
+    entries = serializers.ListField(
+        child=TableEntrySerializer(), allow_empty=False, max_length=MAX_TABLE_ENTRIES
+    )
+
+    class Meta:
+        model = RandomTable
+        fields = ["id", "name", "entries"]
+
+    def validate(self, attrs):
+        request = self.context.get("request")
+        attrs["user_id"] = getattr(request.user, "id", None)
+        name = attrs.get("name", getattr(self.instance, "name", None))
+        tables = RandomTable.objects.filter(user_id=attrs["user_id"], name=name)
+        if self.instance is not None:
+            tables = tables.exclude(pk=self.instance.pk)
+        if tables.exists():
+            raise serializers.ValidationError({"name": [DUPLICATE_TABLE_NAME]})
+        return attrs
+
+    def create(self, validated_data):
+        try:
+            return super().create(validated_data)
+        except TableLimitExceeded as e:
+            raise serializers.ValidationError(str(e))
+        except IntegrityError:
+            # A concurrent request took the name after validate() checked it.
+            raise serializers.ValidationError({"name": [DUPLICATE_TABLE_NAME]})
+
+    def update(self, instance, validated_data):
+        try:
+            return super().update(instance, validated_data)
+        except IntegrityError:
+            raise serializers.ValidationError({"name": [DUPLICATE_TABLE_NAME]})
+
+
+class TableDrawSerializer(TimedValidationMixin, serializers.Serializer):
+    """How many entries to draw, and whether an entry may come up twice."""
+
+    count = serializers.IntegerField(min_value=1, max_value=MAX_DRAWS_PER_REQUEST, default=1)
+    replace = serializers.BooleanField(required=False, default=True)
+
+
+class RollHistorySerializer(serializers.ModelSerializer):
+    """Read-only view of a recorded roll."""
+
+    class Meta:
+        model = RollHistory
+        fields = ["id", "created_at", "source", "notation", "macro_id", "final", "result"]
+        read_only_fields = fields
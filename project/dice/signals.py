@@ -0,0 +1,37 @@
+"""Signal handlers that keep the macro and random-table caches coherent."""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import (
+    cache_random_table,
+    invalidate_random_table,
+    invalidate_user_macros,
+    now_and_on_commit,
+)
+from .models import DiceMacro, MacroQuota, RandomTable, TableQuota
+
+
+@receiver(post_save, sender=DiceMacro)
+@receiver(post_delete, sender=DiceMacro)
+def invalidate_macro_cache(sender, instance, **kwargs):
+    """Any write to a macro invalidates its owner's cached macro set."""
+    invalidate_user_macros(instance.user_id)
+
+
+@receiver(post_delete, sender=DiceMacro)
+def release_macro_quota(sender, instance, **kwargs):
+    """Free the owner's quota slot inside the delete's transaction."""
+    MacroQuota.release(instance.user_id)
+
+
+@receiver(post_save, sender=RandomTable)
+def preprocess_random_table(sender, instance, **kwargs):
+    """Build the saved table's alias table now, so draws never wait on it."""
+    now_and_on_commit(cache_random_table, instance)
+
+
+@receiver(post_delete, sender=RandomTable)
+def drop_random_table(sender, instance, **kwargs):
+    now_and_on_commit(invalidate_random_table, instance.pk)
+    TableQuota.release(instance.user_id)
@@ -0,0 +1,96 @@
+"""
+NDJSON generators for large Monte Carlo roll runs.
+
+Samples are produced in fixed-size chunks — each chunk draws at most
+STREAM_CHUNK_DICE dice with one engine call — so memory stays flat no
+matter how many samples are requested. Each generator yields one string
+per chunk containing one JSON document per line.
+
+sample_lines() emits every sample; aggregate_lines() emits only running
+statistics (count, mean and variance), one line per chunk, with the last
+line covering the whole run and adding the outcome histogram.
+
+A run costs samples × num_dice dice, capped at MAX_STREAM_DICE per
+request (checked by RollStreamRequestSerializer).
+
+Under ASGI a sync generator would be drained into a list before the first
+byte is sent, so the async view wraps it with achunks(), which produces
+one chunk per thread-pool hop and keeps the flat-memory guarantee.
+"""
+
+import json
+
+import numpy as np
+from asgiref.sync import sync_to_async
+
+from . import engine
+
+STREAM_CHUNK_DICE = 100_000
+MAX_STREAM_SAMPLES = 10_000_000
+MAX_STREAM_DICE = 10_000_000
+
+
+def _chunks(num_dice, sides, samples):
+    """Yield (k, num_dice) arrays of rolls until `samples` rows are produced."""
+    per_chunk = max(1, STREAM_CHUNK_DICE // num_dice)
+    remaining = samples
+    while remaining:
+        k = min(per_chunk, remaining)
+        remaining -= k
+        yield np.array(engine.roll_dice(k * num_dice, sides)).reshape(k, num_dice)
+
+
+def sample_lines(num_dice, sides, modifier, samples):
+    """One {"rolls": [...], "final": n} line per sample."""
+    for chunk in _chunks(num_dice, sides, samples):
+        finals = chunk.sum(axis=1) + modifier
+        yield "".join(
+            json.dumps({"rolls": rolls, "final": final}, separators=(",", ":")) + "\n"
+            for rolls, final in zip(chunk.tolist(), finals.tolist())
+        )
+
+
+def aggregate_lines(num_dice, sides, modifier, samples):
+    """One running-statistics line per chunk.
+
+    Mean and variance are merged chunk by chunk (Chan et al.'s pairwise
+    update); variance is the population variance of the samples so far.
+    The histogram is a fixed array over every possible sum — up to ~10^5
+    counts — so only the last line carries it, trimmed to the range of
+    outcomes seen and starting at "min".
+    """
+    low = num_dice + modifier
+    histogram = np.zeros(num_dice * (sides - 1) + 1, dtype=np.int64)
+    count, mean, m2 = 0, 0.0, 0.0
+
+    for chunk in _chunks(num_dice, sides, samples):
+        finals = chunk.sum(axis=1) + modifier
+        histogram += np.bincount(finals - low, minlength=len(histogram))
+
+        k = len(finals)
+        chunk_mean = float(finals.mean())
+        chunk_m2 = float(((finals - chunk_mean) ** 2).sum())
+        delta = chunk_mean - mean
+        total = count + k
+        mean += delta * k / total
+        m2 += chunk_m2 + delta * delta * count * k / total
+        count = total
+
+        line = {"samples": count, "mean": mean, "variance": m2 / count}
+        if count == samples:
+            # Only the span of outcomes seen; "min" is its first sum.
+            seen = np.flatnonzero(histogram)
+            line["min"] = low + int(seen[0])
+            line["histogram"] = histogram[seen[0]:seen[-1] + 1].tolist()
+        yield json.dumps(line, separators=(",", ":")) + "\n"
+
+
+async def achunks(lines):
+    """Async iterator over a sync line generator, one chunk per thread hop."""
+    lines = iter(lines)
+    next_chunk = sync_to_async(next, thread_sensitive=False)
+    while True:
+        chunk = await next_chunk(lines, None)
+        if chunk is None:
+            return
+        yield chunk
@@ -0,0 +1,118 @@
+"""
+Precomputed distribution tables in a memory-mapped file.
+
+`python manage.py build_distribution_tables` computes the PMF and CDF of
+every (num_dice, sides) pair in a grid — 1..MAX_DICE dice of each
+TABLE_SIDES die size by default — and writes them to one binary file.
+Each worker maps that file read-only, so the tables live once in the OS
+page cache no matter how many gunicorn workers read them, and a lookup
+is an array slice rather than a convolution.
+
+File layout (little-endian):
+    header  8-byte magic, uint32 version, uint32 entry count
+    index   per entry: uint32 num_dice, uint32 sides, uint64 offset
+    data    per entry: pmf then cdf, float64, `offset` counted in floats
+            from the start of the data section
+
+Pairs outside the file fall back to dice.distribution's computed,
+LRU-cached arrays.
+"""
+
+import os
+from functools import lru_cache
+
+import numpy as np
+from django.conf import settings
+
+from .notation import MAX_DICE, MAX_SIDES, MIN_SIDES
+
+MAGIC = b"DICEDIST"
+VERSION = 1
+# The common die sizes; anything else is computed on demand.
+TABLE_SIDES = (2, 3, 4, 6, 8, 10, 12, 20, 100)
+
+_HEADER = np.dtype([("magic", "S8"), ("version", "<u4"), ("count", "<u4")])
+_ENTRY = np.dtype([("num_dice", "<u4"), ("sides", "<u4"), ("offset", "<u8")])
+
+
+def _outcomes(num_dice, sides):
+    return num_dice * (sides - 1) + 1
+
+
+def build_tables(path, sides=TABLE_SIDES, max_dice=MAX_DICE):
+    """Write PMF/CDF tables for 1..max_dice dice of each size to `path`.
+
+    Returns the number of (num_dice, sides) entries written. The file is
+    written next to `path` and renamed into place, so workers never map
+    a half-written file.
+    """
+    from .distribution import sum_cdf, sum_pmf
+
+    if not 1 <= max_dice <= MAX_DICE:
+        raise ValueError(f"max_dice must be between 1 and {MAX_DICE}")
+    sides = sorted(set(sides))
+    if sides and not (MIN_SIDES <= sides[0] and sides[-1] <= MAX_SIDES):
+        raise ValueError(f"sides must be between {MIN_SIDES} and {MAX_SIDES}")
+
+    pairs = [(n, s) for s in sides for n in range(1, max_dice + 1)]
+    index = np.zeros(len(pairs), dtype=_ENTRY)
+    offset = 0
+    for i, (n, s) in enumerate(pairs):
+        index[i] = (n, s, offset)
+        offset += 2 * _outcomes(n, s)
+
+    header = np.array([(MAGIC, VERSION, len(pairs))], dtype=_HEADER)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(header.tobytes())
+        f.write(index.tobytes())
+        for n, s in pairs:
+            f.write(np.asarray(sum_pmf(n, s), dtype="<f8").tobytes())
+            f.write(np.asarray(sum_cdf(n, s), dtype="<f8").tobytes())
+    os.replace(tmp, path)
+    return len(pairs)
+
+
+class DistributionTables:
+    """Read-only view of a table file built by build_tables()."""
+
+    def __init__(self, path):
+        self._map = np.memmap(path, dtype=np.uint8, mode="r")
+        header = np.frombuffer(self._map, dtype=_HEADER, count=1)[0]
+        if header["magic"] != MAGIC or header["version"] != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} distribution table file")
+        index = np.frombuffer(
+            self._map, dtype=_ENTRY, count=int(header["count"]), offset=_HEADER.itemsize
+        )
+        self._data = np.frombuffer(
+            self._map, dtype="<f8", offset=_HEADER.itemsize + index.nbytes
+        )
+        self._offsets = {
+            (int(n), int(s)): int(offset) for n, s, offset in index.tolist()
+        }
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def get(self, num_dice, sides):
+        """Return (pmf, cdf) views for the pair, or None if it is not tabled."""
+        offset = self._offsets.get((num_dice, sides))
+        if offset is None:
+            return None
+        length = _outcomes(num_dice, sides)
+        return (
+            self._data[offset:offset + length],
+            self._data[offset + length:offset + 2 * length],
+        )
+
+
+@lru_cache(maxsize=None)
+def get_tables():
+    """The tables at settings.DISTRIBUTION_TABLES, mapped once per process.
+
+    Returns None when the setting is empty or the file has not been built.
+    """
+    path = settings.DISTRIBUTION_TABLES
+    if not path or not os.path.exists(path):
+        return None
+    return DistributionTables(path)
@@ -9,13 +9,34 @@ Run with:
 """
 
 import jwt
+import json
 import datetime
-from django.test import TestCase, override_settings
+from unittest import skipUnless
+from asgiref.sync import sync_to_async
+from django.db import connection
+from django.core.cache import cache
+from django.test import AsyncClient, TestCase, override_settings
 from rest_framework.test import APIClient
 from rest_framework.exceptions import AuthenticationFailed
 
-from dice.models import DiceMacro
-from dice.authentication import DiceJWTAuthentication, JWT_ALGORITHM, JWT_SECRET
+from dice import distribution, engine, notation
+from dice.csprng import BufferedCSPRNG, csprng
+from dice.history import history_buffer
+from dice.metrics import registry
+from dice.rooms import get_broker
+from dice.models import (
+    MAX_MACROS_PER_USER,
+    MAX_TABLES_PER_USER,
+    DiceMacro,
+    RandomTable,
+    RollHistory,
+)
+from dice.authentication import (
+    DiceJWTAuthentication,
+    JWT_ALGORITHM,
+    JWT_SECRET,
+    token_cache,
+)
 
 
 # ---------------------------------------------------------------
@@ -74,6 +95,10 @@ class DiceMacroModelTest(TestCase):
         macro = DiceMacro(name="Attack", num_dice=1, sides=20, modifier=3)
         self.assertEqual(str(macro), "Attack (1d20+3)")
 
+    def test_str_representation_expression(self):
+        macro = DiceMacro(name="Stat", expression="4d6kh3")
+        self.assertEqual(str(macro), "Stat (4d6kh3)")
+
     def test_unique_constraint(self):
         """The same user cannot have two macros with the same name."""
         DiceMacro.objects.create(
@@ -103,6 +128,7 @@ class DiceJWTAuthenticationTest(TestCase):
 
     def setUp(self):
         self.auth = DiceJWTAuthentication()
+        token_cache.clear()
 
     def _make_request(self, token=None):
         """Build a minimal fake request with an optional access_token cookie."""
@@ -156,6 +182,223 @@ class DiceJWTAuthenticationTest(TestCase):
         user, _ = self.auth.authenticate(request)
         self.assertEqual(user.permissions, ["admin", "roll"])
 
+    # --- Decoded-token cache ---
+
+    def test_repeat_token_hits_cache(self):
+        """The second request with the same token should not decode again."""
+        from unittest import mock
+
+        request = self._make_request(make_token())
+        self.auth.authenticate(request)
+        with mock.patch("dice.authentication.jwt.decode") as decode:
+            user, _ = self.auth.authenticate(request)
+        decode.assert_not_called()
+        self.assertEqual(user.id, "abc123def456ghij")
+        self.assertEqual(token_cache.stats()["hits"], 1)
+        self.assertEqual(token_cache.stats()["misses"], 1)
+
+    def test_failed_tokens_not_cached(self):
+        request = self._make_request("not-a-real-token")
+        for _ in range(2):
+            with self.assertRaises(AuthenticationFailed):
+                self.auth.authenticate(request)
+        self.assertEqual(token_cache.stats()["size"], 0)
+
+    def test_cache_entry_never_outlives_exp(self):
+        """Once exp passes, the cached user is dropped and decode rejects it."""
+        from unittest import mock
+
+        token = make_token()
+        request = self._make_request(token)
+        self.auth.authenticate(request)
+        exp = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])["exp"]
+        with mock.patch("dice.authentication.time.time", return_value=exp + 1):
+            self.assertIsNone(token_cache.get(token_cache.key(token)))
+
+    def test_cache_is_bounded(self):
+        from dice.authentication import DecodedTokenCache
+
+        cache = DecodedTokenCache(maxsize=2, ttl=60)
+        for i in range(3):
+            cache.set(i, object())
+        self.assertIsNone(cache.get(0))
+        self.assertEqual(cache.stats()["size"], 2)
+
+
+# ---------------------------------------------------------------
+# Roll engine tests
+# ---------------------------------------------------------------
+class RollEngineTest(TestCase):
+    """Test the bulk dice generator shared by all roll endpoints."""
+
+    def test_roll_dice_count_and_range(self):
+        for sides in (2, 6, 20, 257, 1000):
+            rolls = engine.roll_dice(500, sides)
+            self.assertEqual(len(rolls), 500)
+            self.assertTrue(all(1 <= r <= sides for r in rolls))
+
+    def test_single_die(self):
+        rolls = engine.roll_dice(1, 20)
+        self.assertEqual(len(rolls), 1)
+        self.assertTrue(1 <= rolls[0] <= 20)
+
+    def test_every_face_appears(self):
+        """A large sample of d6 should hit every face."""
+        self.assertEqual(set(engine.roll_dice(2000, 6)), {1, 2, 3, 4, 5, 6})
+
+    def test_roll_many_keeps_spec_order(self):
+        specs = [(3, 6), (1, 1000), (50, 300)]
+        results = engine.roll_many(specs)
+        self.assertEqual([len(r) for r in results], [3, 1, 50])
+        for (_, sides), rolls in zip(specs, results):
+            self.assertTrue(all(1 <= r <= sides for r in rolls))
+
+    def test_seeded_rng_is_reproducible(self):
+        import random
+
+        first = engine.roll_dice(10, 20, rng=random.Random(42))
+        second = engine.roll_dice(10, 20, rng=random.Random(42))
+        self.assertEqual(first, second)
+
+    def test_counter_rng_replays_by_index(self):
+        """Roll #k depends only on (seed, k), not on the rolls before it."""
+        from dice.replay import CounterRNG
+
+        sequence = [engine.roll_dice(10, 20, rng=CounterRNG("seed", k)) for k in range(5)]
+        self.assertEqual(engine.roll_dice(10, 20, rng=CounterRNG("seed", 3)), sequence[3])
+        self.assertNotEqual(engine.roll_dice(10, 20, rng=CounterRNG("other", 3)), sequence[3])
+
+    def test_csprng_backend(self):
+        source = BufferedCSPRNG(buffer_size=64)
+        self.assertEqual(set(engine.roll_dice(2000, 6, rng=source)), {1, 2, 3, 4, 5, 6})
+        self.assertTrue(all(1 <= engine.roll_die(1000, source) <= 1000 for _ in range(200)))
+        self.assertTrue(all(source.getrandbits(5) < 32 for _ in range(200)))
+        self.assertEqual(len(source.randbytes(1000)), 1000)  # larger than the buffer
+
+    def test_csprng_buffer_discarded_after_fork(self):
+        from dice.csprng import _reset_after_fork
+
+        source = BufferedCSPRNG()
+        source.randbytes(8)
+        _reset_after_fork()
+        self.assertEqual(source._buffer, b"")
+
+    def test_use_rng_selects_default_backend(self):
+        self.addCleanup(engine.use_rng, "mt")
+        engine.use_rng("csprng")
+        self.assertIs(engine.default_rng, csprng)
+        self.assertEqual(len(engine.roll_dice(10, 20)), 10)
+        with self.assertRaises(ValueError):
+            engine.use_rng("dev-random")
+
+
+# ---------------------------------------------------------------
+# Dice-notation tests
+# ---------------------------------------------------------------
+class NotationTest(TestCase):
+    """Test expression parsing, evaluation and the compiled-plan cache."""
+
+    def test_compile_plan(self):
+        plan = notation.compile_expression("4d6kh3 + 2d8 + 1d4! - 2")
+        self.assertEqual(plan.notation, "4d6kh3+2d8+1d4!-2")
+        self.assertEqual(plan.modifier, -2)
+        self.assertEqual([g.notation for g in plan.groups], ["4d6kh3", "2d8", "1d4!"])
+
+    def test_equivalent_expressions_share_plan(self):
+        """Whitespace and case differences normalize to one cache entry."""
+        first = notation.compile_expression("2d6 + 3")
+        second = notation.compile_expression(" 2D6+3 ")
+        self.assertIs(first, second)
+
+    def test_keep_highest(self):
+        result = notation.compile_expression("4d6kh3").roll()
+        group = result["groups"][0]
+        self.assertEqual(len(group["rolls"]), 4)
+        self.assertEqual(sorted(group["kept"]), sorted(group["rolls"])[1:])
+        self.assertEqual(result["final"], sum(group["kept"]))
+
+    def test_drop_lowest_matches_keep_highest(self):
+        import random
+
+        kh = notation.compile_expression("5d20kh4").roll(rng=random.Random(7))
+        dl = notation.compile_expression("5d20dl1").roll(rng=random.Random(7))
+        self.assertEqual(kh["final"], dl["final"])
+
+    def test_exploding_dice_are_bounded(self):
+        """A d2 explodes often; the chain must stop at MAX_EXPLOSIONS."""
+        result = notation.compile_expression("100d2!").roll()
+        rolls = result["groups"][0]["rolls"]
+        self.assertLessEqual(len(rolls), 100 + notation.MAX_EXPLOSIONS)
+
+    def test_keep_picks_earliest_of_tied_dice(self):
+        self.assertEqual(notation._select([3, 5, 3, 1, 5], "kh", 3), [3, 5, 5])
+        self.assertEqual(notation._select([3, 5, 3, 1, 5], "kl", 2), [3, 1])
+        self.assertEqual(notation._select([3, 5, 3, 1, 5], "dl", 1), [3, 5, 3, 5])
+
+    def test_reroll_below(self):
+        result = notation.compile_expression("100d6r3").roll()
+        self.assertEqual(set(result["groups"][0]["rolls"]), {3, 4, 5, 6})
+
+    def test_success_counting(self):
+        result = notation.compile_expression("20d10!>=7+1").roll()
+        group = result["groups"][0]
+        self.assertEqual(group["successes"], sum(r >= 7 for r in group["rolls"]))
+        self.assertEqual(result["final"], group["successes"] + 1)
+
+    def test_success_count_sampled_without_dice(self):
+        import random
+
+        plan = notation.compile_expression("100d10>=7")
+        counts = [plan.roll(random.Random(i), dice=False)["total"] for i in range(400)]
+        self.assertNotIn("rolls", plan.roll(dice=False)["groups"][0])
+        self.assertTrue(all(0 <= c <= 100 for c in counts))
+        self.assertAlmostEqual(sum(counts) / len(counts), 40, delta=2)
+        # Rerolls shift the odds: faces 5..10 leave 4 hits in 6.
+        self.assertEqual(notation.compile_expression("10d10r5>=2").roll(dice=False)["total"], 10)
+
+    def test_negative_group(self):
+        result = notation.compile_expression("1d6 - 1d4").roll()
+        first, second = result["groups"]
+        self.assertEqual(result["total"], sum(first["kept"]) - sum(second["kept"]))
+
+    def test_invalid_expressions(self):
+        for expression in ("", "2d", "d1", "101d6", "1d1001", "4d6kh5", "4d6dl4",
+                           "4d6r1", "4d6r6", "10d10>=11", "10d10>=0", "4d6kh3r2",
+                           "2d6+x", "5", "1d6" + "+1d6" * notation.MAX_GROUPS):
+            with self.assertRaises(notation.NotationError, msg=expression):
+                notation.compile_expression(expression)
+
+
+# ---------------------------------------------------------------
+# Expression roll endpoint tests — POST /api/roll/expression/
+# ---------------------------------------------------------------
+class RollExpressionViewTest(TestCase):
+    """Test the public expression roll endpoint."""
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_roll_expression(self):
+        resp = self.client.post("/api/roll/expression/", {"expression": "2d8 + 1d4 + 3"})
+        self.assertEqual(resp.status_code, 200)
+        data = resp.json()
+        self.assertEqual(data["expression"], "2d8+1d4+3")
+        self.assertEqual(len(data["groups"]), 2)
+        self.assertEqual(data["final"], data["total"] + 3)
+
+    def test_success_count_without_dice(self):
+        resp = self.client.post(
+            "/api/roll/expression/", {"expression": "10d10>=7", "dice": False}, format="json"
+        )
+        self.assertEqual(resp.status_code, 200)
+        group = resp.json()["groups"][0]
+        self.assertNotIn("rolls", group)
+        self.assertEqual(resp.json()["final"], group["successes"])
+
+    def test_invalid_expression(self):
+        resp = self.client.post("/api/roll/expression/", {"expression": "roll a d20"})
+        self.assertEqual(resp.status_code, 400)
+
 
 # ---------------------------------------------------------------
 # Public roll endpoint tests — POST /api/roll/
@@ -220,6 +463,453 @@ class RollDiceViewTest(TestCase):
         resp = self.client.post("/api/roll/", {})
         self.assertEqual(resp.status_code, 400)
 
+    # --- Seeded rolls ---
+
+    def test_seeded_rolls_count_up_and_verify(self):
+        cache.clear()
+        spec = {"num_dice": 5, "sides": 20, "modifier": 2, "seed": "table-7"}
+        first = self.client.post("/api/roll/", spec).json()
+        second = self.client.post("/api/roll/", spec).json()
+        self.assertEqual((first["seed"], first["counter"]), ("table-7", 0))
+        self.assertEqual(second["counter"], 1)
+
+        resp = self.client.post("/api/roll/verify/", {
+            "seed": "table-7", "counter": 1, "num_dice": 5, "sides": 20,
+            "modifier": 2, "final": second["final"],
+        })
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["rolls"], second["rolls"])
+        self.assertTrue(resp.json()["verified"])
+
+    def test_seed_sessions_are_per_client_and_committed(self):
+        import hashlib
+
+        cache.clear()
+        spec = {"num_dice": 5, "sides": 20, "seed": "table-7"}
+        mine = self.client.post("/api/roll/", spec).json()
+        theirs = auth_client().post("/api/roll/", spec).json()
+        self.assertEqual((mine["counter"], theirs["counter"]), (0, 0))
+        self.assertNotEqual(mine["commitment"], theirs["commitment"])
+
+        # Verifying reveals the caller's secret, which matches the commitment...
+        resp = self.client.post("/api/roll/verify/", {
+            "seed": "table-7", "counter": 0, "num_dice": 5, "sides": 20,
+        }).json()
+        self.assertEqual(hashlib.sha256(resp["secret"].encode()).hexdigest(), mine["commitment"])
+        self.assertEqual(resp["rolls"], mine["rolls"])
+        # ...and ends the session: the next roll starts a new one.
+        again = self.client.post("/api/roll/", spec).json()
+        self.assertEqual(again["counter"], 0)
+        self.assertNotEqual(again["commitment"], mine["commitment"])
+
+        # Anyone holding the revealed secret can verify.
+        resp = auth_client("other_user_id_12").post("/api/roll/verify/", {
+            "seed": "table-7", "counter": 0, "num_dice": 5, "sides": 20,
+            "secret": resp["secret"], "final": mine["final"],
+        })
+        self.assertTrue(resp.json()["verified"])
+
+    def test_verify_without_session_or_secret(self):
+        cache.clear()
+        resp = self.client.post("/api/roll/verify/", {
+            "seed": "never-rolled", "counter": 0, "num_dice": 1, "sides": 6,
+        })
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn("secret", resp.json())
+
+    # --- Rate limiting ---
+
+    @override_settings(ROLL_RATE_LIMIT_RATE=0.5, ROLL_RATE_LIMIT_BURST=2)
+    def test_rate_limit_returns_429_with_retry_after(self):
+        from dice.ratelimit import get_buckets
+
+        get_buckets.cache_clear()
+        spec = {"num_dice": 1, "sides": 6}
+        for _ in range(2):
+            self.assertEqual(self.client.post("/api/roll/", spec).status_code, 200)
+        resp = self.client.post("/api/roll/", spec)
+        self.assertEqual(resp.status_code, 429)
+        self.assertEqual(resp["Retry-After"], "2")
+
+        # A signed-in caller has its own bucket, whatever its IP.
+        self.assertEqual(auth_client().post("/api/roll/", spec).status_code, 200)
+
+    @override_settings(ROLL_RATE_LIMIT_RATE=0.5, ROLL_RATE_LIMIT_BURST=1)
+    def test_rate_limit_ignores_spoofed_forwarded_for(self):
+        from dice.ratelimit import get_buckets
+
+        get_buckets.cache_clear()
+        spec = {"num_dice": 1, "sides": 6}
+        self.assertEqual(
+            self.client.post("/api/roll/", spec, HTTP_X_FORWARDED_FOR="10.0.0.1").status_code,
+            200,
+        )
+        resp = self.client.post("/api/roll/", spec, HTTP_X_FORWARDED_FOR="10.0.0.2")
+        self.assertEqual(resp.status_code, 429)
+
+    @override_settings(ROLL_RATE_LIMIT_RATE=0.5, ROLL_RATE_LIMIT_BURST=5)
+    def test_batch_and_expression_are_rate_limited(self):
+        from dice.ratelimit import get_buckets
+
+        get_buckets.cache_clear()
+        # Five rolls in one batch spend the whole bucket...
+        specs = {"rolls": [{"num_dice": 1, "sides": 6}] * 5}
+        self.assertEqual(self.client.post("/api/roll/batch/", specs, format="json").status_code, 200)
+        resp = self.client.post("/api/roll/batch/", specs, format="json")
+        self.assertEqual(resp.status_code, 429)
+        # ...which the other roll endpoints share.
+        resp = self.client.post("/api/roll/expression/", {"expression": "1d6"}, format="json")
+        self.assertEqual(resp.status_code, 429)
+
+        get_buckets.cache_clear()
+        for _ in range(5):
+            self.client.post("/api/roll/expression/", {"expression": "1d6"}, format="json")
+        resp = self.client.post("/api/roll/expression/", {"expression": "1d6"}, format="json")
+        self.assertEqual(resp.status_code, 429)
+
+    def test_overdrawn_bucket_waits_for_the_debt(self):
+        from dice.ratelimit import LocalBuckets
+
+        buckets = LocalBuckets(rate=1, burst=2, maxsize=10)
+        self.assertEqual(buckets.take("a", cost=5), 0)  # allowed, leaves -3
+        self.assertAlmostEqual(buckets.take("a"), 4, delta=0.1)
+
+    def test_local_buckets_evict_least_recently_used(self):
+        from dice.ratelimit import LocalBuckets
+
+        buckets = LocalBuckets(rate=1, burst=1, maxsize=2)
+        self.assertEqual(buckets.take("a"), 0)
+        self.assertGreater(buckets.take("a"), 0)
+        buckets.take("b")
+        buckets.take("c")  # evicts "a", the idle bucket
+        self.assertEqual(len(buckets), 2)
+        self.assertEqual(buckets.take("a"), 0)
+
+    @override_settings(ROLL_RATE_LIMIT_RATE=0.5, ROLL_RATE_LIMIT_BURST=1, ROLL_RATE_LIMIT_BACKEND="cache")
+    def test_cache_backend_shares_buckets(self):
+        from dice.ratelimit import CacheBuckets
+
+        cache.clear()
+        spec = {"num_dice": 1, "sides": 6}
+        self.assertEqual(self.client.post("/api/roll/", spec).status_code, 200)
+        self.assertEqual(self.client.post("/api/roll/", spec).status_code, 429)
+        # Another process's store sees the same, spent bucket.
+        self.assertGreater(CacheBuckets(rate=0.5, burst=1).take("ip:127.0.0.1"), 0)
+
+    # --- Idempotency keys ---
+
+    def test_idempotency_key_replays_first_result(self):
+        from django.core.cache import caches
+
+        caches["idempotency"].clear()
+        spec = {"num_dice": 20, "sides": 1000}
+        first = self.client.post("/api/roll/", spec, HTTP_IDEMPOTENCY_KEY="k1")
+        retry = self.client.post("/api/roll/", spec, HTTP_IDEMPOTENCY_KEY="k1")
+        self.assertNotIn("Idempotent-Replayed", first)
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(retry.json(), first.json())
+
+        other = self.client.post("/api/roll/", {"num_dice": 2, "sides": 6}, HTTP_IDEMPOTENCY_KEY="k1")
+        self.assertEqual(other.status_code, 422)
+
+    def test_idempotency_keys_are_per_client(self):
+        from django.core.cache import caches
+
+        caches["idempotency"].clear()
+        spec = {"num_dice": 20, "sides": 1000}
+        first = self.client.post("/api/roll/", spec, HTTP_IDEMPOTENCY_KEY="k3", REMOTE_ADDR="1.1.1.1")
+        other = self.client.post("/api/roll/", spec, HTTP_IDEMPOTENCY_KEY="k3", REMOTE_ADDR="2.2.2.2")
+        self.assertNotIn("Idempotent-Replayed", other)
+        self.assertNotEqual(other.json()["rolls"], first.json()["rolls"])
+        signed_in = auth_client().post("/api/roll/", spec, HTTP_IDEMPOTENCY_KEY="k3")
+        self.assertNotIn("Idempotent-Replayed", signed_in)
+
+    def test_failed_request_does_not_store_key(self):
+        from django.core.cache import caches
+
+        caches["idempotency"].clear()
+        bad = self.client.post("/api/roll/", {"num_dice": 0, "sides": 6}, HTTP_IDEMPOTENCY_KEY="k2")
+        self.assertEqual(bad.status_code, 400)
+        good = self.client.post("/api/roll/", {"num_dice": 1, "sides": 6}, HTTP_IDEMPOTENCY_KEY="k2")
+        self.assertEqual(good.status_code, 200)
+        self.assertNotIn("Idempotent-Replayed", good)
+
+    def test_concurrent_requests_with_one_key_roll_once(self):
+        import threading
+        from django.core.cache import caches
+        from django.test import RequestFactory
+        from dice.idempotency import run_once
+
+        caches["idempotency"].clear()
+        def make():
+            return RequestFactory().post("/", b"{}", "application/json", HTTP_IDEMPOTENCY_KEY="k3")
+
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def slow():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return {"final": 7}
+
+        results = []
+        first = threading.Thread(target=lambda: results.append(run_once(make(), "t", slow)))
+        first.start()
+        started.wait(5)
+        second = threading.Thread(target=lambda: results.append(run_once(make(), "t", slow)))
+        second.start()
+        release.set()
+        first.join()
+        second.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(replayed for _, replayed in results), [False, True])
+        self.assertEqual([payload for payload, _ in results], [{"final": 7}] * 2)
+
+    def test_verify_requires_one_spec(self):
+        resp = self.client.post("/api/roll/verify/", {"seed": "s", "counter": 0})
+        self.assertEqual(resp.status_code, 400)
+        resp = self.client.post("/api/roll/verify/", {
+            "seed": "s", "counter": 0, "num_dice": 1, "sides": 6, "expression": "1d6",
+        })
+        self.assertEqual(resp.status_code, 400)
+
+
+# ---------------------------------------------------------------
+# Monte Carlo stream tests — POST /api/roll/stream/
+# ---------------------------------------------------------------
+class RollStreamViewTest(TestCase):
+    """Test NDJSON sample and aggregate streaming."""
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def _lines(self, resp):
+        import json
+        from asgiref.sync import async_to_sync
+
+        if resp.is_async:  # the async view on the ASGI stack
+            async def consume():
+                return [chunk async for chunk in resp.streaming_content]
+
+            body = b"".join(async_to_sync(consume)()).decode()
+        else:
+            body = b"".join(resp.streaming_content).decode()
+        return [json.loads(line) for line in body.splitlines()]
+
+    def test_sample_stream(self):
+        resp = self.client.post(
+            "/api/roll/stream/",
+            {"num_dice": 3, "sides": 6, "modifier": 1, "samples": 250},
+        )
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp["Content-Type"], "application/x-ndjson")
+        lines = self._lines(resp)
+        self.assertEqual(len(lines), 250)
+        for line in lines:
+            self.assertEqual(len(line["rolls"]), 3)
+            self.assertEqual(line["final"], sum(line["rolls"]) + 1)
+
+    def test_samples_are_chunked(self):
+        """A run larger than one chunk should still produce every sample."""
+        from unittest import mock
+
+        with mock.patch("dice.stream.STREAM_CHUNK_DICE", 10):
+            resp = self.client.post(
+                "/api/roll/stream/", {"num_dice": 4, "sides": 6, "samples": 7}
+            )
+            self.assertEqual(len(self._lines(resp)), 7)
+
+    def test_aggregate_stream(self):
+        from unittest import mock
+
+        with mock.patch("dice.stream.STREAM_CHUNK_DICE", 2000):
+            resp = self.client.post(
+                "/api/roll/stream/",
+                {"num_dice": 2, "sides": 6, "samples": 5000, "aggregate": True},
+            )
+            lines = self._lines(resp)
+        self.assertEqual(len(lines), 5)
+        # The histogram is sent once, on the last line.
+        self.assertFalse(any("histogram" in line for line in lines[:-1]))
+        last = lines[-1]
+        self.assertEqual(last["samples"], 5000)
+        self.assertEqual(sum(last["histogram"]), 5000)
+        self.assertGreaterEqual(last["min"], 2)
+        self.assertAlmostEqual(last["mean"], 7.0, delta=0.2)
+        self.assertAlmostEqual(last["variance"], 35 / 6, delta=0.5)
+
+    def test_stream_reuses_roll_bounds(self):
+        resp = self.client.post(
+            "/api/roll/stream/", {"num_dice": 101, "sides": 6, "samples": 10}
+        )
+        self.assertEqual(resp.status_code, 400)
+
+    def test_sample_count_required(self):
+        resp = self.client.post("/api/roll/stream/", {"num_dice": 1, "sides": 6})
+        self.assertEqual(resp.status_code, 400)
+
+    def test_dice_budget_enforced(self):
+        from dice.stream import MAX_STREAM_DICE
+
+        resp = self.client.post(
+            "/api/roll/stream/",
+            {"num_dice": 100, "sides": 6, "samples": MAX_STREAM_DICE // 100 + 1},
+        )
+        self.assertEqual(resp.status_code, 400)
+
+    @override_settings(ROOT_URLCONF="dice_backend.asgi_urls")
+    async def test_async_stream_sends_chunks_as_generated(self):
+        """On ASGI the first chunk arrives before the rest are rolled."""
+        from unittest import mock
+
+        with mock.patch("dice.stream.STREAM_CHUNK_DICE", 10), \
+                mock.patch.object(engine, "roll_dice", wraps=engine.roll_dice) as roll_dice:
+            resp = await AsyncClient().post(
+                "/api/roll/stream/", {"num_dice": 2, "sides": 6, "samples": 25},
+                content_type="application/json",
+            )
+            self.assertTrue(resp.is_async)
+            stream = aiter(resp.streaming_content)
+            first = await anext(stream)
+            self.assertEqual(len(first.splitlines()), 5)
+            self.assertEqual(roll_dice.call_count, 1)
+            rest = [chunk async for chunk in stream]
+        self.assertEqual(len(rest), 4)
+        self.assertEqual(roll_dice.call_count, 5)
+
+    @override_settings(ROLL_RATE_LIMIT_RATE=0.5, ROLL_RATE_LIMIT_BURST=1)
+    def test_stream_is_rate_limited(self):
+        from dice.ratelimit import get_buckets
+
+        get_buckets.cache_clear()
+        spec = {"num_dice": 1, "sides": 6, "samples": 1}
+        self.assertEqual(self.client.post("/api/roll/stream/", spec).status_code, 200)
+        self.assertEqual(self.client.post("/api/roll/stream/", spec).status_code, 429)
+
+
+# ---------------------------------------------------------------
+# Batch roll endpoint tests — POST /api/roll/batch/
+# ---------------------------------------------------------------
+class RollBatchViewTest(TestCase):
+    """Test rolling several specs in a single request."""
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_results_keep_spec_order(self):
+        specs = [
+            {"num_dice": 1, "sides": 20, "modifier": 2},
+            {"num_dice": 3, "sides": 6},
+            {"num_dice": 2, "sides": 100, "modifier": -1},
+        ]
+        resp = self.client.post("/api/roll/batch/", {"rolls": specs}, format="json")
+        self.assertEqual(resp.status_code, 200)
+        results = resp.json()["results"]
+        self.assertEqual(len(results), 3)
+        for spec, result in zip(specs, results):
+            self.assertEqual(len(result["rolls"]), spec["num_dice"])
+            self.assertEqual(result["sides"], spec["sides"])
+            self.assertEqual(result["modifier"], spec.get("modifier", 0))
+            self.assertEqual(result["final"], sum(result["rolls"]) + result["modifier"])
+
+    def test_invalid_spec_rejects_batch(self):
+        """One out-of-range spec should fail the whole request."""
+        specs = [{"num_dice": 1, "sides": 6}, {"num_dice": 101, "sides": 6}]
+        resp = self.client.post("/api/roll/batch/", {"rolls": specs}, format="json")
+        self.assertEqual(resp.status_code, 400)
+
+    def test_empty_batch_rejected(self):
+        resp = self.client.post("/api/roll/batch/", {"rolls": []}, format="json")
+        self.assertEqual(resp.status_code, 400)
+
+    def test_batch_size_limit(self):
+        from dice.serializers import MAX_ROLLS_PER_BATCH
+
+        specs = [{"num_dice": 1, "sides": 6}] * (MAX_ROLLS_PER_BATCH + 1)
+        resp = self.client.post("/api/roll/batch/", {"rolls": specs}, format="json")
+        self.assertEqual(resp.status_code, 400)
+
+
+# ---------------------------------------------------------------
+# Distribution tests — GET /api/distribution/
+# ---------------------------------------------------------------
+class DistributionTest(TestCase):
+    """Test exact PMF/CDF computation and the public endpoint."""
+
+    def test_two_d6(self):
+        expected = [1, 2, 3, 4, 5, 6, 5, 4, 3, 2, 1]
+        pmf = distribution.sum_pmf(2, 6)
+        for p, ways in zip(pmf, expected):
+            self.assertAlmostEqual(p, ways / 36)
+
+    def test_fft_path_matches_direct_convolution(self):
+        """Large products go through the FFT and must agree with np.convolve."""
+        import numpy as np
+
+        direct = np.ones(1)
+        for _ in range(20):
+            direct = np.convolve(direct, np.full(50, 1 / 50))
+        fft = distribution.sum_pmf(20, 50)
+        self.assertLess(np.abs(fft - direct).max(), 1e-12)
+
+    def test_cached_arrays_are_shared_and_read_only(self):
+        pmf = distribution.sum_pmf(10, 20)
+        self.assertIs(pmf, distribution.sum_pmf(10, 20))
+        self.assertFalse(pmf.flags.writeable)
+
+    def test_endpoint(self):
+        resp = APIClient().get("/api/distribution/", {"num_dice": 3, "sides": 6, "modifier": 2})
+        self.assertEqual(resp.status_code, 200)
+        data = resp.json()
+        self.assertEqual(data["min"], 5)
+        self.assertEqual(data["max"], 20)
+        self.assertEqual(len(data["pmf"]), 16)
+        self.assertAlmostEqual(sum(data["pmf"]), 1.0)
+        self.assertAlmostEqual(data["cdf"][-1], 1.0)
+        self.assertAlmostEqual(data["mean"], 12.5)
+
+    def test_endpoint_bounds(self):
+        resp = APIClient().get("/api/distribution/", {"num_dice": 101, "sides": 6})
+        self.assertEqual(resp.status_code, 400)
+
+    def test_table_file_matches_computed(self):
+        import os
+        import tempfile
+        import numpy as np
+        from dice.tables import DistributionTables, build_tables
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "tables.bin")
+            self.assertEqual(build_tables(path, sides=(6, 20), max_dice=5), 10)
+            tables = DistributionTables(path)
+            pmf, cdf = tables.get(5, 20)
+            self.assertFalse(pmf.flags.writeable)
+            np.testing.assert_array_equal(pmf, distribution.sum_pmf(5, 20))
+            np.testing.assert_array_equal(cdf, distribution.sum_cdf(5, 20))
+            self.assertIsNone(tables.get(6, 20))
+            del tables, pmf, cdf  # release the mapping before the file goes
+
+    def test_lookups(self):
+        self.assertAlmostEqual(distribution.probability(2, 6, 0, 7), 6 / 36)
+        self.assertEqual(distribution.probability(2, 6, 0, 13), 0.0)
+        self.assertAlmostEqual(distribution.chance_to_beat(1, 20, 5, 15), 11 / 20)
+        self.assertEqual(distribution.chance_to_beat(1, 20, 5, 6), 1.0)
+        self.assertEqual(distribution.chance_to_beat(1, 20, 5, 26), 0.0)
+        self.assertEqual(distribution.percentile(2, 6, 0, 50), 7)
+        self.assertEqual(distribution.percentile(2, 6, 0, 100), 12)
+
+    def test_lookup_endpoint(self):
+        resp = APIClient().get(
+            "/api/distribution/lookup/", {"num_dice": 1, "sides": 20, "dc": 11}
+        )
+        self.assertEqual(resp.status_code, 200)
+        data = resp.json()
+        self.assertEqual(set(data), {"num_dice", "sides", "modifier", "chance_to_beat"})
+        self.assertAlmostEqual(data["chance_to_beat"], 0.5)
+        resp = APIClient().get("/api/distribution/lookup/", {"num_dice": 1, "sides": 20})
+        self.assertEqual(resp.status_code, 400)
+
 
 # ---------------------------------------------------------------
 # Macro CRUD tests — /api/macros/
@@ -228,6 +918,7 @@ class DiceMacroViewSetTest(TestCase):
     """Test authenticated CRUD operations on dice macros."""
 
     def setUp(self):
+        cache.clear()
         self.user_id = "abc123def456ghij"
         self.client = auth_client(self.user_id)
 
@@ -304,6 +995,25 @@ class DiceMacroViewSetTest(TestCase):
         self.assertEqual(len(resp.json()), 1)
         self.assertEqual(resp.json()[0]["name"], "Mine")
 
+    def test_create_expression_macro(self):
+        """Expressions are validated and stored in normalized form."""
+        resp = self.client.post(
+            "/api/macros/", {"name": "Attack", "expression": "1d20 + 5"}
+        )
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(resp.json()["expression"], "1d20+5")
+
+    def test_create_invalid_expression_macro(self):
+        resp = self.client.post(
+            "/api/macros/", {"name": "Broken", "expression": "1d20 + banana"}
+        )
+        self.assertEqual(resp.status_code, 400)
+
+    def test_create_macro_requires_dice(self):
+        """Without an expression, num_dice and sides are required."""
+        resp = self.client.post("/api/macros/", {"name": "Empty", "num_dice": 2})
+        self.assertEqual(resp.status_code, 400)
+
     def test_max_macros_limit(self):
         """Users are capped at 10 macros; the 11th should be rejected."""
         for i in range(10):
@@ -315,6 +1025,264 @@ class DiceMacroViewSetTest(TestCase):
         )
         self.assertEqual(resp.status_code, 400)
 
+    def test_delete_frees_macro_slot(self):
+        for i in range(10):
+            DiceMacro.objects.create(
+                user_id=self.user_id, name=f"Macro{i}", num_dice=1, sides=6
+            )
+        DiceMacro.objects.filter(name="Macro0").delete()
+        resp = self.client.post(
+            "/api/macros/", {"name": "OneMore", "num_dice": 1, "sides": 6}
+        )
+        self.assertEqual(resp.status_code, 201)
+
+    def test_failed_insert_keeps_quota(self):
+        """A duplicate-name INSERT rolls back its quota reservation too."""
+        from dice.models import MacroQuota
+
+        DiceMacro.objects.create(user_id=self.user_id, name="Hit", num_dice=1, sides=20)
+        with self.assertRaises(Exception):
+            DiceMacro.objects.create(user_id=self.user_id, name="Hit", num_dice=1, sides=20)
+        self.assertEqual(MacroQuota.objects.get(user_id=self.user_id).count, 1)
+
+    def test_limit_enforced_without_count_query(self):
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.post("/api/macros/", {"name": "Hit", "num_dice": 1, "sides": 20})
+        self.assertFalse(any("COUNT(" in q["sql"].upper() for q in ctx.captured_queries))
+
+
+# ---------------------------------------------------------------
+# Macro read cache tests
+# ---------------------------------------------------------------
+class MacroCacheTest(TestCase):
+    """Reads are served from the cache; writes invalidate it."""
+
+    def setUp(self):
+        cache.clear()
+        self.user_id = "abc123def456ghij"
+        self.client = auth_client(self.user_id)
+        self.macro = DiceMacro.objects.create(
+            user_id=self.user_id, name="Hit", num_dice=1, sides=20, modifier=5
+        )
+
+    def test_cached_reads_skip_database(self):
+        self.client.get("/api/macros/")  # warm the cache
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get("/api/macros/").status_code, 200)
+            self.assertEqual(
+                self.client.get(f"/api/macros/{self.macro.id}/").status_code, 200
+            )
+            self.assertEqual(
+                self.client.post(f"/api/macros/{self.macro.id}/roll/").status_code, 200
+            )
+
+    def test_create_invalidates(self):
+        self.client.get("/api/macros/")
+        self.client.post("/api/macros/", {"name": "Dmg", "num_dice": 2, "sides": 6})
+        self.assertEqual(len(self.client.get("/api/macros/").json()), 2)
+
+    def test_update_invalidates(self):
+        self.client.get(f"/api/macros/{self.macro.id}/")
+        self.client.patch(f"/api/macros/{self.macro.id}/", {"modifier": 9}, format="json")
+        resp = self.client.post(f"/api/macros/{self.macro.id}/roll/")
+        self.assertEqual(resp.json()["modifier"], 9)
+
+    def test_delete_invalidates(self):
+        self.client.get("/api/macros/")
+        self.client.delete(f"/api/macros/{self.macro.id}/")
+        self.assertEqual(self.client.get("/api/macros/").json(), [])
+        resp = self.client.post(f"/api/macros/{self.macro.id}/roll/")
+        self.assertEqual(resp.status_code, 404)
+
+    def test_invalidates_again_on_commit(self):
+        """A set re-cached by a reader before the write commits is dropped at commit."""
+        from dice.cache import _key, _version, get_user_macros
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.macro.modifier = 9
+            self.macro.save()
+            # A concurrent request that still sees the old row caches it.
+            cache.set(_key(self.user_id, _version(self.user_id)), [{"id": self.macro.id, "modifier": 5}])
+        self.assertEqual(get_user_macros(self.user_id)[0]["modifier"], 9)
+
+    def test_set_loaded_before_commit_and_stored_after_is_ignored(self):
+        """A reader whose query saw the old rows stores them only after the commit."""
+        from dice.cache import _key, _version, get_user_macros, macro_etag
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.macro.modifier = 9
+            self.macro.save()
+            stale_key = _key(self.user_id, _version(self.user_id))  # read before commit
+        cache.set(stale_key, [{"id": self.macro.id, "modifier": 5}])
+        etag = macro_etag(self.user_id)
+        self.assertEqual(get_user_macros(self.user_id)[0]["modifier"], 9)
+        resp = self.client.get("/api/macros/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(self.client.get("/api/macros/").json()[0]["modifier"], 9)
+
+    def test_locmem_cache_refused_with_several_workers(self):
+        from django.conf import settings
+        from django.core.exceptions import ImproperlyConfigured
+        from dice.apps import check_shared_cache
+
+        with override_settings(WEB_CONCURRENCY=1):
+            check_shared_cache(settings)
+        with override_settings(WEB_CONCURRENCY=4):
+            with self.assertRaises(ImproperlyConfigured):
+                check_shared_cache(settings)
+
+    def test_other_users_cache_is_separate(self):
+        self.client.get("/api/macros/")
+        other = auth_client("other_user_id_12")
+        self.assertEqual(other.get("/api/macros/").json(), [])
+        self.assertEqual(other.get(f"/api/macros/{self.macro.id}/").status_code, 404)
+
+
+class MacroETagTest(TestCase):
+    """Macro list and detail carry an ETag bumped by every write."""
+
+    def setUp(self):
+        cache.clear()
+        self.user_id = "abc123def456ghij"
+        self.client = auth_client(self.user_id)
+        self.macro = DiceMacro.objects.create(
+            user_id=self.user_id, name="Hit", num_dice=1, sides=20, modifier=5
+        )
+
+    def test_matching_etag_is_not_modified(self):
+        from dice.cache import _key, _version
+
+        for url in ("/api/macros/", f"/api/macros/{self.macro.id}/"):
+            etag = self.client.get(url)["ETag"]
+            cache.delete(_key(self.user_id, _version(self.user_id)))  # a 304 must not reload the set
+            with self.assertNumQueries(0):
+                resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(resp.status_code, 304)
+            self.assertEqual(resp["ETag"], etag)
+            self.assertEqual(resp.content, b"")
+
+    def test_list_and_detail_etags_differ(self):
+        list_etag = self.client.get("/api/macros/")["ETag"]
+        detail_etag = self.client.get(f"/api/macros/{self.macro.id}/")["ETag"]
+        self.assertNotEqual(list_etag, detail_etag)
+        resp = self.client.get(f"/api/macros/{self.macro.id}/", HTTP_IF_NONE_MATCH=list_etag)
+        self.assertEqual(resp.status_code, 200)
+
+    def test_writes_change_etag(self):
+        etag = self.client.get("/api/macros/")["ETag"]
+        self.client.post("/api/macros/", {"name": "Dmg", "num_dice": 2, "sides": 6})
+        resp = self.client.get("/api/macros/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(resp.json()), 2)
+
+        etag = resp["ETag"]
+        self.client.patch(f"/api/macros/{self.macro.id}/", {"modifier": 9}, format="json")
+        resp = self.client.get("/api/macros/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+
+        etag = resp["ETag"]
+        self.client.delete(f"/api/macros/{self.macro.id}/")
+        resp = self.client.get("/api/macros/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(resp.json()), 1)
+
+    def test_etag_handed_out_before_commit_goes_stale(self):
+        from dice.cache import macro_etag
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.macro.modifier = 9
+            self.macro.save()
+            # A concurrent request still reading the old row gets this ETag.
+            etag = macro_etag(self.user_id)
+        resp = self.client.get("/api/macros/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()[0]["modifier"], 9)
+
+    def test_etags_are_per_user(self):
+        etag = self.client.get("/api/macros/")["ETag"]
+        other = auth_client("other_user_id_12")
+        self.assertEqual(other.get("/api/macros/", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class MacroBulkTest(TestCase):
+    """POST /api/macros/bulk/ upserts by name; GET /api/macros/export/ feeds it."""
+
+    def setUp(self):
+        cache.clear()
+        self.user_id = "abc123def456ghij"
+        self.client = auth_client(self.user_id)
+        self.macro = DiceMacro.objects.create(
+            user_id=self.user_id, name="Hit", num_dice=1, sides=20, modifier=5
+        )
+
+    def bulk(self, macros):
+        return self.client.post("/api/macros/bulk/", macros, format="json")
+
+    def test_creates_and_updates_by_name(self):
+        self.client.get("/api/macros/")  # warm the cache
+        resp = self.bulk([
+            {"name": "Hit", "num_dice": 1, "sides": 20, "modifier": 7},
+            {"name": "Fireball", "expression": "8d6"},
+        ])
+        self.assertEqual(resp.status_code, 200)
+        data = resp.json()
+        self.assertEqual((data["created"], data["updated"]), (1, 1))
+        self.assertEqual([m["name"] for m in data["macros"]], ["Hit", "Fireball"])
+        self.assertEqual(data["macros"][0]["id"], self.macro.id)
+
+        self.macro.refresh_from_db()
+        self.assertEqual(self.macro.modifier, 7)
+        listed = {m["name"]: m for m in self.client.get("/api/macros/").json()}
+        self.assertEqual(listed["Hit"]["modifier"], 7)
+        self.assertEqual(listed["Fireball"]["expression"], "8d6")
+
+    def test_limit_is_enforced_for_the_whole_set(self):
+        for i in range(MAX_MACROS_PER_USER - 2):
+            DiceMacro.objects.create(user_id=self.user_id, name=f"M{i}", num_dice=1, sides=6)
+        macros = [{"name": f"New{i}", "num_dice": 2, "sides": 6} for i in range(2)]
+        resp = self.bulk(macros + [{"name": "Hit", "num_dice": 1, "sides": 4}])
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(DiceMacro.objects.filter(user_id=self.user_id).count(),
+                         MAX_MACROS_PER_USER - 1)
+        self.macro.refresh_from_db()
+        self.assertEqual(self.macro.sides, 20)  # nothing was written
+
+        self.assertEqual(self.bulk(macros[:1]).status_code, 200)
+        resp = self.client.post("/api/macros/", {"name": "One more", "num_dice": 1, "sides": 6})
+        self.assertEqual(resp.status_code, 400)
+
+    def test_invalid_items_reject_the_batch(self):
+        resp = self.bulk([
+            {"name": "Ok", "num_dice": 1, "sides": 6},
+            {"name": "Bad", "expression": "3d"},
+        ])
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(self.bulk([{"name": "A", "num_dice": 1, "sides": 6}] * 2).status_code, 400)
+        self.assertEqual(self.bulk({"name": "A", "num_dice": 1, "sides": 6}).status_code, 400)
+        self.assertFalse(DiceMacro.objects.exclude(name="Hit").exists())
+
+    def test_export_round_trip(self):
+        self.bulk([{"name": "Fireball", "expression": "8d6"}])
+        exported = self.client.get("/api/macros/export/").json()
+        self.assertEqual(exported, [
+            {"name": "Hit", "num_dice": 1, "sides": 20, "modifier": 5, "expression": "",
+             "groups": []},
+            {"name": "Fireball", "num_dice": None, "sides": None, "modifier": 0,
+             "expression": "8d6", "groups": []},
+        ])
+
+        other = auth_client("other_user_id_12")
+        self.assertEqual(other.get("/api/macros/export/").json(), [])
+        resp = other.post("/api/macros/bulk/", exported, format="json")
+        self.assertEqual(resp.json()["created"], 2)
+        self.assertEqual(other.get("/api/macros/export/").json(), exported)
+
+        # Exporting and re-importing unchanged is a no-op update.
+        resp = self.bulk(exported)
+        self.assertEqual((resp.json()["created"], resp.json()["updated"]), (0, 2))
+
 
 # ---------------------------------------------------------------
 # Macro roll action tests — POST /api/macros/{id}/roll/
@@ -323,6 +1291,7 @@ class MacroRollTest(TestCase):
     """Test rolling dice through a saved macro."""
 
     def setUp(self):
+        cache.clear()
         self.user_id = "abc123def456ghij"
         self.client = auth_client(self.user_id)
         self.macro = DiceMacro.objects.create(
@@ -346,6 +1315,17 @@ class MacroRollTest(TestCase):
             self.assertGreaterEqual(roll, 1)
             self.assertLessEqual(roll, 6)
 
+    def test_roll_expression_macro(self):
+        macro = DiceMacro.objects.create(
+            user_id=self.user_id, name="Stat", expression="4d6kh3+1"
+        )
+        resp = self.client.post(f"/api/macros/{macro.id}/roll/")
+        self.assertEqual(resp.status_code, 200)
+        data = resp.json()
+        self.assertEqual(data["macro_id"], macro.id)
+        self.assertEqual(len(data["groups"][0]["kept"]), 3)
+        self.assertEqual(data["final"], data["total"] + 1)
+
     def test_cannot_roll_other_users_macro(self):
         """Rolling another user's macro should 404 (queryset is filtered)."""
         other_macro = DiceMacro.objects.create(
@@ -353,3 +1333,506 @@ class MacroRollTest(TestCase):
         )
         resp = self.client.post(f"/api/macros/{other_macro.id}/roll/")
         self.assertEqual(resp.status_code, 404)
+
+    def test_macro_roll_idempotency_key(self):
+        from django.core.cache import caches
+
+        caches["idempotency"].clear()
+        url = f"/api/macros/{self.macro.id}/roll/"
+        first = self.client.post(url, HTTP_IDEMPOTENCY_KEY="m1").json()
+        retry = self.client.post(url, HTTP_IDEMPOTENCY_KEY="m1")
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(retry.json(), first)
+
+    def test_seeded_macro_roll_verifies(self):
+        macro = DiceMacro.objects.create(
+            user_id=self.user_id, name="Stat", expression="4d6kh3+1"
+        )
+        data = self.client.post(
+            f"/api/macros/{macro.id}/roll/", {"seed": "s1"}, format="json"
+        ).json()
+        self.assertEqual(data["counter"], 0)
+        replay = self.client.post("/api/roll/verify/", {
+            "seed": "s1", "counter": 0, "expression": "4d6kh3+1",
+        }).json()
+        self.assertEqual(replay["groups"], data["groups"])
+        self.assertEqual(replay["final"], data["final"])
+
+    ATTACK = [
+        {"label": "attack", "num_dice": 1, "sides": 20, "modifier": 5},
+        {"label": "damage", "num_dice": 2, "sides": 6, "modifier": 3},
+    ]
+
+    def test_roll_composite_macro(self):
+        from unittest import mock
+
+        resp = self.client.post(
+            "/api/macros/", {"name": "Longsword", "groups": self.ATTACK}, format="json"
+        )
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(resp.json()["groups"], self.ATTACK)
+
+        with mock.patch.object(engine, "roll_many", wraps=engine.roll_many) as roll_many:
+            data = self.client.post(f"/api/macros/{resp.json()['id']}/roll/").json()
+        roll_many.assert_called_once()
+        attack, damage = data["groups"]
+        self.assertEqual((attack["label"], damage["label"]), ("attack", "damage"))
+        self.assertEqual(damage["notation"], "2d6+3")
+        self.assertEqual(len(damage["rolls"]), 2)
+        self.assertTrue(all(1 <= roll <= 6 for roll in damage["rolls"]))
+        self.assertEqual(attack["final"], attack["rolls"][0] + 5)
+        self.assertEqual(data["total"], attack["final"] + damage["final"])
+        self.assertEqual(data["final"], data["total"])
+
+    def test_composite_macro_validation(self):
+        bad = [{"num_dice": 1, "sides": 1}]
+        resp = self.client.post("/api/macros/", {"name": "Bad", "groups": bad}, format="json")
+        self.assertEqual(resp.status_code, 400)
+        resp = self.client.post(
+            "/api/macros/", {"name": "Many", "groups": self.ATTACK * 6}, format="json"
+        )
+        self.assertEqual(resp.status_code, 400)
+        resp = self.client.post("/api/macros/", {"name": "None", "groups": []}, format="json")
+        self.assertEqual(resp.status_code, 400)
+
+    def test_seeded_composite_macro_roll_verifies(self):
+        macro = DiceMacro.objects.create(
+            user_id=self.user_id, name="Longsword", groups=self.ATTACK, modifier=1
+        )
+        data = self.client.post(
+            f"/api/macros/{macro.id}/roll/", {"seed": "s2"}, format="json"
+        ).json()
+        self.assertEqual(data["final"], data["total"] + 1)
+        replay = self.client.post("/api/roll/verify/", {
+            "seed": "s2", "counter": data["counter"], "groups": self.ATTACK,
+            "modifier": 1, "final": data["final"],
+        }, format="json").json()
+        self.assertEqual(replay["groups"], data["groups"])
+        self.assertTrue(replay["verified"])
+
+
+# ---------------------------------------------------------------
+# Live room tests — rolls with a `room` + GET /api/rooms/{room}/stream/
+# ---------------------------------------------------------------
+class RoomTest(TestCase):
+    """Rolls published to a room reach every subscriber, once."""
+
+    def setUp(self):
+        cache.clear()
+        self.broker = get_broker("local")
+
+    async def test_publish_from_another_thread(self):
+        first = self.broker.subscribe("table", 8)
+        second = self.broker.subscribe("table", 8)
+        other = self.broker.subscribe("elsewhere", 8)
+        try:
+            sent = await sync_to_async(self.broker.publish, thread_sensitive=False)(
+                "table", "roll", {"final": 7}
+            )
+            self.assertEqual(sent, 2)
+            for subscription in (first, second):
+                self.assertEqual(
+                    await subscription.get(1), [b'event: roll\ndata: {"final":7}\n\n']
+                )
+            self.assertEqual(await other.get(0.01), [])
+        finally:
+            for subscription in (first, second, other):
+                self.broker.unsubscribe(subscription)
+        self.assertEqual(self.broker.subscribers("table"), 0)
+
+    async def test_postgres_broker_relays_through_notify(self):
+        from unittest import mock
+        from dice.rooms import PostgresBroker
+
+        broker = PostgresBroker()
+        with mock.patch.object(PostgresBroker, "_ensure_threads"):
+            subscription = broker.subscribe("table", 8)
+            self.assertEqual(broker.publish("table", "roll", {"final": 7}), 1)
+            # Too large for one NOTIFY payload.
+            with self.assertLogs("dice.rooms", "WARNING") as logs:
+                self.assertEqual(broker.publish("table", "roll", {"x": "y" * 8000}), 0)
+        self.assertIn("too large to NOTIFY", logs.output[0])
+        # Nothing reaches subscribers until the listener gets the NOTIFY back.
+        self.assertEqual(await subscription.get(0.01), [])
+        broker._receive(broker._outbox.get_nowait())
+        self.assertTrue(broker._outbox.empty())
+        self.assertEqual(await subscription.get(1), [b'event: roll\ndata: {"final":7}\n\n'])
+        broker.unsubscribe(subscription)
+
+    @skipUnless(connection.vendor == "postgresql", "needs PostgreSQL LISTEN/NOTIFY")
+    async def test_postgres_broker_round_trip(self):
+        from dice.rooms import PostgresBroker
+
+        broker = PostgresBroker()
+        subscription = broker.subscribe("table", 8)
+        try:
+            # The listener thread LISTENs in the background, so publish
+            # until an event makes it back through the server.
+            for _ in range(50):
+                self.assertEqual(broker.publish("table", "roll", {"final": 7}), 1)
+                frames = await subscription.get(0.1)
+                if frames:
+                    break
+            self.assertEqual(frames[0], b'event: roll\ndata: {"final":7}\n\n')
+        finally:
+            broker.unsubscribe(subscription)
+
+    def test_local_rooms_refused_with_several_workers(self):
+        from django.conf import settings
+        from django.core.exceptions import ImproperlyConfigured
+        from dice.apps import check_room_backend
+
+        check_room_backend(settings)
+        for overrides in (
+            {"ROOM_BACKEND": "local", "WEB_CONCURRENCY": 2},
+            {"ROOM_BACKEND": "postgres"},  # the test database is SQLite
+            {"ROOM_BACKEND": "carrier-pigeon"},
+        ):
+            with override_settings(**overrides), self.assertRaises(ImproperlyConfigured):
+                check_room_backend(settings)
+
+    async def test_slow_consumer_is_dropped(self):
+        slow = self.broker.subscribe("table", 2)
+        fast = self.broker.subscribe("table", 2)
+        try:
+            for final in range(3):
+                self.broker.publish("table", "roll", {"final": final})
+                self.assertEqual(len(await fast.get(1)), 1)
+            self.assertTrue(slow.dropped)
+            self.assertFalse(fast.dropped)
+            self.assertEqual(await slow.get(1), [])
+        finally:
+            self.broker.unsubscribe(slow)
+            self.broker.unsubscribe(fast)
+
+    async def test_rolls_with_a_room_are_published_once(self):
+        subscription = self.broker.subscribe("table", 8)
+        client = AsyncClient()
+        try:
+            body = {"num_dice": 2, "sides": 6, "room": "table"}
+            for _ in range(2):
+                resp = await client.post(
+                    "/api/roll/", body, content_type="application/json",
+                    headers={"Idempotency-Key": "room-roll"},
+                )
+            (frame,) = await subscription.get(1)
+            event = json.loads(frame.decode().split("data: ")[1])
+            self.assertEqual(event, {"source": "roll", "result": resp.json()})
+            self.assertEqual(await subscription.get(0.01), [])
+
+            bad = await client.post(
+                "/api/roll/", {"num_dice": 2, "sides": 6, "room": "not a slug"},
+                content_type="application/json",
+            )
+            self.assertEqual(bad.status_code, 400)
+        finally:
+            self.broker.unsubscribe(subscription)
+
+    async def test_macro_rolls_are_published(self):
+        macro = await DiceMacro.objects.acreate(
+            user_id="abc123def456ghij", name="Hit", num_dice=1, sides=20
+        )
+        subscription = self.broker.subscribe("table", 8)
+        client = AsyncClient()
+        client.cookies["access_token"] = make_token()
+        try:
+            resp = await client.post(
+                f"/api/macros/{macro.id}/roll/", {"room": "table"},
+                content_type="application/json",
+            )
+            (frame,) = await subscription.get(1)
+            self.assertIn(b"event: roll\n", frame)
+            event = json.loads(frame.decode().split("data: ")[1])
+            self.assertEqual(event, {"source": "macro", "result": resp.json()})
+        finally:
+            self.broker.unsubscribe(subscription)
+
+    @override_settings(ROOT_URLCONF="dice_backend.asgi_urls", ROOM_QUEUE_SIZE=2)
+    async def test_stream(self):
+        resp = await AsyncClient().get("/api/rooms/table/stream/")
+        self.assertEqual(resp["Content-Type"], "text/event-stream")
+        stream = aiter(resp.streaming_content)
+        try:
+            self.assertEqual(await anext(stream), b"retry: 3000\n\n")
+            self.broker.publish("table", "roll", {"final": 3})
+            self.assertEqual(await anext(stream), b'event: roll\ndata: {"final":3}\n\n')
+
+            for final in range(3):  # more than the queue holds, unread
+                self.broker.publish("table", "roll", {"final": final})
+            self.assertIn(b"event: dropped\n", await anext(stream))
+            with self.assertRaises(StopAsyncIteration):
+                await anext(stream)
+        finally:
+            await resp.streaming_content.aclose()
+        self.assertEqual(self.broker.subscribers("table"), 0)
+
+
+# ---------------------------------------------------------------
+# Random table tests — /api/tables/ + alias sampling
+# ---------------------------------------------------------------
+class RandomTableTest(TestCase):
+    """Weighted tables: alias sampling, CRUD scoping, limits and draws."""
+
+    LOOT = [
+        {"value": "copper", "weight": 70},
+        {"value": "silver", "weight": 25},
+        {"value": "gold", "weight": 5},
+    ]
+
+    def setUp(self):
+        cache.clear()
+        self.user_id = "abc123def456ghij"
+        self.client = auth_client(self.user_id)
+
+    def test_alias_table_matches_weights(self):
+        import random
+        from collections import Counter
+        from dice.alias import AliasTable
+
+        table = AliasTable([70, 25, 5])
+        counts = Counter(table.sample(20000, random.Random(1)))
+        for index, weight in enumerate([70, 25, 5]):
+            self.assertAlmostEqual(counts[index] / 20000, weight / 100, delta=0.015)
+
+    def test_sample_distinct_returns_each_entry_once(self):
+        from dice.alias import AliasTable
+
+        weights = [1000, 1, 1, 1]  # forces the weighted-key fallback
+        picks = AliasTable(weights).sample_distinct(4, weights)
+        self.assertEqual(sorted(picks), [0, 1, 2, 3])
+
+    def test_alias_table_accepts_huge_weights(self):
+        from dice.alias import AliasTable
+
+        table = AliasTable([1e308, 1e308, 1e307])
+        self.assertEqual(len(table.sample(10)), 10)
+
+    def test_create_and_draw(self):
+        resp = self.client.post("/api/tables/", {"name": "Loot", "entries": self.LOOT}, format="json")
+        self.assertEqual(resp.status_code, 201)
+        table_id = resp.json()["id"]
+
+        resp = self.client.post(f"/api/tables/{table_id}/draw/", {"count": 50}, format="json")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(resp.json()["draws"]), 50)
+        self.assertTrue(set(resp.json()["draws"]) <= {"copper", "silver", "gold"})
+
+        resp = self.client.post(
+            f"/api/tables/{table_id}/draw/", {"count": 3, "replace": False}, format="json"
+        )
+        self.assertEqual(sorted(resp.json()["draws"]), ["copper", "gold", "silver"])
+        resp = self.client.post(
+            f"/api/tables/{table_id}/draw/", {"count": 4, "replace": False}, format="json"
+        )
+        self.assertEqual(resp.status_code, 400)
+
+    def test_update_rebuilds_cached_table(self):
+        table = RandomTable.objects.create(user_id=self.user_id, name="Loot", entries=self.LOOT)
+        self.client.post(f"/api/tables/{table.id}/draw/")
+        resp = self.client.patch(
+            f"/api/tables/{table.id}/", {"entries": [{"value": "mithril", "weight": 1}]},
+            format="json",
+        )
+        self.assertEqual(resp.status_code, 200)
+        resp = self.client.post(f"/api/tables/{table.id}/draw/", {"count": 5}, format="json")
+        self.assertEqual(resp.json()["draws"], ["mithril"] * 5)
+
+    def test_invalid_entries(self):
+        for entries in (
+            [], [{"value": "x", "weight": 0}], [{"value": "x"}],
+            [{"value": "x", "weight": 1e308}, {"value": "y", "weight": 1e308}],
+        ):
+            resp = self.client.post(
+                "/api/tables/", {"name": "Bad", "entries": entries}, format="json"
+            )
+            self.assertEqual(resp.status_code, 400, entries)
+
+    def test_duplicate_table_name_is_400(self):
+        resp = self.client.post("/api/tables/", {"name": "Loot", "entries": self.LOOT}, format="json")
+        self.assertEqual(resp.status_code, 201)
+        resp = self.client.post("/api/tables/", {"name": "Loot", "entries": self.LOOT}, format="json")
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn("name", resp.json())
+
+        other = self.client.post("/api/tables/", {"name": "Gems", "entries": self.LOOT}, format="json")
+        resp = self.client.patch(f"/api/tables/{other.json()['id']}/", {"name": "Loot"}, format="json")
+        self.assertEqual(resp.status_code, 400)
+        # Renaming a table to its own name, and another user reusing it, are fine.
+        resp = self.client.patch(f"/api/tables/{other.json()['id']}/", {"name": "Gems"}, format="json")
+        self.assertEqual(resp.status_code, 200)
+        resp = auth_client("other_user_id_12").post(
+            "/api/tables/", {"name": "Loot", "entries": self.LOOT}, format="json"
+        )
+        self.assertEqual(resp.status_code, 201)
+
+    def test_table_limit(self):
+        for i in range(MAX_TABLES_PER_USER):
+            RandomTable.objects.create(user_id=self.user_id, name=f"T{i}", entries=self.LOOT)
+        resp = self.client.post("/api/tables/", {"name": "One more", "entries": self.LOOT}, format="json")
+        self.assertEqual(resp.status_code, 400)
+
+        RandomTable.objects.filter(user_id=self.user_id).first().delete()
+        resp = self.client.post("/api/tables/", {"name": "One more", "entries": self.LOOT}, format="json")
+        self.assertEqual(resp.status_code, 201)
+
+    def test_cannot_draw_from_other_users_table(self):
+        table = RandomTable.objects.create(user_id="other_user_id_1234", name="Secret", entries=self.LOOT)
+        self.assertEqual(self.client.post(f"/api/tables/{table.id}/draw/").status_code, 404)
+        self.assertEqual(self.client.get(f"/api/tables/{table.id}/").status_code, 404)
+
+
+# ---------------------------------------------------------------
+# Roll history tests — buffered writes + GET /api/history/
+# ---------------------------------------------------------------
+class RollHistoryTest(TestCase):
+    """Rolls by signed-in users are buffered, flushed and listed newest first."""
+
+    def setUp(self):
+        cache.clear()
+        history_buffer.clear()
+        self.user_id = "abc123def456ghij"
+        self.client = auth_client(self.user_id)
+
+    def test_rolls_are_buffered_until_flush(self):
+        self.client.post("/api/roll/", {"num_dice": 2, "sides": 6, "modifier": 1})
+        self.assertEqual(RollHistory.objects.count(), 0)
+        self.assertEqual(history_buffer.flush(), 1)
+        row = RollHistory.objects.get()
+        self.assertEqual(row.user_id, self.user_id)
+        self.assertEqual(row.notation, "2d6+1")
+        self.assertEqual(row.final, row.result["final"])
+
+    def test_anonymous_rolls_not_recorded(self):
+        APIClient().post("/api/roll/", {"num_dice": 1, "sides": 20})
+        self.assertEqual(len(history_buffer), 0)
+
+    def test_macro_and_batch_rolls_recorded(self):
+        macro = DiceMacro.objects.create(
+            user_id=self.user_id, name="Hit", num_dice=1, sides=20, modifier=3
+        )
+        self.client.post(f"/api/macros/{macro.id}/roll/")
+        specs = [{"num_dice": 1, "sides": 6}, {"num_dice": 2, "sides": 8}]
+        self.client.post("/api/roll/batch/", {"rolls": specs}, format="json")
+        history_buffer.flush()
+        rows = RollHistory.objects.order_by("id")
+        self.assertEqual([r.source for r in rows], ["macro", "batch", "batch"])
+        self.assertEqual(rows[0].macro_id, macro.id)
+
+    def test_history_endpoint_pages_newest_first(self):
+        for _ in range(5):
+            self.client.post("/api/roll/", {"num_dice": 1, "sides": 6})
+        history_buffer.flush()
+
+        resp = self.client.get("/api/history/", {"limit": 3})
+        self.assertEqual(resp.status_code, 200)
+        page = resp.json()
+        self.assertEqual(len(page["results"]), 3)
+        times = [r["created_at"] for r in page["results"]]
+        self.assertEqual(times, sorted(times, reverse=True))
+
+        rest = self.client.get(page["next"]).json()
+        self.assertEqual(len(rest["results"]), 2)
+        self.assertIsNone(rest["next"])
+
+    def test_history_scoped_to_user(self):
+        APIClient().post("/api/roll/", {"num_dice": 1, "sides": 6})
+        auth_client("other_user_id_12").post("/api/roll/", {"num_dice": 1, "sides": 6})
+        history_buffer.flush()
+        self.assertEqual(self.client.get("/api/history/").json()["results"], [])
+
+    def test_history_requires_auth(self):
+        resp = APIClient().get("/api/history/")
+        self.assertIn(resp.status_code, [401, 403])
+
+    def test_overflow_drops_oldest(self):
+        from dice.history import HistoryBuffer
+
+        buffer = HistoryBuffer(flush_size=100, max_size=3, interval=None)
+        for final in range(5):
+            buffer.record(self.user_id, "roll", "1d6", {"final": final})
+        self.assertEqual(buffer.dropped, 2)
+        buffer.flush()
+        self.assertEqual(
+            sorted(RollHistory.objects.values_list("final", flat=True)), [2, 3, 4]
+        )
+
+    def test_out_of_range_final_dropped_on_record(self):
+        from dice.history import HistoryBuffer
+
+        buffer = HistoryBuffer(flush_size=100, max_size=10, interval=None)
+        with self.assertLogs("dice.history", "WARNING"):
+            buffer.record(self.user_id, "roll", "1d6", {"final": 10 ** 20})
+        buffer.record(self.user_id, "roll", "1d6", {"final": 4})
+        self.assertEqual(buffer.dropped, 1)
+        self.assertEqual(buffer.flush(), 1)
+
+    def test_failed_flush_counts_batch_as_dropped(self):
+        from unittest import mock
+        from dice.history import HistoryBuffer
+
+        buffer = HistoryBuffer(flush_size=100, max_size=10, interval=None)
+        buffer.record(self.user_id, "roll", "1d6", {"final": 4})
+        with mock.patch.object(RollHistory.objects, "bulk_create", side_effect=OverflowError):
+            with self.assertLogs("dice.history", "ERROR"):
+                self.assertEqual(buffer.flush(), 0)
+        self.assertEqual(buffer.dropped, 1)
+        self.assertEqual(len(buffer), 0)
+
+    def test_huge_modifiers_rejected(self):
+        resp = self.client.post(
+            "/api/roll/", {"num_dice": 1, "sides": 6, "modifier": 10 ** 20}, format="json"
+        )
+        self.assertEqual(resp.status_code, 400)
+        resp = self.client.post(
+            "/api/roll/expression/", {"expression": "1d6+100000000000000000000"}, format="json"
+        )
+        self.assertEqual(resp.status_code, 400)
+        resp = self.client.post(
+            "/api/macros/", {"name": "Big", "num_dice": 1, "sides": 6, "modifier": 10 ** 20},
+            format="json",
+        )
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(len(history_buffer), 0)
+
+
+# ---------------------------------------------------------------
+# Timing instrumentation tests — Server-Timing + GET /metrics
+# ---------------------------------------------------------------
+class TimingMetricsTest(TestCase):
+    """Sampled requests report per-phase timings and feed /metrics."""
+
+    def setUp(self):
+        cache.clear()
+        registry.clear()
+
+    def _phases(self, resp):
+        return {part.split(";")[0].strip() for part in resp["Server-Timing"].split(",")}
+
+    def test_public_roll_phases(self):
+        resp = APIClient().post("/api/roll/", {"num_dice": 2, "sides": 6})
+        self.assertTrue({"validate", "roll", "view", "total"} <= self._phases(resp))
+
+    def test_macro_request_records_auth_and_db(self):
+        user_id = "abc123def456ghij"
+        DiceMacro.objects.create(user_id=user_id, name="Hit", num_dice=1, sides=20)
+        resp = auth_client(user_id).get("/api/macros/")
+        phases = self._phases(resp)
+        self.assertIn("auth", phases)
+        self.assertIn("db", phases)
+        self.assertIn('desc="1 queries"', resp["Server-Timing"])
+
+    @override_settings(METRICS_SAMPLE_RATE=0.0)
+    def test_unsampled_requests_skip_timing(self):
+        resp = APIClient().post("/api/roll/", {"num_dice": 2, "sides": 6})
+        self.assertNotIn("Server-Timing", resp)
+
+    def test_metrics_endpoint(self):
+        APIClient().post("/api/roll/", {"num_dice": 2, "sides": 6})
+        resp = APIClient().get("/metrics")
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp["Content-Type"].startswith("text/plain"))
+        body = resp.content.decode()
+        self.assertIn("# TYPE dice_request_duration_seconds histogram", body)
+        self.assertIn('dice_request_duration_seconds_count{method="POST",route="api/roll/"} 1', body)
+        self.assertIn('dice_request_phase_seconds_bucket{phase="validate",le="+Inf"} 1', body)
+        self.assertIn("dice_jwt_cache_hits_total", body)
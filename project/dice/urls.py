@@ -2,12 +2,31 @@
 
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import RollDiceView, DiceMacroViewSet
+from .views import (
+    RollDiceView,
+    RollVerifyView,
+    RollBatchView,
+    RollStreamView,
+    RollExpressionView,
+    DistributionView,
+    DistributionLookupView,
+    DiceMacroViewSet,
+    RandomTableViewSet,
+    RollHistoryView,
+)
 
 router = DefaultRouter()
 router.register(r"macros", DiceMacroViewSet, basename="macros")
+router.register(r"tables", RandomTableViewSet, basename="tables")
 
 urlpatterns = [
     path("roll/", RollDiceView.as_view(), name="roll-dice"),  # POST /api/roll/
-    path("", include(router.urls)),  # /api/macros/ CRUD + /api/macros/{id}/roll/
+    path("roll/verify/", RollVerifyView.as_view(), name="roll-verify"),  # POST /api/roll/verify/
+    path("roll/batch/", RollBatchView.as_view(), name="roll-batch"),  # POST /api/roll/batch/
+    path("roll/stream/", RollStreamView.as_view(), name="roll-stream"),  # POST /api/roll/stream/
+    path("roll/expression/", RollExpressionView.as_view(), name="roll-expression"),  # POST /api/roll/expression/
+    path("distribution/", DistributionView.as_view(), name="distribution"),  # GET /api/distribution/
+    path("distribution/lookup/", DistributionLookupView.as_view(), name="distribution-lookup"),  # GET /api/distribution/lookup/
+    path("history/", RollHistoryView.as_view(), name="roll-history"),  # GET /api/history/
+    path("", include(router.urls)),  # /api/macros/, /api/tables/ CRUD + roll/draw actions
 ]
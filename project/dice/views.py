@@ -1,16 +1,175 @@
 """Views for public dice rolling and authenticated macro CRUD + roll."""
 
-import random
-from rest_framework import viewsets, status
+from rest_framework import generics, viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import CursorPagination
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
+from django.utils.cache import get_conditional_response
 from django.utils.decorators import method_decorator
 
-from .serializers import RollRequestSerializer, RollResultSerializer, DiceMacroSerializer
-from .models import DiceMacro
+from .serializers import (
+    MAX_ROLLS_PER_BATCH,
+    DistributionLookupSerializer,
+    RollRequestSerializer,
+    MacroRollSerializer,
+    RandomTableSerializer,
+    TableDrawSerializer,
+    RollVerifySerializer,
+    SeededRollRequestSerializer,
+    RollBatchRequestSerializer,
+    RollExpressionSerializer,
+    RollStreamRequestSerializer,
+    RollResultSerializer,
+    DiceMacroSerializer,
+    RollHistorySerializer,
+)
+from .models import DiceMacro, RandomTable, RollHistory
+from . import engine
+from .authentication import optional_user, token_cache
+from .cache import (
+    get_random_table,
+    get_user_macro,
+    get_user_macros,
+    invalidate_user_macros,
+    macro_etag,
+)
+from .distribution import chance_to_beat, distribution, percentile, probability
+from .history import groups_notation, history_buffer, roll_notation
+from .idempotency import mark_replayed, run_once
+from .metrics import phase, registry
+from .notation import compile_expression
+from .ratelimit import RollRateThrottle, client_key
+from .replay import CounterRNG, end_session, next_roll, seeded
+from .rooms import get_broker
+from .stream import aggregate_lines, sample_lines
+
+
+def roll_payload(rolls, sides, modifier=0):
+    """Build the public roll payload for an already-drawn set of dice."""
+    total = sum(rolls)
+    return {
+        "rolls": rolls,
+        "total": total,
+        "modifier": modifier,
+        "final": total + modifier,
+        "sides": sides,
+    }
+
+
+def batch_roll_payload(specs):
+    """Roll validated batch specs with one bulk draw, keeping spec order."""
+    with phase("roll"):
+        all_rolls = engine.roll_many((spec["num_dice"], spec["sides"]) for spec in specs)
+    return {
+        "results": [
+            roll_payload(rolls, spec["sides"], spec.get("modifier", 0))
+            for spec, rolls in zip(specs, all_rolls)
+        ]
+    }
+
+
+def batch_cost(data):
+    """Rate-limit tokens for a batch body: one per roll, as on /api/roll/.
+
+    Read from the raw body, since throttles run before validation; an
+    oversized batch is charged the maximum and then refused with 400.
+    """
+    rolls = data.get("rolls") if hasattr(data, "get") else None
+    if not isinstance(rolls, list):
+        return 1
+    return max(1, min(len(rolls), MAX_ROLLS_PER_BATCH))
+
+
+def record_batch(request, specs, payload):
+    """Queue history rows for a batch roll if the caller is signed in."""
+    user = optional_user(request)
+    if user is None:
+        return
+    for spec, result in zip(specs, payload["results"]):
+        notation = roll_notation(spec["num_dice"], spec["sides"], spec.get("modifier", 0))
+        history_buffer.record(user.id, "batch", notation, result)
+
+
+def record_public_roll(request, source, notation, payload):
+    """Queue a history row for a public roll if the caller is signed in."""
+    user = optional_user(request)
+    if user is not None:
+        history_buffer.record(user.id, source, notation, payload)
+
+
+def record_macro_roll(user_id, macro, payload):
+    """Queue a history row for a macro roll."""
+    if macro["groups"]:
+        notation = groups_notation(macro["groups"], macro["modifier"])
+    else:
+        notation = macro["expression"] or roll_notation(
+            macro["num_dice"], macro["sides"], macro["modifier"]
+        )
+    history_buffer.record(user_id, "macro", notation, payload, macro_id=macro["id"])
+
+
+def publish_roll(room, source, payload):
+    """Broadcast a roll to its live room, if the request named one."""
+    if room:
+        get_broker(settings.ROOM_BACKEND).publish(
+            room, "roll", {"source": source, "result": payload}
+        )
+
+
+def groups_roll_payload(groups, modifier=0, rng=None):
+    """Roll a composite macro's groups with one bulk draw.
+
+    Each group reports its own rolls, total and final; the grand `total`
+    sums the group finals and `final` adds the macro's own modifier.
+    """
+    with phase("roll"):
+        drawn = engine.roll_many(
+            [(group["num_dice"], group["sides"]) for group in groups], rng
+        )
+    results = [
+        {
+            "label": group["label"],
+            "notation": roll_notation(group["num_dice"], group["sides"], group["modifier"]),
+            "rolls": rolls,
+            "total": sum(rolls),
+            "modifier": group["modifier"],
+            "final": sum(rolls) + group["modifier"],
+        }
+        for group, rolls in zip(groups, drawn)
+    ]
+    total = sum(result["final"] for result in results)
+    return {"groups": results, "total": total, "modifier": modifier, "final": total + modifier}
+
+
+def macro_roll_payload(macro, rng=None, dice=True):
+    """Roll a cached macro dict and build the macro roll payload."""
+    if macro["groups"]:
+        result = groups_roll_payload(macro["groups"], macro["modifier"], rng)
+        return {"macro_id": macro["id"], "name": macro["name"], **result}
+
+    if macro["expression"]:
+        # Compiled plans are cached by expression, so this skips parsing.
+        with phase("roll"):
+            result = compile_expression(macro["expression"]).roll(rng, dice)
+        return {"macro_id": macro["id"], "name": macro["name"], **result}
+
+    with phase("roll"):
+        rolls = engine.roll_dice(macro["num_dice"], macro["sides"], rng)
+    total = sum(rolls)
+    return {
+        "macro_id": macro["id"],
+        "name": macro["name"],
+        "rolls": rolls,
+        "total": total,
+        "modifier": macro["modifier"],
+        "final": total + macro["modifier"],
+    }
 
 
 # ----------------------
@@ -22,40 +181,264 @@ class RollDiceView(APIView):
 
     Accepts num_dice, sides, and an optional modifier. Returns the
     individual rolls, their sum, and the modifier-adjusted final total.
+    With a `seed`, the roll is drawn from the caller's replayable session
+    for that seed and the response also carries the seed, the roll's
+    counter and the commitment to the session secret (see dice/replay.py).
+    Retries carrying the same Idempotency-Key get the first result back.
+    With a `room`, the result is also broadcast to that live room (see
+    dice/rooms.py). Callers are rate limited per IP or userId (see
+    dice/ratelimit.py).
     """
 
     permission_classes = [AllowAny]
     authentication_classes = []  # skip JWT check entirely
+    throttle_classes = [RollRateThrottle]
 
     def post(self, request):
-        serializer = RollRequestSerializer(data=request.data)
+        payload, replayed = run_once(
+            request, f"roll:{client_key(request)}", lambda: self.roll(request)
+        )
+        return mark_replayed(Response(payload), replayed)
+
+    def roll(self, request):
+        serializer = SeededRollRequestSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
         num_dice = serializer.validated_data["num_dice"]
         sides = serializer.validated_data["sides"]
         modifier = serializer.validated_data.get("modifier", 0)
+        seed = serializer.validated_data.get("seed")
 
-        rolls = [random.randint(1, sides) for _ in range(num_dice)]
-        total = sum(rolls)
-        final = total + modifier
+        if seed is None:
+            with phase("roll"):
+                rolls = engine.roll_dice(num_dice, sides)
+            payload = roll_payload(rolls, sides, modifier)
+        else:
+            secret, counter = next_roll(client_key(request), seed)
+            with phase("roll"):
+                rolls = engine.roll_dice(num_dice, sides, CounterRNG(seed, counter, secret))
+            payload = seeded(roll_payload(rolls, sides, modifier), seed, counter, secret)
+        record_public_roll(request, "roll", roll_notation(num_dice, sides, modifier), payload)
+        # Inside run_once(), so an Idempotency-Key retry is not broadcast again.
+        publish_roll(serializer.validated_data.get("room"), "roll", payload)
+        return payload
 
-        return Response({
-            "rolls": rolls,
-            "total": total,
-            "modifier": modifier,
-            "final": final,
-            "sides": sides,
-        })
+
+# ----------------------
+# Public seeded-roll verification — POST /api/roll/verify/
+# ----------------------
+@method_decorator(csrf_exempt, name="dispatch")
+class RollVerifyView(APIView):
+    """Recompute a seeded roll from its seed, counter and session secret.
+
+    Accepts the seed and counter returned with the roll plus the spec
+    that was rolled (num_dice/sides/modifier, an expression, or a
+    composite macro's groups) and returns the same payload the roll
+    produced, with the session `secret`. Without a `secret`, the caller's
+    own session for the seed is revealed and ended. If `final` is given,
+    the response also says whether it matches.
+    """
+
+    permission_classes = [AllowAny]
+    authentication_classes = []  # skip JWT check entirely
+
+    def post(self, request):
+        serializer = RollVerifySerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        data = serializer.validated_data
+        secret = data.get("secret")
+        if secret is None:
+            secret = end_session(client_key(request), data["seed"])
+            if secret is None:
+                raise ValidationError(
+                    {"secret": "No open session for this seed; pass its revealed secret."}
+                )
+        rng = CounterRNG(data["seed"], data["counter"], secret)
+        if "groups" in data:
+            payload = groups_roll_payload(data["groups"], data["modifier"], rng)
+        else:
+            with phase("roll"):
+                if "expression" in data:
+                    payload = compile_expression(data["expression"]).roll(rng, data["dice"])
+                else:
+                    rolls = engine.roll_dice(data["num_dice"], data["sides"], rng)
+                    payload = roll_payload(rolls, data["sides"], data["modifier"])
+        payload = seeded(payload, data["seed"], data["counter"], secret)
+        payload["secret"] = secret
+        if "final" in data:
+            payload["verified"] = data["final"] == payload["final"]
+        return Response(payload)
+
+
+# ----------------------
+# Public Monte Carlo stream — POST /api/roll/stream/
+# ----------------------
+@method_decorator(csrf_exempt, name="dispatch")
+class RollStreamView(APIView):
+    """Stream many samples of one roll spec as NDJSON without authentication.
+
+    Accepts the /api/roll/ fields plus `samples` and an optional
+    `aggregate` flag. Without it every sample is one line; with it each
+    line carries running count, mean and variance instead, and the last
+    one the histogram. Rate limited like /api/roll/.
+    """
+
+    permission_classes = [AllowAny]
+    authentication_classes = []  # skip JWT check entirely
+    throttle_classes = [RollRateThrottle]
+
+    def post(self, request):
+        serializer = RollStreamRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        data = serializer.validated_data
+        lines = aggregate_lines if data["aggregate"] else sample_lines
+        return StreamingHttpResponse(
+            lines(data["num_dice"], data["sides"], data.get("modifier", 0), data["samples"]),
+            content_type="application/x-ndjson",
+        )
+
+
+# ----------------------
+# Public batch roll endpoint — POST /api/roll/batch/
+# ----------------------
+@method_decorator(csrf_exempt, name="dispatch")
+class RollBatchView(APIView):
+    """Roll several dice specs in one request without authentication.
+
+    Accepts {"rolls": [{num_dice, sides, modifier}, ...]} and returns
+    {"results": [...]} where each result sits at the same index as the
+    spec that produced it. Rate limited like /api/roll/, at one token per
+    spec.
+    """
+
+    permission_classes = [AllowAny]
+    authentication_classes = []  # skip JWT check entirely
+    throttle_classes = [RollRateThrottle]
+
+    def throttle_cost(self, request):
+        return batch_cost(request.data)
+
+    def post(self, request):
+        serializer = RollBatchRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        specs = serializer.validated_data["rolls"]
+        payload = batch_roll_payload(specs)
+        record_batch(request, specs, payload)
+        return Response(payload)
+
+
+# ----------------------
+# Public expression roll endpoint — POST /api/roll/expression/
+# ----------------------
+@method_decorator(csrf_exempt, name="dispatch")
+class RollExpressionView(APIView):
+    """Roll a dice-notation expression without authentication.
+
+    Accepts {"expression": "4d6kh3 + 2d8 + 1d4! - 2"} and returns the
+    rolls and kept dice for each group plus the overall totals. Rate
+    limited like /api/roll/.
+    """
+
+    permission_classes = [AllowAny]
+    authentication_classes = []  # skip JWT check entirely
+    throttle_classes = [RollRateThrottle]
+
+    def post(self, request):
+        serializer = RollExpressionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        plan = compile_expression(serializer.validated_data["expression"])
+        with phase("roll"):
+            payload = plan.roll(dice=serializer.validated_data["dice"])
+        record_public_roll(request, "expression", plan.notation, payload)
+        return Response(payload)
+
+
+# ----------------------
+# Public distribution endpoint — GET /api/distribution/
+# ----------------------
+class DistributionView(APIView):
+    """Exact outcome probabilities for an NdS+M roll without authentication.
+
+    Takes num_dice, sides and an optional modifier as query parameters
+    (same bounds as /api/roll/) and returns the PMF and CDF, where
+    pmf[i] is the probability of rolling exactly min + i.
+    """
+
+    permission_classes = [AllowAny]
+    authentication_classes = []  # skip JWT check entirely
+
+    def get(self, request):
+        serializer = RollRequestSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+
+        num_dice = serializer.validated_data["num_dice"]
+        sides = serializer.validated_data["sides"]
+        modifier = serializer.validated_data.get("modifier", 0)
+
+        return Response(distribution(num_dice, sides, modifier))
+
+
+# ----------------------
+# Public distribution lookups — GET /api/distribution/lookup/
+# ----------------------
+class DistributionLookupView(APIView):
+    """Single answers from an NdS+M distribution without authentication.
+
+    Takes the /api/distribution/ parameters plus any of `total`
+    (probability of rolling exactly that), `dc` (chance to meet or beat
+    it) and `percentile` (smallest total reached with that probability),
+    and returns only the answers asked for.
+    """
+
+    permission_classes = [AllowAny]
+    authentication_classes = []  # skip JWT check entirely
+
+    def get(self, request):
+        serializer = DistributionLookupSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+
+        data = serializer.validated_data
+        spec = (data["num_dice"], data["sides"], data["modifier"])
+        payload = {"num_dice": spec[0], "sides": spec[1], "modifier": spec[2]}
+        if "total" in data:
+            payload["probability"] = probability(*spec, data["total"])
+        if "dc" in data:
+            payload["chance_to_beat"] = chance_to_beat(*spec, data["dc"])
+        if "percentile" in data:
+            payload["percentile"] = percentile(*spec, data["percentile"])
+        return Response(payload)
 
 
 # ----------------------
 # Dice macros (JWT protected) — /api/macros/
 # ----------------------
+def not_modified(request, etag):
+    """Whether a GET's If-None-Match already names `etag`."""
+    return get_conditional_response(request, etag=etag) is not None
+
+
+def with_etag(response, etag):
+    """Stamp a macro list or detail response with its ETag."""
+    response["ETag"] = etag
+    return response
+
+
 class DiceMacroViewSet(viewsets.ModelViewSet):
     """CRUD for saved dice macros, scoped to the authenticated user.
 
     Also exposes a custom `roll` action at POST /api/macros/{id}/roll/
-    that executes the saved macro and returns the result.
+    that executes the saved macro and returns the result, and bulk
+    import/export: GET /api/macros/export/ returns the set without ids,
+    and POST /api/macros/bulk/ upserts such a list by name in one
+    transaction.
+
+    List, retrieve and roll read from the per-user macro cache
+    (dice/cache.py); writes go through the ORM and invalidate it.
+    List and retrieve send the set's version stamp as an ETag and answer
+    a matching If-None-Match with 304 before loading anything else.
     """
 
     serializer_class = DiceMacroSerializer
@@ -65,23 +448,174 @@ class DiceMacroViewSet(viewsets.ModelViewSet):
         """Only return macros belonging to the current user."""
         return DiceMacro.objects.filter(user_id=self.request.user.id)
 
+    def get_cached_macro(self):
+        """Cached counterpart of get_object(): the user's macro as a dict."""
+        macro = get_user_macro(self.request.user.id, self.kwargs["pk"])
+        if macro is None:
+            raise NotFound()
+        return macro
+
     def perform_create(self, serializer):
         """Stamp the new macro with the authenticated user's ID."""
         serializer.save(user_id=self.request.user.id)
 
+    def list(self, request, *args, **kwargs):
+        """Serve the user's macro set from the cache."""
+        etag = macro_etag(request.user.id)
+        if not_modified(request, etag):
+            return with_etag(HttpResponseNotModified(), etag)
+        return with_etag(Response(get_user_macros(request.user.id)), etag)
+
+    def retrieve(self, request, *args, **kwargs):
+        """Serve a single macro from the user's cached macro set."""
+        etag = macro_etag(request.user.id, self.kwargs["pk"])
+        if not_modified(request, etag):
+            return with_etag(HttpResponseNotModified(), etag)
+        return with_etag(Response(self.get_cached_macro()), etag)
+
+    @action(detail=False, methods=["get"], url_path="export")
+    def export(self, request):
+        """The user's macros in the format /bulk/ accepts."""
+        return Response([
+            {field: value for field, value in macro.items() if field != "id"}
+            for macro in get_user_macros(request.user.id)
+        ])
+
+    @action(detail=False, methods=["post"], url_path="bulk")
+    def bulk(self, request):
+        """Create or update a list of macros by name, all or nothing."""
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        # bulk_create() sends no post_save, so the cache is dropped here.
+        invalidate_user_macros(request.user.id)
+        created = serializer.created
+        return Response({
+            "created": created,
+            "updated": len(serializer.data) - created,
+            "macros": serializer.data,
+        })
+
     @action(detail=True, methods=["post"], url_path="roll")
     def roll_macro(self, request, pk=None):
-        """Roll dice using the parameters saved in a macro."""
-        macro = self.get_object()  # also enforces ownership via get_queryset
-        rolls = [random.randint(1, macro.sides) for _ in range(macro.num_dice)]
-        total = sum(rolls)
-        final = total + macro.modifier
+        """Roll dice using the parameters saved in a macro.
+
+        An optional `seed` in the body makes the roll replayable, a `room`
+        broadcasts it, and an Idempotency-Key header makes retries safe,
+        as on /api/roll/.
+        """
+        payload, replayed = run_once(
+            request, f"macro:{request.user.id}:{pk}", lambda: self._roll_macro(request)
+        )
+        return mark_replayed(Response(payload, status=status.HTTP_200_OK), replayed)
+
+    def _roll_macro(self, request):
+        macro = self.get_cached_macro()  # ownership: only the user's set is cached
+        serializer = MacroRollSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        seed = serializer.validated_data.get("seed")
+        dice = serializer.validated_data["dice"]
+
+        if seed is None:
+            payload = macro_roll_payload(macro, dice=dice)
+        else:
+            secret, counter = next_roll(client_key(request), seed)
+            rng = CounterRNG(seed, counter, secret)
+            payload = seeded(macro_roll_payload(macro, rng, dice), seed, counter, secret)
+        record_macro_roll(request.user.id, macro, payload)
+        publish_roll(serializer.validated_data.get("room"), "macro", payload)
+        return payload
+
+
+# ----------------------
+# Random tables (JWT protected) — /api/tables/
+# ----------------------
+class RandomTableViewSet(viewsets.ModelViewSet):
+    """CRUD for weighted random tables, scoped to the authenticated user.
+
+    Also exposes POST /api/tables/{id}/draw/ with an optional `count`
+    (1-1000) and `replace` flag; draws come from the table's cached alias
+    table, so each one is O(1) whatever the table size.
+    """
+
+    serializer_class = RandomTableSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        """Only return tables belonging to the current user."""
+        return RandomTable.objects.filter(user_id=self.request.user.id).order_by("id")
+
+    def perform_create(self, serializer):
+        """Stamp the new table with the authenticated user's ID."""
+        serializer.save(user_id=self.request.user.id)
+
+    @action(detail=True, methods=["post"], url_path="draw")
+    def draw(self, request, pk=None):
+        """Draw `count` entries, with or without replacement."""
+        table = get_random_table(request.user.id, pk)
+        if table is None:
+            raise NotFound()
+        serializer = TableDrawSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        count = serializer.validated_data["count"]
 
+        with phase("roll"):
+            if serializer.validated_data["replace"]:
+                picks = table["alias"].sample(count)
+            elif count > len(table["values"]):
+                raise ValidationError(
+                    {"count": "Cannot draw more entries than the table has without replacement."}
+                )
+            else:
+                picks = table["alias"].sample_distinct(count, table["weights"])
+        values = table["values"]
         return Response({
-            "macro_id": macro.id,
-            "name": macro.name,
-            "rolls": rolls,
-            "total": total,
-            "modifier": macro.modifier,
-            "final": final,
-        }, status=status.HTTP_200_OK)
+            "table_id": table["id"],
+            "name": table["name"],
+            "draws": [values[i] for i in picks],
+        })
+
+
+# ----------------------
+# Roll history (JWT protected) — GET /api/history/
+# ----------------------
+class HistoryPagination(CursorPagination):
+    """Keyset pagination, newest first; ?limit= picks the page size."""
+
+    ordering = "-created_at"
+    page_size = 20
+    page_size_query_param = "limit"
+    max_page_size = 100
+
+
+class RollHistoryView(generics.ListAPIView):
+    """The authenticated user's recorded rolls, newest first.
+
+    Rows reach the table through the buffered writer in dice/history.py,
+    so a roll can take up to HISTORY_FLUSH_INTERVAL seconds to appear.
+    """
+
+    serializer_class = RollHistorySerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = HistoryPagination
+
+    def get_queryset(self):
+        return RollHistory.objects.filter(user_id=self.request.user.id)
+
+
+# ----------------------
+# Metrics — GET /metrics
+# ----------------------
+def metrics_view(request):
+    """Latency histograms and cache counters in Prometheus text format."""
+    jwt = token_cache.stats()
+    counters = [
+        ("dice_jwt_cache_hits_total", "Decoded-JWT cache hits.", jwt["hits"]),
+        ("dice_jwt_cache_misses_total", "Decoded-JWT cache misses.", jwt["misses"]),
+        ("dice_history_dropped_total", "Roll history rows dropped.", history_buffer.dropped),
+    ]
+    lines = []
+    for name, help_text, value in counters:
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter", f"{name} {value}"]
+    body = "\n".join(lines) + "\n" + registry.render()
+    return HttpResponse(body, content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,13 @@
+"""
+ASGI deployment profile.
+
+Serves the roll and macro endpoints from the native async views in
+dice/async_views.py. Everything else is inherited from the main settings.
+
+Usage (see gunicorn_asgi.py):
+    gunicorn -c gunicorn_asgi.py dice_backend.asgi:application
+"""
+
+from dice_backend.settings import *  # noqa: F401, F403
+
+ROOT_URLCONF = "dice_backend.asgi_urls"
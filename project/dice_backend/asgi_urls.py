@@ -0,0 +1,9 @@
+from django.urls import path, include
+
+from dice.views import metrics_view
+
+# Root urlconf for the async (ASGI) profile — see dice_backend/asgi_settings.py.
+urlpatterns = [
+    path("metrics", metrics_view, name="metrics"),
+    path("api/", include("dice.async_urls")),
+]
@@ -0,0 +1,41 @@
+"""
+Lean API deployment profile.
+
+The dice API authenticates with its own JWT cookie (dice/authentication.py)
+and renders only JSON, so the admin, auth, sessions, messages and
+staticfiles apps, their middleware and the template engine do nothing for
+it but lengthen boot and the per-request middleware chain. This profile
+drops them and keeps only what the API needs. Everything else is
+inherited from the main settings.
+
+Usage:
+    DJANGO_SETTINGS_MODULE=dice_backend.lean_settings gunicorn dice_backend.wsgi:application
+
+Measure the difference with `python -m benchmarks.startup`.
+"""
+
+from dice_backend.settings import *  # noqa: F401, F403
+from dice_backend.settings import REST_FRAMEWORK
+
+INSTALLED_APPS = [
+    "corsheaders",
+    "dice",
+]
+
+MIDDLEWARE = [
+    "dice.middleware.TimingMiddleware",   # first, so "total" spans the stack
+    "corsheaders.middleware.CorsMiddleware",
+    "django.middleware.security.SecurityMiddleware",
+    "django.middleware.common.CommonMiddleware",
+]
+
+TEMPLATES = []
+
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    # JSON only: the browsable API needs templates and staticfiles.
+    "DEFAULT_RENDERER_CLASSES": ["rest_framework.renderers.JSONRenderer"],
+    # The default AnonymousUser lives in django.contrib.auth.models, which
+    # cannot be imported without the auth app; IsAuthenticated accepts None.
+    "UNAUTHENTICATED_USER": None,
+}
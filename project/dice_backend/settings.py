@@ -30,6 +30,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "dice.middleware.TimingMiddleware",   # first, so "total" spans the stack
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -73,6 +74,16 @@ WSGI_APPLICATION = "dice_backend.wsgi.application"
 
 # PostgreSQL database — all connection params come from environment variables.
 # For tests, this is overridden to SQLite in test_settings.py.
+#
+# Connections are reused rather than opened per request: each worker thread
+# keeps its connection for DB_CONN_MAX_AGE seconds and health-checks it
+# before reuse. With DB_POOL=1, psycopg's built-in pool is used instead,
+# sized from WEB_THREADS (the gunicorn threads per worker, see
+# gunicorn.conf.py) plus one for the roll-history flush thread.
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+WEB_THREADS = int(os.getenv("WEB_THREADS", "1"))
+DB_POOL = os.getenv("DB_POOL", "").lower() in ("1", "true", "yes")
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.postgresql",
@@ -81,9 +92,103 @@ DATABASES = {
         "PASSWORD": os.getenv("DB_PASSWORD"),
         "HOST": os.getenv("DB_HOST"),
         "PORT": os.getenv("DB_PORT", "5432"),
+        # The pool owns connection lifetime, so Django must not persist them.
+        "CONN_MAX_AGE": 0 if DB_POOL else int(os.getenv("DB_CONN_MAX_AGE", "60")),
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {},
     }
 }
+if DB_POOL:
+    DATABASES["default"]["OPTIONS"]["pool"] = {
+        "min_size": 1,
+        "max_size": WEB_THREADS + 1,
+        "timeout": float(os.getenv("DB_POOL_TIMEOUT", "10")),
+    }
+
+# Per-user macro sets are cached (see dice/cache.py). Point REDIS_URL at a
+# shared Redis to share the cache between workers; otherwise each process
+# keeps its own local-memory cache, which only suits a single worker:
+# DiceConfig.ready() refuses a locmem default cache when WEB_CONCURRENCY
+# (the gunicorn worker count) is above 1.
+REDIS_URL = os.getenv("REDIS_URL")
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        },
+        "idempotency": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        },
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        },
+        "idempotency": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "idempotency",
+            "OPTIONS": {"MAX_ENTRIES": int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))},
+        },
+    }
 
+MACRO_CACHE_TIMEOUT = int(os.getenv("MACRO_CACHE_TIMEOUT", "300"))
+
+# Idempotency-Key results (see dice/idempotency.py) are replayed for
+# IDEMPOTENCY_TTL seconds; a retry waits up to IDEMPOTENCY_WAIT seconds for
+# a concurrent request with the same key to finish.
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", "86400"))
+IDEMPOTENCY_WAIT = float(os.getenv("IDEMPOTENCY_WAIT", "5"))
+
+# Roll history is written in batches (see dice/history.py): flush once this
+# many rows are queued or every HISTORY_FLUSH_INTERVAL seconds, and never
+# queue more than HISTORY_BUFFER_MAX rows per process.
+HISTORY_FLUSH_SIZE = int(os.getenv("HISTORY_FLUSH_SIZE", "100"))
+HISTORY_BUFFER_MAX = int(os.getenv("HISTORY_BUFFER_MAX", "10000"))
+HISTORY_FLUSH_INTERVAL = float(os.getenv("HISTORY_FLUSH_INTERVAL", "2.0"))
+
+# Random source for every roll: "mt" (Mersenne Twister, fastest) or
+# "csprng" (buffered os.urandom, see dice/csprng.py) for provably fair tables.
+ROLL_RNG = os.getenv("ROLL_RNG", "mt")
+
+# Precomputed distribution tables, memory-mapped by every worker (see
+# dice/tables.py). Build with `python manage.py build_distribution_tables`;
+# until the file exists distributions are computed on demand.
+DISTRIBUTION_TABLES = os.getenv("DISTRIBUTION_TABLES", str(BASE_DIR / "distribution_tables.bin"))
+
+# Token-bucket limit on the public roll endpoints per IP, or per userId with
+# a valid cookie (see dice/ratelimit.py): RATE tokens per second up to BURST.
+# RATE=0 disables it. BACKEND "local" keeps at most BUCKETS buckets per
+# process; "cache" shares buckets between workers through CACHES.
+ROLL_RATE_LIMIT_RATE = float(os.getenv("ROLL_RATE_LIMIT_RATE", "10"))
+ROLL_RATE_LIMIT_BURST = int(os.getenv("ROLL_RATE_LIMIT_BURST", "20"))
+ROLL_RATE_LIMIT_BUCKETS = int(os.getenv("ROLL_RATE_LIMIT_BUCKETS", "10000"))
+ROLL_RATE_LIMIT_BACKEND = os.getenv("ROLL_RATE_LIMIT_BACKEND", "local")
+#
+# The IP is REMOTE_ADDR when NUM_PROXIES is 0; behind N trusted proxies it
+# is the address the outermost of them appended to X-Forwarded-For, which
+# clients cannot forge past. Behind a proxy, 0 would put every anonymous
+# client in the proxy's single bucket, so the Dockerfile sets 1 for its
+# load balancer.
+NUM_PROXIES = int(os.getenv("NUM_PROXIES", "0"))
+
+# Live roll rooms (see dice/rooms.py): each SSE subscriber may fall at most
+# ROOM_QUEUE_SIZE events behind before it is dropped, and idle streams get
+# a keepalive comment every ROOM_KEEPALIVE seconds. BACKEND "local" fans
+# out within one process, so it is refused with several workers;
+# "postgres" relays events between workers with LISTEN/NOTIFY.
+ROOM_BACKEND = os.getenv("ROOM_BACKEND", "local" if WEB_CONCURRENCY == 1 else "postgres")
+ROOM_QUEUE_SIZE = int(os.getenv("ROOM_QUEUE_SIZE", "64"))
+ROOM_KEEPALIVE = float(os.getenv("ROOM_KEEPALIVE", "15"))
+
+# Seeded roll sessions (see dice/replay.py) keep their server secret and
+# next counter in the cache for this many seconds after the first roll.
+SEED_SESSION_TIMEOUT = int(os.getenv("SEED_SESSION_TIMEOUT", "86400"))
+
+# Fraction of requests timed for Server-Timing and /metrics (0.0 disables).
+METRICS_SAMPLE_RATE = float(os.getenv("METRICS_SAMPLE_RATE", "1.0"))
 
 # We are NOT using Django users for auth
 AUTH_PASSWORD_VALIDATORS = []
@@ -97,6 +202,8 @@ REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
+    # Trusted reverse proxies, for client IPs; see ROLL_RATE_LIMIT_* above.
+    "NUM_PROXIES": NUM_PROXIES,
 }
 
 STATIC_URL = "static/"
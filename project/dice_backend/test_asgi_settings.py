@@ -0,0 +1,13 @@
+"""
+Test settings for the async (ASGI) stack.
+
+Same as test_settings, but routes /api/ to the native async views so the
+whole dice/tests.py suite runs against them.
+
+Usage:
+    python manage.py test dice --settings=dice_backend.test_asgi_settings
+"""
+
+from dice_backend.test_settings import *  # noqa: F401, F403
+
+ROOT_URLCONF = "dice_backend.asgi_urls"
@@ -0,0 +1,17 @@
+"""
+Test settings for the lean API profile.
+
+Same as test_settings, but with lean_settings' apps, middleware and
+renderers, so the whole dice/tests.py suite runs against the lean stack.
+
+Usage:
+    python manage.py test dice --settings=dice_backend.test_lean_settings
+"""
+
+from dice_backend.test_settings import *  # noqa: F401, F403
+from dice_backend.lean_settings import (  # noqa: F401
+    INSTALLED_APPS,
+    MIDDLEWARE,
+    REST_FRAMEWORK,
+    TEMPLATES,
+)
@@ -18,9 +18,31 @@ os.environ.setdefault("SECRET_KEY", "test-jwt-secret-key-for-testing")
 from dice_backend.settings import *  # noqa: F401, F403
 
 # Override the database to use a fast, disposable SQLite in-memory DB.
+# Benchmarks set SQLITE_NAME to a file so several server workers share it.
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
-        "NAME": ":memory:",
+        "NAME": os.getenv("SQLITE_NAME", ":memory:"),
     }
 }
+
+# Always use a process-local cache in tests, even if REDIS_URL is set.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "idempotency": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "idempotency",
+    },
+}
+
+# No background flush thread in tests; they call history_buffer.flush().
+HISTORY_FLUSH_INTERVAL = None
+
+# Compute distributions on demand; tests build their own table files.
+DISTRIBUTION_TABLES = ""
+
+# The suite posts to /api/roll/ far faster than any real client; the rate
+# limit tests turn it on with override_settings.
+ROLL_RATE_LIMIT_RATE = 0
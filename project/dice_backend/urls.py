@@ -1,6 +1,8 @@
-from django.contrib import admin
 from django.urls import path, include
 
+from dice.views import metrics_view
+
 urlpatterns = [
+    path("metrics", metrics_view, name="metrics"),
     path("api/", include("dice.urls")),
 ]
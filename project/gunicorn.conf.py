@@ -0,0 +1,31 @@
+"""
+Gunicorn settings for the default (WSGI) deployment.
+
+Gunicorn loads this file automatically from the working directory.
+Worker and thread counts come from WEB_CONCURRENCY and WEB_THREADS — the
+same variables dice_backend/settings.py uses to size the database pool.
+
+With preload_app (GUNICORN_PRELOAD, on by default) the master imports
+Django and the whole URLconf once, before forking, so each worker starts
+with every module already loaded instead of importing them on its first
+request; the pages are shared copy-on-write. Nothing opens a database
+connection, history flush thread or random buffer before the fork, and
+the ones workers open later are per process (see dice/history.py and
+dice/csprng.py). Set GUNICORN_PRELOAD=0 to use --reload in development.
+"""
+
+import os
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8500")
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+threads = int(os.getenv("WEB_THREADS", "1"))
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") == "1"
+
+
+def when_ready(server):
+    """Import the URLconf in the master, after the app loads and before forking."""
+    if not server.cfg.preload_app:
+        return
+    from django.urls import get_resolver
+
+    get_resolver().url_patterns
@@ -0,0 +1,19 @@
+"""
+Gunicorn profile for the native async (ASGI) stack.
+
+Runs uvicorn workers against dice_backend.asgi with the async views from
+dice/async_views.py. Each worker serves many requests concurrently on one
+event loop instead of holding a thread per request.
+
+Usage (from the project directory):
+    gunicorn -c gunicorn_asgi.py dice_backend.asgi:application
+"""
+
+import os
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8500")
+# Read from the same variable as settings.WEB_CONCURRENCY, so the app's
+# single-worker checks (dice/apps.py) see the real worker count.
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+worker_class = "uvicorn_worker.UvicornWorker"
+raw_env = ["DJANGO_SETTINGS_MODULE=dice_backend.asgi_settings"]